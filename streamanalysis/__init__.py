@@ -4,5 +4,6 @@ __version__ = '0.1.0'
 __credits__ = 'None'
 
 from analyser import Analyser
-from athlete import Athlete
-from sensor import Sensor
+from athlete import Athlete, AthleteSwarm
+from sensor import Sensor, SensorHub, SensorArray
+from pool import AnalyserPool
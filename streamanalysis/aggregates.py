@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from collections import deque
+
+from streamanalysis.utils import to_timestamp
+
+class SensorAggregates(object):
+
+    def __init__(self, windows = [60.0], sprint_speed = 7.0):
+        """
+        Running aggregates of the results of a single sensor, which are
+        updated in constant time per result: duration, distance, maximal
+        total velocity, stationary time, and the number of sprints, i.e. the
+        number of times the total velocity exceeded sprint_speed. For every
+        window the distance and the maximal total velocity within the last
+        window seconds are kept with a deque of cumulative distances and a
+        monotonic deque of velocities.
+
+        :param windows (optional): list of window lengths in seconds;
+        default: [60]
+        :param sprint_speed (optional): total velocity in m/s above which the
+        sensor is sprinting; default: 7
+        """
+        self.sprint_speed = sprint_speed
+        self.start = None
+        self.time = None
+        self.dist = 0.0
+        self.max_vel = 0.0
+        self.stationary_time = 0.0
+        self.sprints = 0
+        self.sprinting = False
+        # per window: deque of (time, dist) covering the window and
+        # monotonic deque of (time, tot_vel) with decreasing velocities
+        self.dists = dict((w, deque()) for w in windows)
+        self.speeds = dict((w, deque()) for w in windows)
+
+    def add(self, result):
+        """
+        Update aggregates with new result.
+
+        :param result: ResultSpec instance
+        """
+        time = to_timestamp(result.time)
+        if self.time is None:
+            self.start = time
+            dt = 0.0
+        else:
+            dt = time - self.time
+        self.time = time
+        self.dist = result.dist
+        tot_vel = result.tot_vel
+        if tot_vel > self.max_vel:
+            self.max_vel = tot_vel
+        if result.stationary:
+            self.stationary_time += dt
+        sprinting = tot_vel > self.sprint_speed
+        if sprinting and not self.sprinting:
+            self.sprints += 1
+        self.sprinting = sprinting
+        for w, dists in self.dists.items():
+            # keep the newest entry before the window as reference
+            dists.append((time, result.dist))
+            while len(dists) > 1 and dists[1][0] <= time - w:
+                dists.popleft()
+            speeds = self.speeds[w]
+            while speeds and speeds[-1][1] <= tot_vel:
+                speeds.pop()
+            speeds.append((time, tot_vel))
+            while speeds[0][0] <= time - w:
+                speeds.popleft()
+
+    def window_dist(self, window):
+        """
+        Return distance covered in the last window seconds.
+        """
+        dists = self.dists[window]
+        if not dists:
+            return 0.0
+        return dists[-1][1] - dists[0][1]
+
+    def window_max_vel(self, window):
+        """
+        Return maximal total velocity in the last window seconds.
+        """
+        speeds = self.speeds[window]
+        return speeds[0][1] if speeds else 0.0
+
+    def snapshot(self):
+        """
+        :returns snapshot: dictionary with the aggregates and the windowed
+        statistics keyed by window length
+        """
+        return {'duration': self.time - self.start if self.time else 0.0,
+                'dist': self.dist,
+                'max_vel': self.max_vel,
+                'stationary_time': self.stationary_time,
+                'sprints': self.sprints,
+                'window_dist': dict((w, self.window_dist(w))
+                                    for w in self.dists),
+                'window_max_vel': dict((w, self.window_max_vel(w))
+                                       for w in self.speeds)}
+
+
+class Aggregates(object):
+
+    def __init__(self, windows = [60.0], sprint_speed = 7.0):
+        """
+        Running aggregates of all sensors as SensorAggregates instances per
+        sensor ID. Pass an instance to Analyser to update the aggregates
+        whenever a result is stored.
+
+        :param windows (optional): list of window lengths in seconds;
+        default: [60]
+        :param sprint_speed (optional): total velocity in m/s above which a
+        sensor is sprinting; default: 7
+        """
+        self.windows = windows
+        self.sprint_speed = sprint_speed
+        self.sensors = {}
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def __iter__(self):
+        return iter(self.sensors)
+
+    def __getitem__(self, ID):
+        return self.sensors[ID]
+
+    def add(self, ID, result):
+        """
+        Update aggregates of sensor with new result.
+
+        :param ID: sensor ID
+        :param result: ResultSpec instance
+        """
+        try:
+            sensor = self.sensors[ID]
+        except KeyError:
+            sensor = self.sensors[ID] = SensorAggregates(self.windows,
+                                                         self.sprint_speed)
+        sensor.add(result)
+
+    def snapshot(self):
+        """
+        :returns snapshot: dictionary with the snapshot of every sensor
+        """
+        return dict((ID, sensor.snapshot())
+                    for ID, sensor in list(self.sensors.items()))
@@ -5,27 +5,33 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 
 from threading import Thread
 from Queue import Empty
-from numpy import sqrt, zeros, matrix, eye, diag, log
+from timeit import default_timer
+from numpy import (sqrt, zeros, matrix, eye, diag, log, asarray, array,
+                   diagonal, where, argsort, arange, empty, flatnonzero,
+                   maximum, column_stack, hypot, append)
 
-from streamanalysis.utils import get_norm
+from streamanalysis.utils import get_norm, time_difference, to_timestamp
+from streamanalysis.sensor import MeasurementSpec, FrameSpec
+from streamanalysis.clock import WallClock
+from streamanalysis.filterbank import FilterBank, FilterSpec, POS_IDX, VEL_IDX
+from streamanalysis.results import ResultStore, ResultSpec, LazyResult
 
-from collections import namedtuple as nt
-
-ResultSpec = nt('result', ['pos', 'pos_err', 'vel', 'vel_err', 'tot_vel',
-                           'dist', 'stationary', 'time'])
-FilterSpec = nt('filter', ['X', 'P'])
-
-POS_IDX = [0, 2]
-VEL_IDX = [1, 3]
+BACKENDS = ['matrix', 'fast', 'cached']
 
 class Analyser(Thread):
     
     def __init__(self, queue, pos0 = [50.0, 50.0], vel0 = [0.0, 0.0],
-                 noise = 0.3, dt0 = 1./20, acc_noise = 4.0, wait = 1.0):
+                 noise = 0.3, dt0 = 1./20, acc_noise = 4.0, wait = 1.0,
+                 backend = 'matrix', maxlen = None, batch_size = 1,
+                 batch_latency = 0.0, log = None, stats = None,
+                 clock = None, aggregates = None, spatial = None,
+                 outputs = None, deadband = None, checkpoint = None,
+                 publisher = None, heatmaps = None):
         """
         Analysis thread for position data from sensors using a Kalman Filter.
-        Stores results of the individual sensors in a dictionary at
-        self.sensors.
+        Stores results of the individual sensors as ResultStore instances in
+        a dictionary at self.sensors. The states of the Kalman Filters of all sensors are
+        kept in a FilterBank instance at self.filter.
         
         :param queue: queue from which the sensor data is processed
         :param pos0 (optional): list of initial positions for the Kalman
@@ -39,19 +45,89 @@ class Analyser(Thread):
         acceleration; default: 4.0
         :param wait (optional): time to wait for new elements in the queue
         before stopping (in seconds); default: 1 
+        :param backend (optional): implementation of the Kalman Filter update,
+        'matrix' for the numpy.matrix implementation in self.kalman_filter or
+        'fast' for the closed-form update of the independent axes in
+        FilterBank.update_one or 'cached' for the closed-form update which
+        switches to the cached steady-state gain once the covariance
+        converged in FilterBank.update_cached; default: 'matrix'
+        :param maxlen (optional): maximal number of results kept per sensor;
+        default: None (keep all results)
+        :param batch_size (optional): maximal number of measurements taken
+        from the queue and analysed at once with self.analyse_batch;
+        default: 1 (analyse every measurement with self.analyse_data)
+        :param batch_latency (optional): time to wait for further
+        measurements after the first one of a batch arrived (in seconds);
+        default: 0 (only take measurements that are already in the queue)
+        :param log (optional): SessionLog instance to which all measurements
+        and results are written; default: None
+        :param stats (optional): PipelineStats instance collecting the
+        latencies of the processing stages, the number of processed
+        measurements per sensor, the queue depth, and the lag of the
+        processing; default: None (no instrumentation)
+        :param clock (optional): clock used to calculate the lag of the
+        processing; default: WallClock instance
+        :param aggregates (optional): Aggregates instance which maintains
+        running aggregates and windowed statistics of every sensor;
+        default: None
+        :param spatial (optional): SpatialHash instance which is updated
+        with the latest position of every sensor; default: None
+        :param outputs (optional): list of fields of ResultSpec that are
+        computed eagerly. Results are then LazyResult instances and the
+        stores in self.sensors keep the filter state, from which both derive
+        the other fields when they are accessed (see ResultStore); default:
+        None (all fields)
+        :param deadband (optional): Deadband instance which decides which
+        results are stored in self.sensors and written to the log, the
+        ResultStore keeps the latest result in its attribute last
+        regardless; default: None (store all results)
+        :param checkpoint (optional): Checkpointer instance which
+        periodically receives snapshots of the filter states, the last
+        results and the aggregates, and a final one at the end of the run,
+        see checkpoint.restore for resuming from them; default: None
+        :param publisher (optional): Publisher instance which is updated
+        with the latest result of every sensor and periodically publishes
+        them to shared memory; default: None
+        :param heatmaps (optional): Heatmaps instance which accumulates the
+        occupancy of the field per sensor and per group; default: None
         """
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend %s'%backend)
+        if outputs is not None:
+            for name in outputs:
+                if name not in ResultSpec._fields:
+                    raise ValueError('Unknown output %s'%name)
         super(Analyser, self).__init__()
         self.queue = queue
         self.wait = wait
         self.data = {}
         self.sensors = {}
-        self.filter = {}
+        self.filter = FilterBank(pos0 = pos0, vel0 = vel0, noise = noise,
+                                 acc_noise = acc_noise)
         self.pos0 = pos0
         self.vel0 = vel0
         self.dt0 = dt0
         self.acc_noise = acc_noise
         self.noise = noise
         self.stat_p = 0.95
+        self.outputs = outputs
+        self.deadband = deadband
+        self.backend = backend
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+        self.log = log
+        self.aggregates = aggregates
+        self.spatial = spatial
+        self.checkpoint = checkpoint
+        self.publisher = publisher
+        self.heatmaps = heatmaps
+        if clock is None:
+            clock = WallClock()
+        self.clock = clock
+        self.stats = stats
+        if stats is not None:
+            self.instrument(stats)
         
     def run(self):
         """
@@ -59,13 +135,53 @@ class Analyser(Thread):
         """
         self.initialize_matrices()
         while True:
+            if self.stats is not None:
+                start = default_timer()
             # Try to get data from queue and break if we have to wait for more
             # than self.wait seconds
             try:
                 data = self.queue.get(timeout = self.wait)
+            except Empty:
+                break
+            if self.stats is not None:
+                self.stats.stage('queue_wait').add(default_timer() - start)
+                self.stats.queue_depth.add(self.queue.qsize())
+            if isinstance(data, FrameSpec):
+                self.analyse_frame(data)
+            elif self.batch_size > 1:
+                self.analyse_batch(self.get_batch(data))
+            else:
                 self.analyse_data(data)
+            if self.publisher is not None and self.publisher.due():
+                self.publisher.publish()
+            if self.checkpoint is not None and self.checkpoint.due():
+                self.checkpoint.submit(self)
+        self.flush()
+        if self.publisher is not None:
+            self.publisher.publish()
+        if self.checkpoint is not None:
+            self.checkpoint.submit(self, block = True)
+
+    def get_batch(self, data):
+        """
+        Collect further measurements from the queue until self.batch_size
+        measurements are collected or self.batch_latency has passed.
+
+        :param data: first MeasurementSpec instance of the batch
+        :returns batch: list of MeasurementSpec and FrameSpec instances
+        """
+        batch = [data]
+        deadline = default_timer() + self.batch_latency
+        while len(batch) < self.batch_size:
+            timeout = deadline - default_timer()
+            try:
+                if timeout > 0:
+                    batch.append(self.queue.get(timeout = timeout))
+                else:
+                    batch.append(self.queue.get_nowait())
             except Empty:
                 break
+        return batch
 
     def analyse_data(self, data):
         """
@@ -79,35 +195,302 @@ class Analyser(Thread):
         # initialise otherwise
         try:
             # last result
-            sensor = self.sensors[ID][-1]
-            # state of Kalman Filter
-            prev = self.filter[ID]
+            sensor = self.sensors[ID].last
             # time increment to last measurement
-            dt = (data.time - sensor.time).total_seconds()
+            dt = time_difference(data.time, sensor.time)
         except KeyError:
-            # Initialize empty list to which result will be appended
-            self.sensors[ID] = []
+            # Initialize empty store to which result will be appended
+            self.sensors[ID] = self.initialize_store()
             # Initialize Kalman Filter
             prev = self.initialize_filter()
+            self.filter[ID] = prev
             # Create initial value of sensor
-            err = diag(prev.P.A)
             dt = self.dt0
-            sensor = ResultSpec(pos = self.pos0,
-                                pos_err = err[POS_IDX],
-                                vel = self.vel0,
-                                vel_err = err[VEL_IDX],
-                                tot_vel = 0.0,
-                                dist = 0.0,
-                                stationary = True,
-                                time = None)
+            sensor = self.initialize_result(prev)
         # Update Kalman Filter
-        Filter = self.kalman_filter(data.coords, dt, prev)
+        if self.backend == 'fast':
+            i = self.filter.ids[ID]
+            self.filter.update_one(i, data.coords, dt)
+            Filter = FilterSpec(X = self.filter.X[i], P = self.filter.P[i])
+        elif self.backend == 'cached':
+            i = self.filter.ids[ID]
+            self.filter.update_cached(i, data.coords, dt)
+            Filter = FilterSpec(X = self.filter.X[i], P = self.filter.P[i])
+        else:
+            # state of Kalman Filter
+            Filter = self.kalman_filter(data.coords, dt, self.filter[ID])
+            self.filter[ID] = Filter
         # Process Kalman Filter into ResultSpec instance
         res = self.get_new_state(Filter, sensor, data.time)
-        # Update Filter, data, and append results
-        self.filter[ID] = Filter
-        self.data[ID] = data
-        self.sensors[ID].append(res)
+        # Update data and append results
+        self.store_result(ID, data, res)
+
+    def analyse_batch(self, batch):
+        """
+        Analyse a batch of sensor data and append results to self.sensors.
+        The Kalman Filters of all sensors in the batch are updated in one
+        vectorized step. Measurements of the same sensor are processed in
+        order of appearance in the batch. Frames of a SensorArray in the
+        batch are analysed with self.analyse_frame after the measurements
+        preceding them.
+
+        :param batch: list of MeasurementSpec or FrameSpec instances
+        """
+        # Split batch into rounds in which every sensor appears only once
+        rounds = []
+        count = {}
+        for data in batch:
+            if isinstance(data, FrameSpec):
+                for measurements in rounds:
+                    self.analyse_round(measurements)
+                rounds = []
+                count = {}
+                self.analyse_frame(data)
+                continue
+            k = count.get(data.ID, 0)
+            count[data.ID] = k + 1
+            if k == len(rounds):
+                rounds.append([])
+            rounds[k].append(data)
+        for measurements in rounds:
+            self.analyse_round(measurements)
+
+    def analyse_round(self, measurements):
+        """
+        Analyse sensor data of several distinct sensors in one vectorized
+        step and append results to self.sensors.
+
+        :param measurements: list of MeasurementSpec instances with distinct
+        sensor IDs
+        """
+        IDs = [data.ID for data in measurements]
+        coords = array([data.coords for data in measurements])
+        times = [data.time for data in measurements]
+        self.update_sensors(IDs, coords, times, measurements)
+
+    def analyse_frame(self, frame):
+        """
+        Analyse a frame of a SensorArray, i.e. measurements of distinct
+        sensors at the same time, in one vectorized step and append results
+        to self.sensors.
+
+        :param frame: FrameSpec instance
+        """
+        self.update_sensors(frame.IDs, frame.coords,
+                            [frame.time] * len(frame.IDs), None)
+        for ID, c in zip(frame.IDs, frame.coords):
+            self.data[ID] = MeasurementSpec(ID = ID, coords = c,
+                                            time = frame.time)
+
+    def analyse_records(self, records, index):
+        """
+        Analyse measurements in the binary record format of the wire module
+        (timestamps in seconds) and append results to self.sensors.
+        Measurements of the same sensor are processed in order of appearance
+        and only the last one of every sensor is stored in self.data.
+
+        :param records: structured array with dtype wire.MEASUREMENT_DTYPE
+        :param index: SensorIndex instance translating record indices into
+        sensor IDs
+        """
+        n = len(records)
+        if n == 0:
+            return
+        idx = records['idx']
+        coords = column_stack([records['x'], records['y']])
+        times = records['time'].tolist()
+        # rank of every record among the records of the same sensor, every
+        # rank is analysed in one round
+        order = argsort(idx, kind = 'mergesort')
+        new = empty(n, dtype = bool)
+        new[0] = True
+        new[1:] = idx[order][1:] != idx[order][:-1]
+        positions = arange(n)
+        rank = empty(n, dtype = int)
+        rank[order] = positions - maximum.accumulate(where(new, positions, 0))
+        for r in range(rank.max() + 1):
+            rows = flatnonzero(rank == r)
+            IDs = [index[i] for i in idx[rows].tolist()]
+            self.update_sensors(IDs, coords[rows],
+                                [times[i] for i in rows], None)
+        last = order[append(new[1:], True)]
+        for i in last.tolist():
+            ID = index[int(idx[i])]
+            self.data[ID] = MeasurementSpec(ID = ID, coords = coords[i],
+                                            time = times[i])
+
+    def update_sensors(self, IDs, coords, times, measurements):
+        """
+        Update the Kalman Filters of several distinct sensors in one
+        vectorized step and append results to self.sensors.
+
+        :param IDs: list of distinct sensor IDs
+        :param coords: array of observed coordinates with shape (n, 2)
+        :param times: list of times of the measurements
+        :param measurements: list of MeasurementSpec instances stored in
+        self.data or None if the caller updates self.data, in which case
+        they are only created for the log
+        """
+        n = len(IDs)
+        rows = zeros(n, dtype = int)
+        dt = zeros(n)
+        prev_pos = zeros((n, 2))
+        prev_dist = zeros(n)
+        for i, ID in enumerate(IDs):
+            try:
+                # last result
+                sensor = self.sensors[ID].last
+                dt[i] = time_difference(times[i], sensor.time)
+            except KeyError:
+                # Initialize empty store and Kalman Filter for new sensor
+                self.sensors[ID] = self.initialize_store()
+                self.filter[ID] = self.initialize_filter()
+                sensor = self.initialize_result(self.filter[ID])
+                dt[i] = self.dt0
+            rows[i] = self.filter.index(ID)
+            prev_pos[i] = sensor.pos
+            prev_dist[i] = sensor.dist
+        # Update Kalman Filters of all sensors at once
+        if self.backend == 'fast':
+            self.filter.update_decoupled(rows, coords, dt)
+        elif self.backend == 'cached':
+            self.filter.update_cached_batch(rows, coords, dt)
+        else:
+            self.filter.update(rows, coords, dt)
+        # Get positions, velocities and their variances from filter states
+        X = self.filter.X[rows]
+        var = diagonal(self.filter.P[rows], axis1 = 1, axis2 = 2)
+        pos = X[:, POS_IDX]
+        vel = X[:, VEL_IDX]
+        # Test which objects are stationary and increment total distance
+        # and calculate total velocity for the others
+        stat = (vel * vel / var[:, VEL_IDX]).sum(axis = 1) < self.stat_chi2
+        step = sqrt(((pos - prev_pos)**2).sum(axis = 1))
+        dist = where(stat, prev_dist, prev_dist + step)
+        if self.outputs is None:
+            pos_err = sqrt(var[:, POS_IDX])
+            vel_err = sqrt(var[:, VEL_IDX])
+            tot_vel = where(stat, 0.0, sqrt((vel * vel).sum(axis = 1)))
+        # Append results
+        for i, ID in enumerate(IDs):
+            if self.outputs is None:
+                res = ResultSpec(pos = pos[i], pos_err = pos_err[i],
+                                 vel = vel[i], vel_err = vel_err[i],
+                                 tot_vel = tot_vel[i], dist = dist[i],
+                                 stationary = bool(stat[i]), time = times[i])
+            else:
+                res = LazyResult(X[i], var[i], dist[i], bool(stat[i]),
+                                 times[i])
+            if measurements is not None:
+                data = measurements[i]
+            elif self.log is not None:
+                data = MeasurementSpec(ID = ID, coords = coords[i],
+                                       time = times[i])
+            else:
+                data = None
+            self.store_result(ID, data, res)
+
+    def store_result(self, ID, data, res):
+        """
+        Store measurement in self.data and append result to self.sensors.
+
+        :param ID: sensor ID
+        :param data: MeasurementSpec instance or None if self.data is
+        updated by the caller
+        :param res: ResultSpec instance
+        """
+        if data is not None:
+            self.data[ID] = data
+        if self.deadband is not None and not self.deadband.accept(ID, res):
+            # keep dropped result as reference for the next update
+            self.sensors[ID].last = res
+        else:
+            self.sensors[ID].append(res)
+            if self.log is not None:
+                self.log.add(ID, data, res)
+        if self.aggregates is not None:
+            self.aggregates.add(ID, res)
+        if self.spatial is not None:
+            self.spatial.update(ID, res.pos)
+        if self.heatmaps is not None:
+            self.heatmaps.add(ID, res)
+        if self.publisher is not None:
+            self.publisher.update(ID, res)
+
+    def flush(self):
+        """
+        Store the latest results of the sensors that were dropped by the
+        deadband compression, write the buffered log and accumulate the
+        buffered updates of the heatmaps.
+        """
+        if self.deadband is not None:
+            for ID in self.deadband.flush():
+                res = self.sensors[ID].last
+                self.sensors[ID].append(res)
+                if self.log is not None:
+                    self.log.add(ID, self.data[ID], res)
+        if self.log is not None:
+            self.log.flush()
+        if self.heatmaps is not None:
+            self.heatmaps.flush()
+
+    def instrument(self, stats):
+        """
+        Replace the processing stages by versions that record their latency
+        in stats, and count processed measurements and their lag when the
+        results are stored.
+
+        :param stats: PipelineStats instance
+        """
+        self.analyse_data = stats.timed('analyse_data', self.analyse_data)
+        self.analyse_frame = stats.timed('analyse_frame', self.analyse_frame)
+        self.update_sensors = stats.timed('update_sensors',
+                                          self.update_sensors)
+        self.kalman_filter = stats.timed('kalman_filter', self.kalman_filter)
+        self.filter.update_one = stats.timed('kalman_filter',
+                                             self.filter.update_one)
+        self.filter.update = stats.timed('kalman_filter_batch',
+                                         self.filter.update)
+        self.filter.update_decoupled = stats.timed('kalman_filter_batch',
+                                                   self.filter.update_decoupled)
+        self.filter.update_cached = stats.timed('kalman_filter',
+                                                self.filter.update_cached)
+        self.filter.update_cached_batch = stats.timed(
+            'kalman_filter_batch', self.filter.update_cached_batch)
+        self.get_new_state = stats.timed('get_new_state', self.get_new_state)
+        store = stats.timed('store_result', self.store_result)
+        processed = stats.processed
+        def store_result(ID, data, res):
+            store(ID, data, res)
+            processed[ID] = processed.get(ID, 0) + 1
+            stats.lag.add(to_timestamp(self.clock.now()) -
+                          to_timestamp(res.time))
+        self.store_result = store_result
+
+    def initialize_result(self, Filter):
+        """
+        Create the result that precedes the first measurement of a sensor.
+
+        :param Filter: initial state of Kalman Filter
+        :returns result: ResultSpec instance
+        """
+        err = diag(asarray(Filter.P))
+        return ResultSpec(pos = self.pos0,
+                          pos_err = err[POS_IDX],
+                          vel = self.vel0,
+                          vel_err = err[VEL_IDX],
+                          tot_vel = 0.0,
+                          dist = 0.0,
+                          stationary = True,
+                          time = None)
+
+    def initialize_store(self):
+        """
+        Create the store for the results of a new sensor.
+
+        :returns store: ResultStore instance
+        """
+        return ResultStore(maxlen = self.maxlen, fields = self.outputs)
 
     def initialize_filter(self):
         """
@@ -175,9 +558,11 @@ class Analyser(Thread):
         :param time: time of new measurement
         :returns result: ResultSpec instance
         """
+        if self.outputs is not None:
+            return self.get_lazy_state(Filter, sensor, time)
         # Get position, velocity and their errors from filter state
-        X = Filter.X.A[:,0]
-        err = diag(Filter.P.A)
+        X = asarray(Filter.X).ravel()
+        err = diag(asarray(Filter.P))
         pos = X[POS_IDX]
         pos_err = sqrt(err[POS_IDX])
         vel = X[VEL_IDX]
@@ -199,7 +584,29 @@ class Analyser(Thread):
                             tot_vel = tot_vel, dist = dist,
                             stationary = stat, time = time)
         return result
-    
+
+    def get_lazy_state(self, Filter, sensor, time):
+        """
+        Process new filter state into LazyResult instance, which only
+        computes stationarity and distance and keeps a copy of the state
+        vector and the variances for the other fields.
+
+        :param Filter: state of Kalman Filter
+        :param sensor: previous result
+        :param time: time of new measurement
+        :returns result: LazyResult instance
+        """
+        state = asarray(Filter.X).ravel().tolist()
+        var = asarray(Filter.P).diagonal().tolist()
+        x, vx, y, vy = state
+        # Stationarity test with the squared velocities and their variances
+        stat = vx * vx / var[1] + vy * vy / var[3] < self.stat_chi2
+        dist = sensor.dist
+        if not stat:
+            prev = sensor.pos
+            dist += hypot(x - prev[0], y - prev[1])
+        return LazyResult(state, var, dist, stat, time)
+
     def is_stationary(self, vel, vel_err):
         """
         Test if sensor is stationary using a hypothesis test which tests if
@@ -211,5 +618,16 @@ class Analyser(Thread):
         """
         dv = vel/vel_err
         chi_squared = (dv * dv).sum()
-        return chi_squared < -2 * log(1-self.stat_p)
+        return chi_squared < self.stat_chi2
+
+    @property
+    def stat_p(self):
+        return self._stat_p
+
+    @stat_p.setter
+    def stat_p(self, p):
+        # confidence of the stationarity test and corresponding threshold
+        # of the chi-squared statistic
+        self._stat_p = p
+        self.stat_chi2 = -2 * log(1 - p)
         
\ No newline at end of file
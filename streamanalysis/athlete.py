@@ -2,10 +2,12 @@
 
 # System imports
 from __future__ import print_function, division, absolute_import, unicode_literals
-from numpy import zeros, pi, sqrt, array
+from numpy import (zeros, pi, sqrt, array, asarray, empty, where, cos, sin,
+                   clip, diff, broadcast_to)
 from numpy.random.mtrand import RandomState
 from collections import namedtuple as nt
-from streamanalysis.utils import get_norm, euclid2polar, polar2euclid
+from streamanalysis.utils import (get_norm, euclid2polar, polar2euclid,
+                                  to_timestamp)
 
 AthleteSpec = nt('athlete', ['pos', 'vel'])
 
@@ -178,4 +180,133 @@ class Athlete(object):
         self.pos[idx] = self.limits[idx]
         # update velocity after correcting the positions
         self.vel = (self.pos - oldpos) / dt
-        
\ No newline at end of file
+        
+
+class AthleteSwarm(object):
+
+    def __init__(self, n, limits = array([100, 100]), pos0 = None,
+                 vel0 = None, amax = 4.0, vmax = 9.0, acc_freq = .2,
+                 dec_a = .02, seed = None):
+        """
+        Group of simulated athletes that move according to the same rules as
+        Athlete, but are advanced together with vectorized numpy operations.
+        Calling simulate with an array of times returns the trajectories of
+        all athletes at once.
+
+        :param n: number of athletes
+        :param limits (optional): athletes move between 0 and limits[0] for
+        x-coordinate and 0 and limits[1] for y-coordinate, where limits are
+        given in meters; default: [100, 100]
+        :param pos0 (optional): array of initial positions with shape (2,)
+        or (n, 2); default: half-way between 0 and limits for x and y
+        :param vel0 (optional): array of initial velocities with shape (2,)
+        or (n, 2); default: [0,0]
+        :param amax (optional): maximum acceleration of athletes in m/s2;
+        default: 4
+        :param vmax (optional): maximum velocity of athletes in m/s;
+        default: 9
+        :param acc_freq (optional): frequency of additional acceleration
+        input in Hz; default: 0.2
+        :param dec_a (optional): magnitude of default deceleration in m/s2;
+        default: 0.02
+        :param seed (optional): random seed; default: None
+        """
+        self.n = n
+        self.limits = asarray(limits, dtype = float)
+        if pos0 is None:
+            pos0 = self.limits * .5
+        self.pos0 = broadcast_to(asarray(pos0, dtype = float), (n, 2))
+        if vel0 is None:
+            vel0 = zeros(2)
+        self.vel0 = broadcast_to(asarray(vel0, dtype = float), (n, 2))
+        self.amax = amax
+        self.vmax = vmax
+        self.acc_freq = acc_freq
+        self.dec_a = dec_a
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        """
+        Reset athletes to initial conditions and reseed the random numbers.
+        """
+        self.rs = RandomState(self.seed)
+        self.pos = self.pos0.copy()
+        self.vel = self.vel0.copy()
+        self.acc = zeros((self.n, 2))
+        self.time = None
+        self.reset_acc = zeros(self.n, dtype = bool)
+        self.reset_vel = zeros(self.n, dtype = bool)
+
+    def simulate(self, times):
+        """
+        Advance all athletes through the input times. Subsequent calls
+        continue from the state at the last time of the previous call.
+
+        :param times: sequence of datetime instances or of seconds
+        :returns data: AthleteSpec instance containing positions and
+        velocities as arrays with shape (n, len(times), 2)
+        """
+        times = asarray([to_timestamp(t) for t in times], dtype = float)
+        pos = empty((self.n, len(times), 2))
+        vel = empty((self.n, len(times), 2))
+        if len(times) == 0:
+            return AthleteSpec(pos = pos, vel = vel)
+        if self.time is None:
+            # athletes didn't start moving yet and return the initial values
+            dts = diff(times)
+            pos[:, 0] = self.pos
+            vel[:, 0] = self.vel
+            first = 1
+        else:
+            dts = diff(times, prepend = self.time)
+            first = 0
+        for k, dt in enumerate(dts):
+            self.step(dt)
+            pos[:, first + k] = self.pos
+            vel[:, first + k] = self.vel
+        self.time = times[-1]
+        return AthleteSpec(pos = pos, vel = vel)
+
+    def step(self, dt):
+        """
+        Advance all athletes by the time increment dt.
+
+        :param dt: time increment in seconds
+        """
+        # reset acceleration and velocity of athletes that reached the
+        # velocity limit or bumped into the boundaries
+        self.acc[self.reset_acc] = 0.0
+        self.vel[self.reset_vel] = 0.0
+        # decide to accelerate or decelerate according to self.acc_freq
+        r, u = self.rs.rand(2, self.n)
+        rt = self.acc_freq * dt
+        kick = r <= rt
+        # deceleration by self.dec_a or stop if velocity is small
+        v_ = sqrt((self.vel * self.vel).sum(axis = 1))
+        slow = v_ <= self.dec_a * dt
+        dec = (self.dec_a / where(slow, 1.0, v_))[:, None]
+        acc = where(slow[:, None], -self.vel / dt, self.acc - dec * self.vel)
+        # random acceleration of the kicked athletes with angle recycled from
+        # r and magnitude drawn from a linear distribution between 0 and amax
+        angle = (2 * pi / rt) * r[kick] if kick.any() else r[kick]
+        a = (1.0 - sqrt(u[kick])) * self.amax
+        acc[kick] = array([a * cos(angle), a * sin(angle)]).T
+        self.acc = acc
+        # update velocity and check consistency with maximal velocity
+        self.vel += self.acc * dt
+        vel_abs = sqrt((self.vel * self.vel).sum(axis = 1))
+        self.reset_acc = vel_abs > self.vmax
+        self.vel[self.reset_acc] *= (self.vmax /
+                                     vel_abs[self.reset_acc])[:, None]
+        # update position and check consistency with boundaries
+        oldpos = self.pos
+        pos = oldpos + self.vel * dt
+        self.reset_vel = ((pos < 0) | (pos > self.limits)).any(axis = 1)
+        # rotate acceleration by 90 degrees to avoid long waiting at the
+        # boundaries
+        acc = self.acc[self.reset_vel]
+        self.acc[self.reset_vel] = array([-acc[:, 1], acc[:, 0]]).T
+        self.pos = clip(pos, 0.0, self.limits)
+        # update velocity after correcting the positions
+        self.vel = (self.pos - oldpos) / dt
@@ -0,0 +1,359 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import sys
+import json
+import platform
+import argparse
+from timeit import default_timer
+from datetime import datetime, timedelta
+from Queue import Queue
+import numpy
+from numpy.random.mtrand import RandomState
+
+from streamanalysis.analyser import Analyser
+from streamanalysis.athlete import Athlete, AthleteSwarm
+from streamanalysis.sensor import Sensor, MeasurementSpec
+from streamanalysis.replay import simulate_stream, replay
+from streamanalysis.clock import SimulatedClock
+from streamanalysis.pool import AnalyserPool
+
+# Start of the simulated sessions, fixed to make runs comparable
+START = datetime(2016, 7, 12)
+
+def time_kalman_update(backend = 'matrix', n = 2000, dt = 1./20,
+                       seed = None):
+    """
+    Measure the latency of a single Kalman Filter update for a stationary
+    sensor with noisy observations.
+
+    :param backend (optional): 'matrix' for Analyser.kalman_filter, 'fast'
+    for FilterBank.update_one or 'cached' for FilterBank.update_cached;
+    default: 'matrix'
+    :param n (optional): number of updates; default: 2000
+    :param dt (optional): time increment between updates; default: 0.05
+    :param seed (optional): seed of noise generation; default: None
+    :returns latency: mean time per update in seconds
+    """
+    analyser = Analyser(Queue(), backend = backend)
+    analyser.initialize_matrices()
+    coords = analyser.pos0 + RandomState(seed).randn(n, 2) * analyser.noise
+    bank = analyser.filter
+    i = bank.index('bench')
+    if backend == 'fast':
+        start = default_timer()
+        for c in coords:
+            bank.update_one(i, c, dt)
+    elif backend == 'cached':
+        start = default_timer()
+        for c in coords:
+            bank.update_cached(i, c, dt)
+    else:
+        start = default_timer()
+        for c in coords:
+            bank['bench'] = analyser.kalman_filter(c, dt, bank['bench'])
+    return (default_timer() - start) / n
+
+def time_analyse_data(backend = 'matrix', n = 2000, dt = 1./20,
+                      seed = None, outputs = None):
+    """
+    Measure the latency of Analyser.analyse_data for a stationary sensor
+    with noisy observations.
+
+    :param backend (optional): backend of the Analyser; default: 'matrix'
+    :param n (optional): number of updates; default: 2000
+    :param dt (optional): time increment between updates; default: 0.05
+    :param seed (optional): seed of noise generation; default: None
+    :param outputs (optional): outputs of the Analyser; default: None
+    :returns latency: mean time per update in seconds
+    """
+    analyser = Analyser(Queue(), backend = backend, outputs = outputs)
+    analyser.initialize_matrices()
+    coords = analyser.pos0 + RandomState(seed).randn(n, 2) * analyser.noise
+    stream = [MeasurementSpec(ID = 'bench', coords = c,
+                              time = START + timedelta(seconds = i * dt))
+              for i, c in enumerate(coords)]
+    start = default_timer()
+    for data in stream:
+        analyser.analyse_data(data)
+    return (default_timer() - start) / n
+
+def measure_throughput(sensors = 10, rate = 20, duration = 10.,
+                       backend = 'matrix', batch_size = 1, seed = None):
+    """
+    Measure the throughput of the analysis of a simulated session, which is
+    replayed into the analyser without sensors and queue.
+
+    :param sensors (optional): number of sensors; default: 10
+    :param rate (optional): sampling rate of the sensors in Hz; default: 20
+    :param duration (optional): simulated duration in seconds; default: 10
+    :param backend (optional): backend of the Analyser; default: 'matrix'
+    :param batch_size (optional): batch size of the replay; default: 1
+    :param seed (optional): seed of athletes and sensors; default: None
+    :returns rate: processed measurements per second
+    """
+    rs = RandomState(seed)
+    q = Queue()
+    sensor_list = []
+    for ID in range(sensors):
+        athlete = Athlete(seed = rs.randint(2**31))
+        sensor_list.append(Sensor(athlete, q, ID, rate = rate,
+                                  seed = rs.randint(2**31)))
+    stream = list(simulate_stream(sensor_list, duration, START))
+    analyser = Analyser(q, backend = backend)
+    return replay(analyser, stream, batch_size = batch_size).rate
+
+def measure_pipeline_throughput(sensors = 10, rate = 20, duration = 10.,
+                                backend = 'matrix', batch_size = 1,
+                                seed = None, wait = .05):
+    """
+    Measure the end-to-end throughput of a simulated session, in which every
+    athlete is sampled by a Sensor thread on its own SimulatedClock and the
+    measurements are passed through a Queue to Analyser.run in another
+    thread. The time until the analyser notices the empty queue is not
+    included.
+
+    :param sensors (optional): number of sensors; default: 10
+    :param rate (optional): sampling rate of the sensors in Hz; default: 20
+    :param duration (optional): simulated duration in seconds; default: 10
+    :param backend (optional): backend of the Analyser; default: 'matrix'
+    :param batch_size (optional): batch size of the Analyser; default: 1
+    :param seed (optional): seed of athletes and sensors; default: None
+    :param wait (optional): time after which the analyser stops when the
+    queue is empty; default: 0.05
+    :returns rate: processed measurements per second
+    """
+    rs = RandomState(seed)
+    q = Queue()
+    end = START + timedelta(seconds = duration)
+    sensor_list = []
+    for ID in range(sensors):
+        athlete = Athlete(seed = rs.randint(2**31))
+        sensor_list.append(Sensor(athlete, q, ID, rate = rate,
+                                  seed = rs.randint(2**31),
+                                  clock = SimulatedClock(START, end)))
+    analyser = Analyser(q, backend = backend, batch_size = batch_size,
+                        wait = wait, clock = SimulatedClock(START))
+    start = default_timer()
+    analyser.start()
+    for sensor in sensor_list:
+        sensor.start()
+    for sensor in sensor_list:
+        sensor.join()
+    analyser.join()
+    elapsed = default_timer() - start - wait
+    count = sum(store.count for store in analyser.sensors.values())
+    return count / elapsed
+
+def measure_pool_throughput(processes = 2, sensors = 100, rate = 20,
+                            duration = 10., batch_size = 256, seed = None):
+    """
+    Measure the throughput of an AnalyserPool with the 'fast' backend from
+    the first measurement until all results are collected. The start of the
+    worker processes is not included.
+
+    :param processes (optional): number of worker processes; default: 2
+    :param sensors (optional): number of sensors; default: 100
+    :param rate (optional): sampling rate of the sensors in Hz; default: 20
+    :param duration (optional): simulated duration in seconds; default: 10
+    :param batch_size (optional): batch size of the pool; default: 256
+    :param seed (optional): seed of athletes and sensors; default: None
+    :returns rate: processed measurements per second
+    """
+    rs = RandomState(seed)
+    q = Queue()
+    sensor_list = []
+    for ID in range(sensors):
+        athlete = Athlete(seed = rs.randint(2**31))
+        sensor_list.append(Sensor(athlete, q, ID, rate = rate,
+                                  seed = rs.randint(2**31)))
+    stream = list(simulate_stream(sensor_list, duration, START))
+    pool = AnalyserPool(processes, batch_size, backend = 'fast')
+    pool.start()
+    start = default_timer()
+    pool.put_batch(stream)
+    pool.stop()
+    return len(stream) / (default_timer() - start)
+
+def time_athlete_step(n = 2000, dt = 1./20, seed = None):
+    """
+    Measure the cost of a single step of Athlete.__call__.
+
+    :param n (optional): number of steps; default: 2000
+    :param dt (optional): time increment between steps; default: 0.05
+    :param seed (optional): random seed of athlete; default: None
+    :returns latency: mean time per step in seconds
+    """
+    athlete = Athlete(seed = seed)
+    times = [START + timedelta(seconds = i * dt) for i in range(n)]
+    start = default_timer()
+    for t in times:
+        athlete(t)
+    return (default_timer() - start) / n
+
+def time_swarm_step(athletes = 100, n = 500, dt = 1./20, seed = None):
+    """
+    Measure the cost per athlete and step of AthleteSwarm.simulate.
+
+    :param athletes (optional): number of athletes; default: 100
+    :param n (optional): number of steps; default: 500
+    :param dt (optional): time increment between steps; default: 0.05
+    :param seed (optional): random seed of the swarm; default: None
+    :returns latency: mean time per athlete and step in seconds
+    """
+    swarm = AthleteSwarm(athletes, seed = seed)
+    times = numpy.arange(n) * dt
+    start = default_timer()
+    swarm.simulate(times)
+    return (default_timer() - start) / (n * athletes)
+
+def measure_memory(lengths = (5000, 10000, 20000), sensors = 10,
+                   maxlen = None, seed = None):
+    """
+    Measure the memory used by the results in Analyser.sensors at several
+    lengths of a single run, such that its growth over a long session is
+    visible.
+
+    :param lengths (optional): increasing numbers of measurements per
+    sensor at which the memory is sampled; default: (5000, 10000, 20000)
+    :param sensors (optional): number of sensors; default: 10
+    :param maxlen (optional): maxlen of the Analyser; default: None
+    :param seed (optional): seed of noise generation; default: None
+    :returns bytes: list with the bytes allocated by all ResultStores at
+    every length
+    """
+    analyser = Analyser(Queue(), backend = 'fast', maxlen = maxlen)
+    analyser.initialize_matrices()
+    rs = RandomState(seed)
+    samples = []
+    i = 0
+    for n in lengths:
+        coords = analyser.pos0 + rs.randn(n - i, sensors, 2) * analyser.noise
+        for c in coords:
+            for ID in range(sensors):
+                analyser.analyse_data(MeasurementSpec(ID = ID, coords = c[ID],
+                                                      time = i * .05))
+            i += 1
+        samples.append(sum(c.nbytes for store in analyser.sensors.values()
+                           for c in store.columns.values()))
+    return samples
+
+def run_suite(quick = False, seed = 1):
+    """
+    Run all benchmarks.
+
+    :param quick (optional): reduce the size of the benchmarks, e.g. for
+    testing; default: False
+    :param seed (optional): random seed; default: 1
+    :returns report: dictionary with metadata and list of results, which
+    contain name, parameters, value, unit and whether lower or higher values
+    are better
+    """
+    scale = .05 if quick else 1.
+    n = max(int(2000 * scale), 10)
+    results = []
+    def add(name, params, value, unit, better):
+        if params:
+            name += '[%s]'%','.join('%s=%s'%(k, params[k])
+                                    for k in sorted(params))
+        results.append({'name': name, 'params': params,
+                        'value': value, 'unit': unit, 'better': better})
+    for backend in ['matrix', 'fast', 'cached']:
+        add('kalman_update', {'backend': backend},
+            time_kalman_update(backend, n, seed = seed), 's', 'lower')
+        add('analyse_data', {'backend': backend},
+            time_analyse_data(backend, n, seed = seed), 's', 'lower')
+    add('analyse_data', {'backend': 'fast', 'outputs': 'pos+dist'},
+        time_analyse_data('fast', n, seed = seed, outputs = ['pos', 'dist']),
+        's', 'lower')
+    for sensors in [1, 10, 100]:
+        for rate in [10, 20]:
+            for backend, batch_size in [('matrix', 1), ('fast', 1),
+                                        ('fast', 256)]:
+                params = {'sensors': sensors, 'rate': rate,
+                          'backend': backend, 'batch_size': batch_size}
+                duration = max(100. * scale / sensors, .5)
+                add('throughput', params,
+                    measure_throughput(sensors, rate, duration, backend,
+                                       batch_size, seed),
+                    'measurements/s', 'higher')
+    for sensors in [10, 100]:
+        for backend, batch_size in [('fast', 1), ('fast', 256)]:
+            params = {'sensors': sensors, 'backend': backend,
+                      'batch_size': batch_size}
+            duration = max(100. * scale / sensors, .5)
+            add('pipeline_throughput', params,
+                measure_pipeline_throughput(sensors, 20, duration, backend,
+                                            batch_size, seed),
+                'measurements/s', 'higher')
+    for processes in [1, 2, 4]:
+        add('pool_throughput', {'processes': processes, 'sensors': 100},
+            measure_pool_throughput(processes, 100, 20,
+                                    max(10. * scale, 1.), seed = seed),
+            'measurements/s', 'higher')
+    add('athlete_step', {}, time_athlete_step(n, seed = seed), 's', 'lower')
+    add('swarm_step', {'athletes': 100},
+        time_swarm_step(100, max(int(500 * scale), 10), seed = seed),
+        's', 'lower')
+    lengths = [max(int(n * scale), minimum) for n, minimum in
+               [(5000, 1000), (10000, 2000), (20000, 4000)]]
+    for maxlen in [None, 1000]:
+        samples = measure_memory(lengths, 10, maxlen, seed)
+        for n, nbytes in zip(lengths, samples):
+            add('memory', {'maxlen': maxlen, 'measurements': n}, nbytes,
+                'bytes', 'lower')
+    meta = {'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'date': datetime.now().isoformat(),
+            'quick': quick}
+    return {'meta': meta, 'results': results}
+
+def compare(baseline, current, tolerance = .1):
+    """
+    Compare two reports of run_suite.
+
+    :param baseline: report of reference run
+    :param current: report of new run
+    :param tolerance (optional): relative change that is not considered a
+    regression; default: 0.1
+    :returns regressions: list of (name, baseline value, current value) for
+    results that got worse by more than the tolerance
+    """
+    reference = dict((r['name'], r) for r in baseline['results'])
+    regressions = []
+    for r in current['results']:
+        if r['name'] not in reference:
+            continue
+        old = reference[r['name']]['value']
+        new = r['value']
+        if r['better'] == 'lower':
+            worse = new > old * (1 + tolerance)
+        else:
+            worse = new < old * (1 - tolerance)
+        if worse:
+            regressions.append((r['name'], old, new))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run benchmarks of the '
+                                     'athlete -> sensor -> analyser pipeline.')
+    parser.add_argument('--output', help = 'write JSON report to file')
+    parser.add_argument('--baseline', help = 'JSON report to compare to')
+    parser.add_argument('--tolerance', type = float, default = .1)
+    parser.add_argument('--quick', action = 'store_true')
+    args = parser.parse_args()
+    report = run_suite(quick = args.quick)
+    for r in report['results']:
+        print('%-70s %12.4g %s'%(r['name'], r['value'], r['unit']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for name, old, new in regressions:
+            print('Regression %s: %.4g -> %.4g'%(name, old, new))
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,292 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import json
+from threading import Thread, Event
+from timeit import default_timer
+from Queue import Queue, Empty
+from datetime import datetime
+from collections import deque
+from numpy import (array, savez_compressed, load, nan, isnan, concatenate,
+                   cumsum)
+
+from streamanalysis.results import ResultSpec
+from streamanalysis.aggregates import SensorAggregates
+from streamanalysis.utils import to_timestamp, from_timestamp
+
+# Scalar attributes of SensorAggregates, None is stored as nan
+AGGREGATE_FIELDS = ['start', 'time', 'dist', 'max_vel', 'stationary_time',
+                    'sprints', 'sprinting']
+
+class Checkpointer(Thread):
+
+    def __init__(self, path, interval = 10.0, poll = 0.1):
+        """
+        Writer thread for periodic checkpoints of an Analyser. Pass an
+        instance to Analyser, which captures a snapshot of its state with
+        capture every interval seconds and at the end of its run. Capturing
+        only copies the state, while converting, compressing and writing it
+        is left to this thread. A
+        snapshot is skipped if the previous one is still being written. If
+        the thread is not running, snapshots are written by the caller.
+
+        :param path: file name of the checkpoint, which is replaced
+        atomically by every new snapshot
+        :param interval (optional): time between snapshots in seconds;
+        default: 10
+        :param poll (optional): interval in seconds in which the thread
+        checks whether it was stopped; default: 0.1
+        """
+        super(Checkpointer, self).__init__()
+        self.path = path
+        self.interval = interval
+        self.poll = poll
+        self.pending = Queue(maxsize = 1)
+        self.running = Event()
+        self.last = None
+        # number of written and skipped snapshots
+        self.count = 0
+        self.skipped = 0
+
+    def due(self):
+        """
+        Return True if the next snapshot is due. The first call starts the
+        interval.
+        """
+        if self.last is None:
+            self.last = default_timer()
+        return default_timer() - self.last >= self.interval
+
+    def submit(self, analyser, block = False):
+        """
+        Capture a snapshot of the analyser and hand it to the thread.
+
+        :param analyser: Analyser instance, only called from its thread
+        :param block (optional): wait for the previous snapshot to be
+        written instead of skipping the new one; default: False
+        :returns: True if the snapshot was taken, False if it was skipped
+        """
+        self.last = default_timer()
+        if not self.isAlive():
+            save(analyser, self.path)
+            self.count += 1
+            return True
+        if not block and self.pending.full():
+            self.skipped += 1
+            return False
+        self.pending.put(capture(analyser))
+        return True
+
+    def run(self):
+        """
+        Write snapshots until the thread is stopped and all pending
+        snapshots are written.
+        """
+        while not (self.running.isSet() and self.pending.empty()):
+            try:
+                snapshot = self.pending.get(timeout = self.poll)
+            except Empty:
+                continue
+            write(self.path, pack(snapshot))
+            self.count += 1
+
+    def stop(self):
+        """
+        Stop thread.
+        """
+        self.running.set()
+
+
+def capture(analyser):
+    """
+    Copy the state of an analyser that is needed to resume the analysis:
+    the Kalman Filters of the FilterBank including their steady-state flags,
+    the last result of every sensor, and the running aggregates. Only the
+    arrays of the filter bank and the aggregates are copied, the results
+    are referenced since they are not modified once they are created. Use
+    pack to convert the snapshot into arrays.
+
+    :param analyser: Analyser instance
+    :returns snapshot: dictionary with the state
+    """
+    bank = analyser.filter
+    IDs = list(bank.keys)
+    n = len(IDs)
+    snapshot = {'IDs': IDs,
+                'params': (bank.noise, bank.acc_noise),
+                'X': bank.X[:n].copy(),
+                'P': bank.P[:n].copy(),
+                'steady': bank.steady[:n].copy(),
+                'last': [analyser.sensors[ID].last for ID in IDs],
+                'aggregates': None}
+    aggregates = analyser.aggregates
+    if aggregates is not None:
+        windows = sorted(aggregates.windows)
+        sensors = []
+        for ID in IDs:
+            s = aggregates.sensors.get(ID)
+            if s is not None:
+                s = (tuple(getattr(s, name) for name in AGGREGATE_FIELDS),
+                     [list(s.dists[w]) for w in windows],
+                     [list(s.speeds[w]) for w in windows])
+            sensors.append(s)
+        snapshot['aggregates'] = (windows, aggregates.sprint_speed, sensors)
+    return snapshot
+
+def pack(snapshot):
+    """
+    Convert a snapshot of capture into arrays. The windowed deques of the
+    aggregates of all sensors are concatenated with their lengths stored
+    alongside.
+
+    :param snapshot: dictionary returned by capture
+    :returns arrays: dictionary of numpy arrays
+    """
+    n = len(snapshot['IDs'])
+    last = snapshot['last']
+    arrays = {'IDs': array(json.dumps(snapshot['IDs'])),
+              'params': array(snapshot['params']),
+              'X': snapshot['X'],
+              'P': snapshot['P'],
+              'steady': snapshot['steady'],
+              'pos': array([res.pos for res in last]).reshape(n, 2),
+              'pos_err': array([res.pos_err for res in last]).reshape(n, 2),
+              'vel': array([res.vel for res in last]).reshape(n, 2),
+              'vel_err': array([res.vel_err for res in last]).reshape(n, 2),
+              'tot_vel': array([res.tot_vel for res in last], dtype = float),
+              'dist': array([res.dist for res in last], dtype = float),
+              'stationary': array([res.stationary for res in last],
+                                  dtype = bool),
+              'time': array([to_timestamp(res.time) for res in last],
+                            dtype = float),
+              'datetime': array([isinstance(res.time, datetime)
+                                 for res in last], dtype = bool)}
+    if snapshot['aggregates'] is None:
+        return arrays
+    windows, sprint_speed, sensors = snapshot['aggregates']
+    arrays['agg_windows'] = array(windows, dtype = float)
+    arrays['agg_sprint_speed'] = array(sprint_speed)
+    arrays['agg_present'] = array([s is not None for s in sensors],
+                                  dtype = bool)
+    for j, name in enumerate(AGGREGATE_FIELDS):
+        arrays['agg_' + name] = array([nan if s is None or s[0][j] is None
+                                       else s[0][j] for s in sensors],
+                                      dtype = float)
+    for k in range(len(windows)):
+        for m, name in [(1, 'dists'), (2, 'speeds')]:
+            entries = [s[m][k] if s is not None else [] for s in sensors]
+            arrays['agg_%s_%i'%(name, k)] = \
+                array([e for d in entries for e in d],
+                      dtype = float).reshape(-1, 2)
+            arrays['agg_%s_count_%i'%(name, k)] = \
+                array([len(d) for d in entries], dtype = int)
+    return arrays
+
+def write(path, arrays):
+    """
+    Write arrays to a compressed npz file. The file is written next to path
+    and renamed afterwards, such that path always holds a complete
+    checkpoint.
+
+    :param path: file name
+    :param arrays: dictionary of numpy arrays
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        savez_compressed(f, **arrays)
+    os.rename(tmp, path)
+
+def save(analyser, path):
+    """
+    Write a checkpoint of an analyser.
+
+    :param analyser: Analyser instance
+    :param path: file name
+    """
+    write(path, pack(capture(analyser)))
+
+def restore(analyser, path):
+    """
+    Restore the state of a checkpoint into an analyser, which continues the
+    analysis of the sensors from their last results. The ResultStore
+    instances of the sensors are empty apart from their last result. The
+    SpatialHash of the analyser is updated with the last positions.
+
+    :param analyser: Analyser instance that has not processed any data yet
+    :param path: file name of the checkpoint
+    :returns IDs: list of restored sensor IDs
+    """
+    with open(path, 'rb') as f:
+        arrays = dict(load(f, allow_pickle = False).items())
+    bank = analyser.filter
+    if tuple(arrays['params']) != (bank.noise, bank.acc_noise):
+        raise ValueError('Checkpoint was written with different filter '
+                         'parameters')
+    IDs = json.loads(arrays['IDs'].item())
+    rows = array([bank.index(ID) for ID in IDs], dtype = int)
+    if len(rows):
+        bank.X[rows] = arrays['X']
+        bank.P[rows] = arrays['P']
+        bank.steady[rows] = arrays['steady']
+    for i, ID in enumerate(IDs):
+        time = arrays['time'][i].item()
+        if arrays['datetime'][i]:
+            time = from_timestamp(time)
+        store = analyser.initialize_store()
+        store.last = ResultSpec(pos = arrays['pos'][i],
+                                pos_err = arrays['pos_err'][i],
+                                vel = arrays['vel'][i],
+                                vel_err = arrays['vel_err'][i],
+                                tot_vel = arrays['tot_vel'][i].item(),
+                                dist = arrays['dist'][i].item(),
+                                stationary = bool(arrays['stationary'][i]),
+                                time = time)
+        analyser.sensors[ID] = store
+    if analyser.aggregates is not None and 'agg_windows' in arrays:
+        restore_aggregates(analyser.aggregates, IDs, arrays)
+    if analyser.spatial is not None:
+        analyser.spatial.update_many(IDs, arrays['pos'])
+    return IDs
+
+def restore_aggregates(aggregates, IDs, arrays):
+    """
+    Recreate the SensorAggregates instances of the sensors from the arrays
+    of pack.
+
+    :param aggregates: Aggregates instance
+    :param IDs: list of sensor IDs
+    :param arrays: dictionary of numpy arrays
+    """
+    windows = arrays['agg_windows'].tolist()
+    if sorted(aggregates.windows) != windows:
+        raise ValueError('Checkpoint was written with different windows')
+    # entries and offsets of the windowed deques of the sensors
+    entries = {}
+    for k, w in enumerate(windows):
+        for name in ['dists', 'speeds']:
+            values = arrays['agg_%s_%i'%(name, k)]
+            counts = arrays['agg_%s_count_%i'%(name, k)]
+            offsets = concatenate([[0], cumsum(counts)]).tolist()
+            entries[name, w] = (list(zip(values[:, 0].tolist(),
+                                         values[:, 1].tolist())), offsets)
+    for i, ID in enumerate(IDs):
+        if not arrays['agg_present'][i]:
+            continue
+        sensor = SensorAggregates(aggregates.windows,
+                                  float(arrays['agg_sprint_speed']))
+        for name in AGGREGATE_FIELDS:
+            value = arrays['agg_' + name][i].item()
+            if isnan(value):
+                value = None
+            elif name == 'sprints':
+                value = int(value)
+            elif name == 'sprinting':
+                value = bool(value)
+            setattr(sensor, name, value)
+        for (name, w), (values, offsets) in entries.items():
+            getattr(sensor, name)[w] = deque(values[offsets[i]:
+                                                    offsets[i + 1]])
+        aggregates.sensors[ID] = sensor
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from math import ceil
+from datetime import datetime, timedelta
+
+class WallClock(object):
+    """
+    Clock that returns the current time and really waits.
+    """
+
+    def now(self):
+        """
+        :returns time: datetime instance of current time
+        """
+        return datetime.now()
+
+    def wait(self, event, timeout):
+        """
+        Wait until event is set or timeout has passed.
+
+        :param event: threading.Event instance
+        :param timeout: time to wait in seconds
+        """
+        event.wait(timeout)
+
+
+class SimulatedClock(object):
+
+    def __init__(self, start = None, end = None):
+        """
+        Clock that jumps forward instead of waiting, such that threads using
+        it run as fast as possible. Every thread should use its own instance.
+
+        :param start (optional): datetime instance of initial time;
+        default: current time
+        :param end (optional): datetime instance at which waiting events are
+        set, e.g. to stop a Sensor; default: None
+        """
+        if start is None:
+            start = datetime.now()
+        self.time = start
+        self.end = end
+
+    def now(self):
+        """
+        :returns time: datetime instance of simulated time
+        """
+        return self.time
+
+    def wait(self, event, timeout):
+        """
+        Advance the simulated time by timeout (rounded up to microseconds)
+        and set event if the end of the clock is reached.
+
+        :param event: threading.Event instance
+        :param timeout: time to advance in seconds
+        """
+        if timeout > 0:
+            microseconds = max(ceil(round(timeout * 1e6, 3)), 1)
+            self.time += timedelta(microseconds = microseconds)
+        if self.end is not None and self.time >= self.end:
+            event.set()
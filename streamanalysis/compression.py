@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from math import hypot
+
+from streamanalysis.utils import to_timestamp
+
+class Deadband(object):
+
+    def __init__(self, pos_tol = 0.2, vel_tol = 0.5, max_interval = 1.0):
+        """
+        Deadband compression of the result stream of an Analyser. A result
+        is only kept if its position deviates by more than pos_tol from the
+        linear extrapolation of the last kept result, its velocity deviates
+        by more than vel_tol (both with vanishing velocity for stationary
+        sensors), its stationarity changed, or max_interval
+        seconds passed since the last kept result. The dropped results are
+        reconstructed by interpolation between the kept results with
+        ResultStore.interpolate, ResultStore.at, or results.resample.
+
+        :param pos_tol (optional): tolerance of the position in meters;
+        default: 0.2
+        :param vel_tol (optional): tolerance of the velocity in m/s;
+        default: 0.5
+        :param max_interval (optional): maximal time between kept results
+        in seconds; default: 1
+        """
+        self.pos_tol = pos_tol
+        self.vel_tol = vel_tol
+        self.max_interval = max_interval
+        # last kept position, velocity, stationarity and time per sensor
+        self.reference = {}
+        # flag per sensor whether the latest result was dropped
+        self.pending = {}
+        self.seen = 0
+        self.kept = 0
+
+    @property
+    def ratio(self):
+        """
+        Compression ratio, i.e. number of results per kept result.
+        """
+        return self.seen / self.kept if self.kept else 1.0
+
+    def accept(self, ID, result):
+        """
+        Decide whether result is kept and update the reference of the sensor
+        if it is.
+
+        :param ID: sensor ID
+        :param result: ResultSpec or LazyResult instance
+        :returns: True if result is kept, False if it is dropped
+        """
+        self.seen += 1
+        time = to_timestamp(result.time)
+        pos = result.pos
+        vel = result.vel
+        try:
+            ref_pos, ref_vel, stationary, ref_time = self.reference[ID]
+        except KeyError:
+            pass
+        else:
+            dt = time - ref_time
+            if stationary:
+                # velocity of stationary sensors is consistent with zero
+                ref_vel = (0.0, 0.0)
+                vel = ref_vel
+            if dt < self.max_interval and stationary == result.stationary \
+               and hypot(pos[0] - ref_pos[0] - ref_vel[0] * dt,
+                         pos[1] - ref_pos[1] - ref_vel[1] * dt) \
+                   <= self.pos_tol \
+               and hypot(vel[0] - ref_vel[0], vel[1] - ref_vel[1]) \
+                   <= self.vel_tol:
+                self.pending[ID] = True
+                return False
+        self.reference[ID] = (pos, vel, result.stationary, time)
+        self.pending[ID] = False
+        self.kept += 1
+        return True
+
+    def flush(self):
+        """
+        Return the sensors whose latest result was dropped and count these
+        results as kept. They have to be stored, such that the end of the
+        stream can be reconstructed.
+
+        :returns IDs: list of sensor IDs
+        """
+        IDs = [ID for ID, pending in list(self.pending.items()) if pending]
+        for ID in IDs:
+            self.pending[ID] = False
+        self.kept += len(IDs)
+        return IDs
@@ -0,0 +1,403 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from numpy import (zeros, eye, asarray, asmatrix, arange, einsum, matmul,
+                   concatenate, rint, flatnonzero, unique, ones, ndim)
+from numpy.linalg import inv
+from collections import namedtuple as nt, OrderedDict
+
+FilterSpec = nt('filter', ['X', 'P'])
+GainSpec = nt('gain', ['dt', 'pp', 'pv', 'vv', 'k0', 'k1'])
+
+POS_IDX = [0, 2]
+VEL_IDX = [1, 3]
+
+class FilterBank(object):
+
+    def __init__(self, pos0 = [50.0, 50.0], vel0 = [0.0, 0.0],
+                 noise = 0.3, acc_noise = 4.0, capacity = 16,
+                 resolution = 1e-3, cache_size = 8, rtol = 1e-3):
+        """
+        State of the Kalman Filters of many sensors stored as struct of
+        arrays. The state vectors of all sensors are kept in self.X with
+        shape (N, 4) and the covariances in self.P with shape (N, 4, 4),
+        where the rows are assigned to the sensor IDs in order of appearance.
+        Indexing the bank with a sensor ID returns a FilterSpec instance
+        containing numpy.matrix views of the corresponding rows.
+
+        :param pos0 (optional): list of initial positions for the Kalman
+        Filter; default: [50, 50]
+        :param vel0 (optional): list of initial velocities for the Kalman
+        Filter; default: [0, 0]
+        :param noise (optional): standard deviation of noise on observations
+        :param acc_noise (optional): estimate for standard deviation in
+        acceleration; default: 4.0
+        :param capacity (optional): number of sensors for which memory is
+        allocated initially; default: 16
+        :param resolution (optional): resolution in seconds to which time
+        increments are quantized for the cached steady-state gains of
+        update_cached; default: 0.001
+        :param cache_size (optional): number of quantized time increments
+        for which steady-state gains are cached; default: 8
+        :param rtol (optional): relative tolerance at which a covariance is
+        considered as converged to the steady state, which has to allow for
+        the jitter of the time increments within the resolution;
+        default: 0.001
+        """
+        self.pos0 = pos0
+        self.vel0 = vel0
+        self.noise = noise
+        self.acc_noise = acc_noise
+        self.ids = {}
+        self.keys = []
+        self.X = zeros((capacity, 4))
+        self.P = zeros((capacity, 4, 4))
+        self.R = eye(2) * (noise * noise)
+        self.r = noise * noise
+        self.q = acc_noise * acc_noise
+        self.gains = GainCache(self.r, self.q, resolution, cache_size)
+        self.rtol = rtol
+        # quantized time increment for which the covariance of the row is in
+        # the steady state, -1 if it is not
+        self.steady = -ones(capacity, dtype = int)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __contains__(self, ID):
+        return ID in self.ids
+
+    def __getitem__(self, ID):
+        i = self.ids[ID]
+        return FilterSpec(X = asmatrix(self.X[i][:,None]),
+                          P = asmatrix(self.P[i]))
+
+    def __setitem__(self, ID, Filter):
+        i = self.index(ID)
+        self.X[i] = asarray(Filter.X).ravel()
+        self.P[i] = Filter.P
+        self.steady[i] = -1
+
+    def items(self):
+        return [(ID, self[ID]) for ID in self.keys]
+
+    def index(self, ID):
+        """
+        Return the row of the sensor in the bank and initialize the filter
+        if the sensor is new.
+
+        :param ID: sensor ID
+        :returns i: row of sensor in self.X and self.P
+        """
+        try:
+            return self.ids[ID]
+        except KeyError:
+            return self.add(ID)
+
+    def add(self, ID):
+        """
+        Add new sensor to the bank. As in Analyser.initialize_filter, the
+        filter assumes perfect knowledge of the initial values.
+
+        :param ID: sensor ID
+        :returns i: row of sensor in self.X and self.P
+        """
+        i = len(self.keys)
+        if i == self.X.shape[0]:
+            # double capacity of the arrays
+            self.X = concatenate([self.X, zeros(self.X.shape)])
+            self.P = concatenate([self.P, zeros(self.P.shape)])
+            self.steady = concatenate([self.steady, -ones(i, dtype = int)])
+        self.X[i] = [self.pos0[0], self.vel0[0], self.pos0[1], self.vel0[1]]
+        self.P[i] = 0.0
+        self.steady[i] = -1
+        self.ids[ID] = i
+        self.keys.append(ID)
+        return i
+
+    def update(self, rows, coords, dt):
+        """
+        Update the Kalman Filters of several sensors in one vectorized pass.
+        Every row may only appear once.
+
+        :param rows: array of rows of the sensors in the bank
+        :param coords: array of observed coordinates with shape (n, 2)
+        :param dt: array of time increments with respect to the previous
+        state of the filters
+        """
+        rows = asarray(rows)
+        coords = asarray(coords, dtype = float)
+        dt = asarray(dt, dtype = float)
+        n = len(rows)
+        # Matrices that describe the update for position and velocity
+        F = zeros((n, 4, 4))
+        F[:, arange(4), arange(4)] = 1.0
+        F[:, 0, 1] = dt
+        F[:, 2, 3] = dt
+        # Matrices that describe uncertainty in the prediction due to
+        # acceleration
+        G = zeros((n, 4, 2))
+        G[:, 0, 0] = G[:, 2, 1] = dt * dt * .5
+        G[:, 1, 0] = G[:, 3, 1] = dt
+        Q = (self.acc_noise * self.acc_noise) * matmul(G,
+                                                       G.transpose(0, 2, 1))
+        # Prediction from previous state of the filters
+        xk = einsum('nij,nj->ni', F, self.X[rows])
+        Pk = matmul(matmul(F, self.P[rows]), F.transpose(0, 2, 1)) + Q
+        # Residual difference between prediction and observation
+        yk = coords - xk[:, POS_IDX]
+        # Adaption of model and error according to residual
+        PHt = Pk[:, :, POS_IDX]
+        Sk = PHt[:, POS_IDX, :] + self.R
+        Kk = matmul(PHt, inv(Sk))
+        self.X[rows] = xk + einsum('nij,nj->ni', Kk, yk)
+        self.P[rows] = Pk - matmul(Kk, Pk[:, POS_IDX, :])
+
+    def update_one(self, i, coords, dt):
+        """
+        Update the Kalman Filter of a single sensor in place. Since x and y
+        are independent in the constant velocity model, the update splits
+        into two problems with 2x2 covariances and scalar innovations, which
+        are solved in closed form without temporary matrices. Covariances
+        between the axes are assumed to vanish.
+
+        :param i: row of the sensor in the bank
+        :param coords: observed coordinates
+        :param dt: time increment with respect to the previous state
+        """
+        X = self.X[i]
+        P = self.P[i]
+        r = self.r
+        dt2 = dt * dt
+        # Process noise due to acceleration
+        q11 = self.q * dt2 * dt2 * .25
+        q12 = self.q * dt2 * dt * .5
+        q22 = self.q * dt2
+        for p, v, z in ((0, 1, coords[0]), (2, 3, coords[1])):
+            pv = P.item(p, v)
+            vv = P.item(v, v)
+            # Prediction of state and error covariance
+            x = X.item(p) + dt * X.item(v)
+            a = P.item(p, p) + 2 * dt * pv + dt2 * vv + q11
+            b = pv + dt * vv + q12
+            c = vv + q22
+            # Gain from the scalar innovation covariance
+            s = a + r
+            k0 = a / s
+            k1 = b / s
+            y = z - x
+            X[p] = x + k0 * y
+            X[v] += k1 * y
+            P[p, p] = (1 - k0) * a
+            P[p, v] = P[v, p] = (1 - k0) * b
+            P[v, v] = c - k1 * b
+
+    def update_decoupled(self, rows, coords, dt):
+        """
+        Vectorized version of update_one for several sensors. Every row may
+        only appear once.
+
+        :param rows: array of rows of the sensors in the bank
+        :param coords: array of observed coordinates with shape (n, 2)
+        :param dt: array of time increments with respect to the previous
+        state of the filters
+        """
+        rows = asarray(rows)
+        coords = asarray(coords, dtype = float)
+        dt = asarray(dt, dtype = float)[:, None]
+        X = self.X[rows]
+        P = self.P[rows]
+        dt2 = dt * dt
+        pp = P[:, POS_IDX, POS_IDX]
+        pv = P[:, POS_IDX, VEL_IDX]
+        vv = P[:, VEL_IDX, VEL_IDX]
+        # Prediction of state and error covariance for both axes
+        x = X[:, POS_IDX] + dt * X[:, VEL_IDX]
+        a = pp + 2 * dt * pv + dt2 * vv + self.q * dt2 * dt2 * .25
+        b = pv + dt * vv + self.q * dt2 * dt * .5
+        c = vv + self.q * dt2
+        # Gain from the scalar innovation covariances
+        k0 = a / (a + self.r)
+        k1 = b / (a + self.r)
+        y = coords - x
+        X[:, POS_IDX] = x + k0 * y
+        X[:, VEL_IDX] += k1 * y
+        P[:, POS_IDX, POS_IDX] = (1 - k0) * a
+        P[:, POS_IDX, VEL_IDX] = P[:, VEL_IDX, POS_IDX] = (1 - k0) * b
+        P[:, VEL_IDX, VEL_IDX] = c - k1 * b
+        self.X[rows] = X
+        self.P[rows] = P
+
+    def update_cached(self, i, coords, dt):
+        """
+        Update the Kalman Filter of a single sensor in place using the cached
+        steady-state gain of the quantized time increment if the covariance
+        has converged. Otherwise the full update of update_one is done and
+        the covariance is compared to the steady state afterwards, such that
+        the sensor falls back to the full update after irregular gaps and
+        switches to the steady state again once it has reconverged.
+
+        :param i: row of the sensor in the bank
+        :param coords: observed coordinates
+        :param dt: time increment with respect to the previous state
+        """
+        key, gain = self.gains.get(dt)
+        if self.steady[i] == key:
+            # Steady state: covariance is unchanged and gain is constant
+            X = self.X[i]
+            k0 = gain.k0
+            k1 = gain.k1
+            x0, v0, x1, v1 = X.tolist()
+            x0 += dt * v0
+            x1 += dt * v1
+            y0 = coords[0] - x0
+            y1 = coords[1] - x1
+            X[:] = (x0 + k0 * y0, v0 + k1 * y0, x1 + k0 * y1, v1 + k1 * y1)
+            return
+        self.update_one(i, coords, dt)
+        self.steady[i] = key if self.is_steady(self.P[i], gain) else -1
+
+    def update_cached_batch(self, rows, coords, dt):
+        """
+        Vectorized version of update_cached for several sensors. Every row
+        may only appear once.
+
+        :param rows: array of rows of the sensors in the bank
+        :param coords: array of observed coordinates with shape (n, 2)
+        :param dt: array of time increments with respect to the previous
+        state of the filters
+        """
+        rows = asarray(rows)
+        coords = asarray(coords, dtype = float)
+        dt = asarray(dt, dtype = float)
+        keys = self.gains.quantize(dt)
+        fast = self.steady[rows] == keys
+        for key in unique(keys[fast]).tolist():
+            sel = flatnonzero(fast & (keys == key))
+            gain = self.gains.get_key(key)
+            r = rows[sel]
+            X = self.X[r]
+            x = X[:, POS_IDX] + dt[sel, None] * X[:, VEL_IDX]
+            y = coords[sel] - x
+            X[:, POS_IDX] = x + gain.k0 * y
+            X[:, VEL_IDX] += gain.k1 * y
+            self.X[r] = X
+        slow = flatnonzero(~fast)
+        if len(slow):
+            r = rows[slow]
+            self.update_decoupled(r, coords[slow], dt[slow])
+            for row, key in zip(r.tolist(), keys[slow].tolist()):
+                gain = self.gains.get_key(key)
+                self.steady[row] = key if self.is_steady(self.P[row],
+                                                         gain) else -1
+
+    def is_steady(self, P, gain):
+        """
+        Test if the covariance of both axes agrees with the steady state.
+
+        :param P: covariance of a single filter
+        :param gain: GainSpec instance
+        :returns: True if the covariance converged, False else
+        """
+        rtol = self.rtol
+        for p, v in ((0, 1), (2, 3)):
+            if abs(P.item(p, p) - gain.pp) > rtol * gain.pp or \
+               abs(P.item(p, v) - gain.pv) > rtol * abs(gain.pv) or \
+               abs(P.item(v, v) - gain.vv) > rtol * gain.vv:
+                return False
+        return True
+
+
+class GainCache(object):
+
+    def __init__(self, r, q, resolution = 1e-3, size = 8):
+        """
+        Least recently used cache of the steady-state covariance and gain of
+        the decoupled Kalman Filter per quantized time increment. The steady
+        state is found by iterating the update of the covariance until it
+        converges.
+
+        :param r: variance of the observations
+        :param q: variance of the acceleration
+        :param resolution (optional): resolution in seconds to which time
+        increments are quantized; default: 0.001
+        :param size (optional): maximal number of cached time increments;
+        default: 8
+        """
+        self.r = r
+        self.q = q
+        self.resolution = resolution
+        self.size = size
+        self.entries = OrderedDict()
+        # most recently used key and entry
+        self.last = (None, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def quantize(self, dt):
+        """
+        Return the key of the time increment(s).
+        """
+        if ndim(dt) == 0:
+            return int(round(dt / self.resolution))
+        return rint(asarray(dt) / self.resolution).astype(int)
+
+    def get(self, dt):
+        """
+        Return key and GainSpec instance of the time increment.
+        """
+        key = int(round(dt / self.resolution))
+        if key == self.last[0]:
+            return self.last
+        return key, self.get_key(key)
+
+    def get_key(self, key):
+        """
+        Return GainSpec instance of the quantized time increment and compute
+        it if it is not cached.
+        """
+        entries = self.entries
+        try:
+            gain = entries.pop(key)
+        except KeyError:
+            gain = self.compute(max(key, 1) * self.resolution)
+            if len(entries) >= self.size:
+                entries.popitem(last = False)
+        entries[key] = gain
+        self.last = (key, gain)
+        return gain
+
+    def compute(self, dt, maxiter = 100000):
+        """
+        Compute steady-state covariance and gain.
+
+        :param dt: time increment
+        :param maxiter (optional): maximal number of iterations;
+        default: 100000
+        :returns gain: GainSpec instance
+        """
+        r = self.r
+        dt2 = dt * dt
+        q11 = self.q * dt2 * dt2 * .25
+        q12 = self.q * dt2 * dt * .5
+        q22 = self.q * dt2
+        pp = pv = vv = 0.0
+        for n in range(maxiter):
+            a = pp + 2 * dt * pv + dt2 * vv + q11
+            b = pv + dt * vv + q12
+            c = vv + q22
+            k0 = a / (a + r)
+            k1 = b / (a + r)
+            new = ((1 - k0) * a, (1 - k0) * b, c - k1 * b)
+            converged = abs(new[0] - pp) <= 1e-15 * new[0] and \
+                        abs(new[2] - vv) <= 1e-15 * new[2]
+            pp, pv, vv = new
+            if converged:
+                break
+        return GainSpec(dt = dt, pp = pp, pv = pv, vv = vv, k0 = k0, k1 = k1)
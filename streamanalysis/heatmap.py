@@ -0,0 +1,201 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from threading import Lock
+from numpy import (array, asarray, zeros, concatenate, ceil, maximum, arange,
+                   add)
+
+from streamanalysis.utils import to_timestamp
+
+class Heatmaps(object):
+
+    def __init__(self, limits = array([100, 100]), cell = 1.0, groups = None,
+                 capacity = 16, batch_size = 1024):
+        """
+        Occupancy heatmaps of the sensors and of groups of sensors, i.e. the
+        time in seconds spent in every cell of a uniform grid over the
+        field. Every result adds the time since the previous result of the
+        sensor to the cell of the previous position. The updates are
+        buffered and accumulated in batches with numpy.add.at into one row
+        of self.counts per sensor and one row of self.group_counts per
+        group, such that the memory is independent of the duration of the
+        session. Positions outside of the field are assigned to the closest
+        border cell. Pass an instance to Analyser to update the heatmaps
+        whenever a result is stored. The heatmaps can be read from other
+        threads while they are updated, buffers and arrays are guarded by
+        self.lock.
+
+        :param limits (optional): size of the field in meters as in Athlete;
+        default: [100, 100]
+        :param cell (optional): edge length of the grid cells in meters;
+        default: 1
+        :param groups (optional): dictionary with lists of sensor IDs per
+        group name, e.g. teams; default: None
+        :param capacity (optional): number of sensors for which memory is
+        allocated initially; default: 16
+        :param batch_size (optional): number of buffered updates after which
+        they are accumulated; default: 1024
+        """
+        self.limits = asarray(limits, dtype = float)
+        self.cell = cell
+        self.shape = tuple(int(n) for n in
+                           maximum(ceil(self.limits / cell), 1))
+        size = self.shape[0] * self.shape[1]
+        self.batch_size = batch_size
+        self.ids = {}
+        self.keys = []
+        self.counts = zeros((capacity, size))
+        if groups is None:
+            groups = {}
+        self.groups = dict((name, k) for k, name in enumerate(groups))
+        self.group_counts = zeros((len(groups), size))
+        # group indices per sensor ID and membership per row
+        self.members = {}
+        for name, IDs in groups.items():
+            for ID in IDs:
+                self.members.setdefault(ID, []).append(self.groups[name])
+        self.membership = zeros((capacity, len(groups)), dtype = bool)
+        # cell and time of the previous result per row
+        self.cells = []
+        self.times = []
+        # buffered updates as (row, cell, weight)
+        self.pending = []
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, ID):
+        return ID in self.ids
+
+    @property
+    def edges(self):
+        """
+        Edges of the cells along both axes as in numpy.histogram2d.
+        """
+        return [arange(n + 1) * self.cell for n in self.shape]
+
+    def get_cell(self, pos):
+        """
+        Return index of the cell of position in the flattened grid.
+        """
+        cx = min(max(int(pos[0] // self.cell), 0), self.shape[0] - 1)
+        cy = min(max(int(pos[1] // self.cell), 0), self.shape[1] - 1)
+        return cx * self.shape[1] + cy
+
+    def add(self, ID, result):
+        """
+        Add time since the previous result of the sensor to the heatmaps.
+
+        :param ID: sensor ID
+        :param result: ResultSpec instance
+        """
+        time = to_timestamp(result.time)
+        cell = self.get_cell(result.pos)
+        with self.lock:
+            try:
+                i = self.ids[ID]
+            except KeyError:
+                i = self.add_sensor(ID)
+            else:
+                self.pending.append((i, self.cells[i], time - self.times[i]))
+                if len(self.pending) >= self.batch_size:
+                    self.accumulate()
+            self.cells[i] = cell
+            self.times[i] = time
+
+    def add_sensor(self, ID):
+        """
+        Assign a row of self.counts to a new sensor, the caller has to hold
+        self.lock.
+
+        :param ID: sensor ID
+        :returns i: row of sensor
+        """
+        i = len(self.keys)
+        if i == len(self.counts):
+            # double capacity of the arrays
+            self.counts = concatenate([self.counts, zeros(self.counts.shape)])
+            self.membership = concatenate([self.membership,
+                                           zeros(self.membership.shape,
+                                                 dtype = bool)])
+        self.membership[i, self.members.get(ID, [])] = True
+        self.ids[ID] = i
+        self.keys.append(ID)
+        self.cells.append(0)
+        self.times.append(None)
+        return i
+
+    def flush(self):
+        """
+        Accumulate the buffered updates.
+        """
+        with self.lock:
+            self.accumulate()
+
+    def accumulate(self):
+        """
+        Accumulate the buffered updates, the caller has to hold self.lock.
+        """
+        if not self.pending:
+            return
+        pending = array(self.pending)
+        self.pending = []
+        rows = pending[:, 0].astype(int)
+        cells = pending[:, 1].astype(int)
+        weights = pending[:, 2]
+        add.at(self.counts, (rows, cells), weights)
+        if len(self.groups):
+            update, group = self.membership[rows].nonzero()
+            add.at(self.group_counts, (group, cells[update]),
+                   weights[update])
+
+    def get_map(self, counts, normed):
+        """
+        Reshape the counts of a row onto the grid and normalize them.
+        """
+        heatmap = counts.reshape(self.shape)
+        if normed:
+            total = heatmap.sum()
+            return heatmap / total if total > 0 else heatmap.copy()
+        return heatmap.copy()
+
+    def heatmap(self, ID, normed = False):
+        """
+        Return the heatmap of a sensor.
+
+        :param ID: sensor ID
+        :param normed (optional): return fractions of the total time instead
+        of seconds; default: False
+        :returns heatmap: array with the shape of the grid, indexed by the
+        cells along the x and y axes as in numpy.histogram2d
+        """
+        with self.lock:
+            self.accumulate()
+            return self.get_map(self.counts[self.ids[ID]], normed)
+
+    def group(self, name, normed = False):
+        """
+        Return the heatmap of a group, i.e. the sum of the heatmaps of its
+        sensors.
+
+        :param name: name of group
+        :param normed (optional): return fractions of the total time instead
+        of seconds; default: False
+        :returns heatmap: array with the shape of the grid
+        """
+        with self.lock:
+            self.accumulate()
+            return self.get_map(self.group_counts[self.groups[name]],
+                                normed)
+
+    def total(self, normed = False):
+        """
+        Return the sum of the heatmaps of all sensors.
+        """
+        with self.lock:
+            self.accumulate()
+            return self.get_map(self.counts[:len(self.keys)].sum(axis = 0),
+                                normed)
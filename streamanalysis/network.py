@@ -0,0 +1,255 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import time
+import socket
+import select
+import struct
+from threading import Thread, Event
+from timeit import default_timer
+from Queue import Queue
+from numpy.random.mtrand import RandomState
+
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.replay import simulate_stream, ReplaySpec
+from streamanalysis.wire import (MEASUREMENT_DTYPE, SensorIndex, to_records,
+                                 encode, decode)
+
+PROTOCOLS = ['udp', 'tcp']
+
+# Length prefix of the frames on TCP connections
+HEADER = struct.Struct('<I')
+
+# Maximal number of records per message, such that a message fits into a
+# single datagram
+MAX_BATCH = 2048
+
+# Maximal size of a message in bytes, longer TCP frames are rejected
+MAX_MESSAGE = MAX_BATCH * MEASUREMENT_DTYPE.itemsize
+
+class IngestServer(Thread):
+
+    def __init__(self, analyser, index, host = '127.0.0.1', port = 0,
+                 protocol = 'udp', poll = 0.1, buffer_size = 2**22):
+        """
+        Server thread which receives batches of measurements in the binary
+        format of the wire module from remote senders and feeds them to the
+        analyser with Analyser.analyse_records. With 'udp' every datagram
+        contains a batch of records; with 'tcp' any number of senders can
+        connect and send frames consisting of the length of the batch in
+        bytes (4 byte little-endian unsigned integer) followed by the
+        records. Datagrams are received into a preallocated buffer and
+        decoded without copying. Messages longer than MAX_MESSAGE, whose
+        size is not a multiple of the record size or which contain sensor
+        indices outside of index are rejected and counted in
+        self.rejected. A TCP connection is closed if a frame is announced
+        with an invalid length, since the stream can't be resynchronised
+        afterwards. A connection which fails, e.g. because it is reset by
+        the sender, is closed without affecting the others.
+
+        :param analyser: Analyser instance (the thread is not started), which
+        is only used from the server thread
+        :param index: SensorIndex instance shared with the senders
+        :param host (optional): address to listen on; default: '127.0.0.1'
+        :param port (optional): port to listen on, 0 for any free port (see
+        self.address); default: 0
+        :param protocol (optional): 'udp' or 'tcp'; default: 'udp'
+        :param poll (optional): interval in seconds in which the server
+        checks whether it was stopped; default: 0.1
+        :param buffer_size (optional): size of the receive buffer of the
+        socket in bytes; default: 4 MiB
+        """
+        if protocol not in PROTOCOLS:
+            raise ValueError('Unknown protocol %s'%protocol)
+        super(IngestServer, self).__init__()
+        self.analyser = analyser
+        self.index = index
+        self.protocol = protocol
+        self.poll = poll
+        kind = socket.SOCK_DGRAM if protocol == 'udp' else socket.SOCK_STREAM
+        self.sock = socket.socket(socket.AF_INET, kind)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        if protocol == 'tcp':
+            self.sock.listen(64)
+        self.address = self.sock.getsockname()
+        # one spare byte to detect datagrams longer than MAX_MESSAGE
+        self.buffer = bytearray(MAX_MESSAGE + 1)
+        self.running = Event()
+        # number of received measurements, messages and bytes, and number
+        # of rejected messages
+        self.count = 0
+        self.messages = 0
+        self.bytes = 0
+        self.rejected = 0
+
+    def run(self):
+        """
+        Run server until it is stopped.
+        """
+        self.analyser.initialize_matrices()
+        # pending bytes per TCP connection
+        connections = {}
+        try:
+            while not self.running.isSet():
+                readable = select.select([self.sock] + list(connections),
+                                         [], [], self.poll)[0]
+                for sock in readable:
+                    if self.protocol == 'udp':
+                        self.receive_datagram()
+                    elif sock is self.sock:
+                        conn = self.sock.accept()[0]
+                        connections[conn] = bytearray()
+                    else:
+                        try:
+                            data = sock.recv(2**16)
+                        except socket.error:
+                            # e.g. connection reset by the sender
+                            data = b''
+                        if not data or \
+                           not self.receive_stream(connections[sock], data):
+                            sock.close()
+                            del connections[sock]
+        finally:
+            for conn in connections:
+                conn.close()
+            self.sock.close()
+            self.analyser.flush()
+
+    def receive_datagram(self):
+        """
+        Receive a single datagram into the buffer and analyse its records.
+        """
+        n = self.sock.recv_into(self.buffer)
+        if n > MAX_MESSAGE or n % MEASUREMENT_DTYPE.itemsize:
+            self.rejected += 1
+            return
+        records = decode(self.buffer, n // MEASUREMENT_DTYPE.itemsize)
+        self.handle(records, n)
+
+    def receive_stream(self, pending, data):
+        """
+        Append data of a TCP connection to its pending bytes and analyse all
+        complete frames.
+
+        :param pending: bytearray of pending bytes of the connection
+        :param data: received bytes
+        :returns: False if the connection has to be closed because of an
+        invalid frame length, True else
+        """
+        pending.extend(data)
+        start = 0
+        while len(pending) - start >= HEADER.size:
+            n = HEADER.unpack_from(pending, start)[0]
+            if n > MAX_MESSAGE or n % MEASUREMENT_DTYPE.itemsize:
+                self.rejected += 1
+                return False
+            end = start + HEADER.size + n
+            if len(pending) < end:
+                break
+            self.handle(decode(bytes(pending[start + HEADER.size:end])), n)
+            start = end
+        del pending[:start]
+        return True
+
+    def handle(self, records, n):
+        """
+        Analyse records and update the counters. Messages with sensor
+        indices outside of the index are rejected.
+
+        :param records: structured array with dtype MEASUREMENT_DTYPE
+        :param n: size of the message in bytes
+        """
+        if len(records) and records['idx'].max() >= len(self.index):
+            self.rejected += 1
+            return
+        self.analyser.analyse_records(records, self.index)
+        self.count += len(records)
+        self.messages += 1
+        self.bytes += n
+
+    def stop(self):
+        """
+        Stop server.
+        """
+        self.running.set()
+
+
+def send_records(address, records, protocol = 'udp', batch_size = 512,
+                 rate = None):
+    """
+    Send records to an IngestServer in batches.
+
+    :param address: (host, port) of the server
+    :param records: structured array with dtype MEASUREMENT_DTYPE
+    :param protocol (optional): 'udp' or 'tcp'; default: 'udp'
+    :param batch_size (optional): number of records per message (at most
+    MAX_BATCH); default: 512
+    :param rate (optional): maximal number of records per second, e.g. to
+    avoid overflowing the receive buffer of the server; default: None (as
+    fast as possible)
+    :returns replay: ReplaySpec instance containing the number of sent
+    measurements, the elapsed time in seconds and the rate in measurements
+    per second
+    """
+    if protocol not in PROTOCOLS:
+        raise ValueError('Unknown protocol %s'%protocol)
+    batch_size = min(batch_size, MAX_BATCH)
+    if protocol == 'udp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    else:
+        sock = socket.create_connection(address)
+    start = default_timer()
+    try:
+        for i in range(0, len(records), batch_size):
+            buf = encode(records[i:i + batch_size])
+            if protocol == 'udp':
+                sock.sendto(buf, address)
+            else:
+                sock.sendall(HEADER.pack(len(buf)) + buf)
+            if rate is not None:
+                ahead = (i + batch_size) / rate - (default_timer() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+    finally:
+        sock.close()
+    elapsed = default_timer() - start
+    rate = len(records) / elapsed if elapsed > 0 else float('inf')
+    return ReplaySpec(count = len(records), elapsed = elapsed, rate = rate)
+
+def generate_load(address, sensors = 10, rate = 20, duration = 60.,
+                  protocol = 'udp', batch_size = 512, max_rate = None,
+                  seed = None, start = None):
+    """
+    Simulate a session of athletes and sensors and send the measurements to
+    an IngestServer, e.g. to measure the sustained throughput over
+    loopback. The server has to use a SensorIndex of range(sensors).
+
+    :param address: (host, port) of the server
+    :param sensors (optional): number of sensors; default: 10
+    :param rate (optional): sampling rate of the sensors in Hz; default: 20
+    :param duration (optional): simulated duration in seconds; default: 60
+    :param protocol (optional): 'udp' or 'tcp'; default: 'udp'
+    :param batch_size (optional): number of records per message; default:
+    512
+    :param max_rate (optional): maximal number of records sent per second;
+    default: None (as fast as possible)
+    :param seed (optional): seed of athletes and sensors; default: None
+    :param start (optional): datetime instance of first measurement;
+    default: current time
+    :returns replay: ReplaySpec instance of send_records
+    """
+    rs = RandomState(seed)
+    q = Queue()
+    sensor_list = []
+    for ID in range(sensors):
+        athlete = Athlete(seed = rs.randint(2**31))
+        sensor_list.append(Sensor(athlete, q, ID, rate = rate,
+                                  seed = rs.randint(2**31)))
+    stream = list(simulate_stream(sensor_list, duration, start))
+    records = to_records(stream, SensorIndex(range(sensors)))
+    return send_records(address, records, protocol, batch_size, max_rate)
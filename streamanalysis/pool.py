@@ -0,0 +1,237 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from multiprocessing import Process, Queue, cpu_count
+from Queue import Empty
+from datetime import datetime
+from timeit import default_timer
+from zlib import crc32
+from numpy import empty
+
+from streamanalysis.analyser import Analyser
+from streamanalysis.utils import to_timestamp, from_timestamp
+from streamanalysis.wire import MEASUREMENT_DTYPE, SensorIndex
+
+# Commands sent to the workers besides batches of measurements
+COLLECT = 'collect'
+STOP = 'stop'
+
+def partition(ID, n):
+    """
+    Assign sensor ID to one of n partitions. Unlike hash, the assignment
+    is stable across processes and interpreter runs.
+
+    :param ID: sensor ID
+    :param n: number of partitions
+    :returns k: partition index between 0 and n-1
+    """
+    return (crc32(('%s'%ID).encode('utf-8')) & 0xffffffff) % n
+
+def work(k, inbox, outbox, kwargs):
+    """
+    Main loop of a worker process. Analyses batches of measurements in the
+    record format of the wire module together with the sensor IDs that were
+    added to the index of the worker since the previous batch. On request,
+    the analyser is flushed and the results added since the previous request
+    are sent to outbox.
+
+    :param k: index of the worker
+    :param inbox: queue with batches (IDs, records) and commands
+    :param outbox: queue for (k, dictionary of ResultStore instances)
+    :param kwargs: keyword arguments for Analyser
+    """
+    analyser = Analyser(None, **kwargs)
+    analyser.initialize_matrices()
+    index = SensorIndex()
+    # number of results per sensor that have been sent
+    sent = {}
+    while True:
+        item = inbox.get()
+        if item == COLLECT or item == STOP:
+            # store results dropped by a deadband and write a log
+            analyser.flush()
+            results = {}
+            for ID, store in analyser.sensors.items():
+                n = store.count - sent.get(ID, 0)
+                if n > 0:
+                    results[ID] = store.tail(n)
+                    sent[ID] = store.count
+            outbox.put((k, results))
+            if item == STOP:
+                break
+        else:
+            IDs, records = item
+            for ID in IDs:
+                index.index(ID)
+            analyser.analyse_records(records, index)
+
+class AnalyserPool(object):
+
+    def __init__(self, processes = None, batch_size = 256, timeout = None,
+                 **kwargs):
+        """
+        Pool of analyser processes. Measurements are partitioned by sensor ID
+        such that every worker owns the filter state of its sensors. The
+        measurements are sent to the workers in batches of binary records
+        and the results that were added since the previous collection are
+        appended to the ResultStore instances at self.sensors. The workers
+        process times as seconds since EPOCH, the merged results return
+        datetime instances if the measurements had them.
+
+        :param processes (optional): number of worker processes;
+        default: number of CPUs
+        :param batch_size (optional): number of measurements sent to a
+        worker at once; default: 256
+        :param timeout (optional): maximal time in seconds to wait for the
+        results of the workers, a RuntimeError is raised after it or as soon
+        as a worker process died; default: None (wait as long as the workers
+        are alive)
+        :param kwargs: further keyword arguments for Analyser in the workers
+        """
+        if processes is None:
+            processes = cpu_count()
+        self.processes = processes
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.kwargs = kwargs
+        self.sensors = {}
+        self.workers = []
+        self.inboxes = []
+        # worker and record index per sensor ID
+        self.partitions = {}
+        self.indexes = [SensorIndex() for k in range(processes)]
+        # number of IDs of the indexes that were sent to the workers
+        self.sent = [0] * processes
+        self.pending = [empty(batch_size, dtype = MEASUREMENT_DTYPE)
+                        for k in range(processes)]
+        self.counts = [0] * processes
+        self.datetime = None
+        self.outbox = Queue()
+
+    def start(self):
+        """
+        Start worker processes.
+        """
+        for k in range(self.processes):
+            inbox = Queue()
+            worker = Process(target = work,
+                             args = (k, inbox, self.outbox, self.kwargs))
+            worker.daemon = True
+            worker.start()
+            self.inboxes.append(inbox)
+            self.workers.append(worker)
+
+    def put(self, data):
+        """
+        Add measurement to the batch of the worker owning the sensor.
+
+        :param data: MeasurementSpec instance
+        """
+        try:
+            k, i = self.partitions[data.ID]
+        except KeyError:
+            k = partition(data.ID, self.processes)
+            i = self.indexes[k].index(data.ID)
+            self.partitions[data.ID] = k, i
+        if self.datetime is None:
+            self.datetime = isinstance(data.time, datetime)
+        n = self.counts[k]
+        self.pending[k][n] = (i, data.coords[0], data.coords[1],
+                              to_timestamp(data.time))
+        self.counts[k] = n + 1
+        if n + 1 == self.batch_size:
+            self.send(k)
+
+    def put_batch(self, batch):
+        """
+        Add several measurements.
+
+        :param batch: iterable of MeasurementSpec instances
+        """
+        for data in batch:
+            self.put(data)
+
+    def send(self, k):
+        """
+        Send the batch of a worker together with its new sensor IDs.
+
+        :param k: index of worker
+        """
+        keys = self.indexes[k].keys
+        self.inboxes[k].put((keys[self.sent[k]:],
+                             self.pending[k][:self.counts[k]]))
+        self.sent[k] = len(keys)
+        # the batch is pickled by a thread of the queue, use a new array
+        self.pending[k] = empty(self.batch_size, dtype = MEASUREMENT_DTYPE)
+        self.counts[k] = 0
+
+    def flush(self):
+        """
+        Send incomplete batches to the workers.
+        """
+        for k, n in enumerate(self.counts):
+            if n:
+                self.send(k)
+
+    def receive(self, waiting):
+        """
+        Return the results of the next worker, while checking that the
+        workers that did not answer yet are alive.
+
+        :param waiting: set of indices of the workers that did not answer
+        :returns k, results: index of worker and dictionary of ResultStore
+        instances
+        """
+        start = default_timer()
+        while True:
+            try:
+                return self.outbox.get(timeout = 1.)
+            except Empty:
+                for k in waiting:
+                    if not self.workers[k].is_alive():
+                        raise RuntimeError('worker %d died with exit code %s'
+                                           %(k, self.workers[k].exitcode))
+                if self.timeout is not None and \
+                   default_timer() - start > self.timeout:
+                    raise RuntimeError('no results from workers %s'
+                                       %sorted(waiting))
+
+    def collect(self, command = COLLECT):
+        """
+        Flush pending measurements and append the results that were added
+        since the previous collection to self.sensors.
+
+        :returns sensors: dictionary of ResultStore instances
+        """
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put(command)
+        waiting = set(range(len(self.inboxes)))
+        while waiting:
+            k, results = self.receive(waiting)
+            waiting.discard(k)
+            for ID, store in results.items():
+                if self.datetime:
+                    store.datetime = True
+                    store.last = store.last._replace(
+                        time = from_timestamp(store.last.time))
+                if ID in self.sensors:
+                    self.sensors[ID].extend(store)
+                else:
+                    self.sensors[ID] = store
+        return self.sensors
+
+    def stop(self):
+        """
+        Collect results and stop the worker processes.
+
+        :returns sensors: dictionary of ResultStore instances
+        """
+        sensors = self.collect(STOP)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        self.inboxes = []
+        return sensors
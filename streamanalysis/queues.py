@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from Queue import Queue
+from collections import deque
+
+from streamanalysis.sensor import FrameSpec
+
+POLICIES = ['block', 'drop_oldest', 'drop_newest', 'coalesce']
+
+def get_key(item):
+    """
+    Return the key under which an item is shed: the sensor ID of a
+    measurement, or ('frame', IDs) for a frame of a SensorArray, such that
+    frames are only coalesced with or dropped for frames of the same group.
+    """
+    if isinstance(item, FrameSpec):
+        return ('frame', tuple(item.IDs))
+    return getattr(item, 'ID', None)
+
+class SheddingQueue(Queue):
+
+    def __init__(self, maxsize, policy = 'block'):
+        """
+        Bounded queue for measurements with a policy for the case that the
+        queue is full:
+
+        - 'block': put blocks until there is space (as Queue.Queue)
+        - 'drop_oldest': the oldest queued measurement of the same sensor is
+          dropped (or the oldest measurement if the sensor has none queued)
+        - 'drop_newest': the new measurement is dropped
+        - 'coalesce': a queued measurement of the same sensor is replaced by
+          the new one at any queue size, such that at most the latest
+          measurement per sensor is queued; if the queue is full with other
+          sensors, the oldest measurement is dropped
+
+        Only 'block' ever blocks in put. Shed measurements count as done for
+        join, as in Queue.Queue join returns once task_done was called for
+        every measurement returned by get. Frames of a SensorArray are treated
+        like the measurements of a single sensor with the key of get_key.
+        The numbers of dropped and coalesced measurements are counted in
+        self.dropped, self.coalesced, and per key in self.shed.
+
+        :param maxsize: maximal number of queued measurements
+        :param policy (optional): one of POLICIES; default: 'block'
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown policy %s'%policy)
+        self.policy = policy
+        self.limit = maxsize
+        self.dropped = 0
+        self.coalesced = 0
+        self.shed = {}
+        Queue.__init__(self, maxsize if policy == 'block' else 0)
+
+    def _init(self, maxsize):
+        # queue of entries [item, alive], dropped entries are marked dead
+        # and skipped when they reach the front
+        self.queue = deque()
+        # live entries per sensor ID in order
+        self.pending = {}
+        self.size = 0
+
+    def _qsize(self, len = len):
+        return self.size
+
+    def _put(self, item):
+        ID = get_key(item)
+        pending = self.pending.get(ID)
+        if self.policy == 'coalesce' and pending:
+            # replace queued measurement of the same sensor
+            pending[0][0] = item
+            self.coalesced += 1
+            self.shed[ID] = self.shed.get(ID, 0) + 1
+            self.release()
+            return
+        if self.policy != 'block' and self.size >= self.limit:
+            if self.policy == 'drop_newest':
+                self.dropped += 1
+                self.shed[ID] = self.shed.get(ID, 0) + 1
+                self.release()
+                return
+            if self.policy == 'drop_oldest' and pending:
+                self.kill(pending[0])
+            else:
+                self.kill(self.front())
+            # the entries of the sensor are removed if it was the last one
+            pending = self.pending.get(ID)
+        entry = [item, True]
+        self.queue.append(entry)
+        if pending is None:
+            pending = self.pending[ID] = deque()
+        pending.append(entry)
+        self.size += 1
+        if len(self.queue) > 2 * self.size + 64:
+            # remove accumulated dead entries
+            self.queue = deque(e for e in self.queue if e[1])
+
+    def _get(self):
+        entry = self.front()
+        self.queue.popleft()
+        self.remove(entry)
+        return entry[0]
+
+    def front(self):
+        """
+        Return the oldest live entry after discarding dead entries at the
+        front of the queue.
+        """
+        while not self.queue[0][1]:
+            self.queue.popleft()
+        return self.queue[0]
+
+    def remove(self, entry):
+        """
+        Mark entry as dead and remove it from the entries of its sensor. The
+        entry has to be the oldest of its sensor.
+        """
+        entry[1] = False
+        ID = get_key(entry[0])
+        pending = self.pending[ID]
+        pending.popleft()
+        if not pending:
+            del self.pending[ID]
+        self.size -= 1
+
+    def kill(self, entry):
+        """
+        Drop entry, which has to be the oldest of its sensor.
+        """
+        ID = get_key(entry[0])
+        self.remove(entry)
+        self.dropped += 1
+        self.shed[ID] = self.shed.get(ID, 0) + 1
+        self.release()
+
+    def release(self):
+        """
+        Mark a shed item as done, since it is never returned by get and
+        therefore never passed to task_done. Called with self.mutex held by
+        put, which counts the new item afterwards.
+        """
+        self.unfinished_tasks -= 1
+        if self.unfinished_tasks <= 0:
+            self.all_tasks_done.notify_all()
@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from heapq import heapify, heapreplace
+from datetime import datetime, timedelta
+from timeit import default_timer
+from collections import namedtuple as nt
+
+from streamanalysis.sensor import FrameSpec
+
+ReplaySpec = nt('replay', ['count', 'elapsed', 'rate'])
+
+def simulate_stream(sensors, duration, start = None):
+    """
+    Generate the measurements of several sensors on a simulated clock. Every
+    sensor is sampled at its own rate and the measurements are returned
+    ordered by time, as they would arrive in a shared queue.
+
+    :param sensors: list of Sensor instances (the threads are not started)
+    :param duration: simulated duration in seconds
+    :param start (optional): datetime instance of first measurement;
+    default: current time
+    :returns stream: generator of MeasurementSpec instances
+    """
+    if start is None:
+        start = datetime.now()
+    end = start + timedelta(seconds = duration)
+    # heap of (time, number of measurements, index of sensor)
+    heap = [(start, 0, k) for k in range(len(sensors))]
+    heapify(heap)
+    while heap and heap[0][0] < end:
+        t, i, k = heap[0]
+        sensor = sensors[k]
+        yield sensor.measure(t)
+        t = start + timedelta(seconds = (i + 1) * sensor.deltat)
+        heapreplace(heap, (t, i + 1, k))
+
+def replay(analyser, stream, batch_size = 1):
+    """
+    Feed a recorded or simulated stream of measurements into the analyser
+    as fast as it can process them, bypassing the queue.
+
+    :param analyser: Analyser instance (the thread is not started)
+    :param stream: iterable of MeasurementSpec or FrameSpec instances
+    ordered by time
+    :param batch_size (optional): number of items passed to
+    Analyser.analyse_batch at once, 1 uses Analyser.analyse_data and
+    Analyser.analyse_frame as Analyser.run; default: 1
+    :returns replay: ReplaySpec instance containing the number of processed
+    measurements, the elapsed time in seconds and the processing rate in
+    measurements per second
+    """
+    analyser.initialize_matrices()
+    count = 0
+    start = default_timer()
+    if batch_size == 1:
+        for data in stream:
+            if isinstance(data, FrameSpec):
+                analyser.analyse_frame(data)
+                count += len(data.IDs)
+            else:
+                analyser.analyse_data(data)
+                count += 1
+    else:
+        batch = []
+        for data in stream:
+            batch.append(data)
+            count += len(data.IDs) if isinstance(data, FrameSpec) else 1
+            if len(batch) == batch_size:
+                analyser.analyse_batch(batch)
+                batch = []
+        if batch:
+            analyser.analyse_batch(batch)
+    analyser.flush()
+    elapsed = default_timer() - start
+    rate = count / elapsed if elapsed > 0 else float('inf')
+    return ReplaySpec(count = count, elapsed = elapsed, rate = rate)
@@ -0,0 +1,468 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from datetime import datetime
+from numpy import (zeros, concatenate, arange, asarray, searchsorted, where,
+                   clip, nan, stack, fromiter, array, sqrt, hypot)
+from collections import namedtuple as nt
+
+from streamanalysis.utils import to_timestamp, from_timestamp
+
+ResultSpec = nt('result', ['pos', 'pos_err', 'vel', 'vel_err', 'tot_vel',
+                           'dist', 'stationary', 'time'])
+
+# Shapes and types of the columns of a ResultStore
+COLUMNS = [('pos', (2,), float),
+           ('pos_err', (2,), float),
+           ('vel', (2,), float),
+           ('vel_err', (2,), float),
+           ('tot_vel', (), float),
+           ('dist', (), float),
+           ('stationary', (), bool),
+           ('time', (), float)]
+
+# Columns of a ResultStore with restricted fields, from which the fields in
+# DERIVED are computed when they are read
+STATE_COLUMNS = [('state', (4,), float),
+                 ('var', (4,), float)]
+DERIVED = ['pos', 'pos_err', 'vel', 'vel_err', 'tot_vel']
+
+class LazyResult(object):
+
+    __slots__ = ['state', 'var', 'dist', 'stationary', 'time']
+    _fields = ResultSpec._fields
+
+    def __init__(self, state, var, dist, stationary, time):
+        """
+        Result with the same fields as ResultSpec, which only holds the state
+        vector and the variances of the Kalman Filter together with distance,
+        stationarity, and time. Positions, velocities, their errors and the
+        total velocity are derived when they are accessed.
+
+        :param state: state vector (x, vx, y, vy)
+        :param var: diagonal of the error covariance
+        :param dist: total distance
+        :param stationary: result of the stationarity test
+        :param time: time of the measurement
+        """
+        self.state = state
+        self.var = var
+        self.dist = dist
+        self.stationary = stationary
+        self.time = time
+
+    def __iter__(self):
+        for name in self._fields:
+            yield getattr(self, name)
+
+    @property
+    def pos(self):
+        return array([self.state[0], self.state[2]])
+
+    @property
+    def vel(self):
+        return array([self.state[1], self.state[3]])
+
+    @property
+    def pos_err(self):
+        return sqrt([self.var[0], self.var[2]])
+
+    @property
+    def vel_err(self):
+        return sqrt([self.var[1], self.var[3]])
+
+    @property
+    def tot_vel(self):
+        if self.stationary:
+            return 0.0
+        return hypot(self.state[1], self.state[3])
+
+
+class ResultStore(object):
+
+    def __init__(self, capacity = 64, maxlen = None, fields = None):
+        """
+        Columnar store for the results of a single sensor. Every field of
+        ResultSpec is kept in a preallocated numpy array which doubles its
+        size when full. Times are stored as seconds since EPOCH. ResultSpec
+        instances are only created when the store is indexed. Results are
+        expected in chronological order, such that states at given times are
+        found by binary search on the time column.
+
+        :param capacity (optional): number of results for which memory is
+        allocated initially; default: 64
+        :param maxlen (optional): maximal number of results that are kept,
+        older results are overwritten once the store is full (ring buffer);
+        default: None (keep all results)
+        :param fields (optional): list of fields of ResultSpec that are
+        requested, e.g. Analyser.outputs. If given, the state vector and the
+        variances of the Kalman Filter are stored together with the time
+        and the stationarity, and the fields in DERIVED are computed from
+        them when they are read. The distance is only stored if requested
+        and None otherwise; default: None (all fields are stored)
+        """
+        if maxlen is not None:
+            capacity = min(capacity, maxlen)
+        self.maxlen = maxlen
+        self.fields = fields
+        layout = COLUMNS
+        if fields is not None:
+            layout = STATE_COLUMNS + [
+                column for column in COLUMNS if column[0] not in DERIVED and
+                (column[0] in fields or column[0] in ['stationary', 'time'])]
+        self.columns = {}
+        for name, shape, dtype in layout:
+            self.columns[name] = zeros((capacity,) + shape, dtype = dtype)
+        # index of oldest result in the arrays
+        self.start = 0
+        # number of stored results
+        self.size = 0
+        # number of results appended in total
+        self.count = 0
+        # last result, which may have been dropped by a Deadband
+        self.last = None
+        # flag for converting times back into datetime instances
+        self.datetime = False
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self.get_row(self.index(i))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.get_row(self.index(i))
+                    for i in range(*key.indices(self.size))]
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError('result index out of range')
+        return self.get_row(self.index(key))
+
+    def __getstate__(self):
+        # ResultSpec instances can't be pickled, the last result is stored
+        # as tuple instead
+        state = self.__dict__.copy()
+        if self.last is not None:
+            state['last'] = tuple(self.last)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.last is not None:
+            self.last = ResultSpec(*self.last)
+
+    @property
+    def capacity(self):
+        return len(self.columns['time'])
+
+    def index(self, i):
+        """
+        Return the position of the i-th stored result in the arrays.
+        """
+        return (self.start + i) % self.capacity
+
+    def get_row(self, j):
+        """
+        Create ResultSpec instance from the j-th entries of the arrays.
+        """
+        c = self.columns
+        if self.fields is not None:
+            values = []
+            for name in ResultSpec._fields:
+                value = self.values(name, j)
+                values.append(None if value is None else value.tolist())
+            for k in [0, 1, 2, 3]:
+                values[k] = array(values[k])
+            res = ResultSpec(*values)
+        else:
+            res = ResultSpec(pos = c['pos'][j].copy(),
+                             pos_err = c['pos_err'][j].copy(),
+                             vel = c['vel'][j].copy(),
+                             vel_err = c['vel_err'][j].copy(),
+                             tot_vel = float(c['tot_vel'][j]),
+                             dist = float(c['dist'][j]),
+                             stationary = bool(c['stationary'][j]),
+                             time = c['time'][j])
+        if self.datetime:
+            res = res._replace(time = from_timestamp(res.time))
+        return res
+
+    def values(self, name, j):
+        """
+        Return the entries of a field at position(s) j of the arrays. Fields
+        in DERIVED are computed from the state columns if they are not
+        stored.
+
+        :param name: name of field in ResultSpec or of a column
+        :param j: position or array of positions
+        :returns values: numpy array or None if the field is not available
+        """
+        c = self.columns
+        if name in c:
+            return c[name][j]
+        if 'state' not in c or name not in DERIVED:
+            return None
+        state = c['state'][j]
+        if name == 'tot_vel':
+            return where(c['stationary'][j], 0.0,
+                         hypot(state[..., 1], state[..., 3]))
+        k = [0, 2] if name in ['pos', 'pos_err'] else [1, 3]
+        if name.endswith('_err'):
+            return sqrt(c['var'][j][..., k])
+        return state[..., k]
+
+    def column(self, name):
+        """
+        Return the values of a field in chronological order. Times are
+        returned as seconds since EPOCH.
+
+        :param name: name of field in ResultSpec or of a column
+        :returns values: numpy array (view if the field is stored and the
+        results are contiguous)
+        """
+        if name in self.columns and \
+           self.start + self.size <= self.capacity:
+            return self.columns[name][self.start:self.start + self.size]
+        values = self.values(name, self.index(arange(self.size)))
+        if values is None:
+            raise KeyError(name)
+        return values
+
+    def append(self, result):
+        """
+        Append result to the store.
+
+        :param result: ResultSpec instance
+        """
+        if self.size == self.capacity:
+            if self.size == self.maxlen:
+                # overwrite oldest result
+                j = self.start
+                self.start = self.index(1)
+                self.size -= 1
+            else:
+                self.grow()
+                j = self.size
+        else:
+            j = self.index(self.size)
+        c = self.columns
+        if self.fields is not None:
+            if isinstance(result, LazyResult):
+                c['state'][j] = result.state
+                c['var'][j] = result.var
+            else:
+                pos, vel = result.pos, result.vel
+                c['state'][j] = (pos[0], vel[0], pos[1], vel[1])
+                pos_var = asarray(result.pos_err)**2
+                vel_var = asarray(result.vel_err)**2
+                c['var'][j] = (pos_var[0], vel_var[0], pos_var[1], vel_var[1])
+            for name in c:
+                if name not in ['state', 'var', 'time']:
+                    c[name][j] = getattr(result, name)
+        else:
+            c['pos'][j] = result.pos
+            c['pos_err'][j] = result.pos_err
+            c['vel'][j] = result.vel
+            c['vel_err'][j] = result.vel_err
+            c['tot_vel'][j] = result.tot_vel
+            c['dist'][j] = result.dist
+            c['stationary'][j] = result.stationary
+        if self.count == 0:
+            self.datetime = isinstance(result.time, datetime)
+        c['time'][j] = to_timestamp(result.time)
+        self.size += 1
+        self.count += 1
+        self.last = result
+
+    def grow(self):
+        """
+        Double the capacity of the store (limited to maxlen).
+        """
+        n = max(self.capacity, 1)
+        if self.maxlen is not None:
+            n = min(n, self.maxlen - self.capacity)
+        for name in self.columns:
+            values = self.columns[name]
+            self.columns[name] = concatenate([values,
+                                              zeros((n,) + values.shape[1:],
+                                                    dtype = values.dtype)])
+
+    def tail(self, n):
+        """
+        Return the latest results as a new store, e.g. for sending the
+        results that were added since the last transfer to another process.
+
+        :param n: number of results, of which at most the stored results are
+        returned, but all are counted in store.count
+        :returns store: ResultStore instance with the same maxlen and fields
+        """
+        count = n
+        n = min(n, self.size)
+        store = ResultStore(max(n, 1), self.maxlen, self.fields)
+        j = self.index(arange(self.size - n, self.size))
+        for name in self.columns:
+            store.columns[name][:n] = self.columns[name][j]
+        store.size = n
+        store.count = count
+        store.last = self.last
+        store.datetime = self.datetime
+        return store
+
+    def extend(self, other):
+        """
+        Append all results of another store with the same fields, e.g. one
+        returned by tail.
+
+        :param other: ResultStore instance
+        """
+        n = other.size
+        if self.maxlen is not None:
+            # older results would be overwritten anyway
+            skip = max(n - self.maxlen, 0)
+            total = min(self.size + n, self.maxlen)
+        else:
+            skip = 0
+            total = self.size + n
+        while self.capacity < total:
+            # the results start at 0 as long as the store grows
+            self.grow()
+        j = self.index(self.size + arange(n - skip))
+        for name in self.columns:
+            self.columns[name][j] = other.column(name)[skip:]
+        self.start = self.index(max(self.size + n - skip - self.capacity, 0))
+        self.size = total
+        if self.count == 0:
+            self.datetime = other.datetime
+        self.count += other.count
+        if other.last is not None:
+            self.last = other.last
+
+    def search(self, time, side = 'left'):
+        """
+        Binary search for time in the time column. With side 'left' the
+        number of results before time is returned, with side 'right' the
+        number of results at or before time.
+
+        :param time: timestamp or array of timestamps in seconds
+        :param side (optional): 'left' or 'right'; default: 'left'
+        :returns i: chronological index or array of indices
+        """
+        times = self.columns['time']
+        end = self.start + self.size
+        if end <= self.capacity:
+            return searchsorted(times[self.start:end], time, side)
+        # ring buffer wrapped around, search in both contiguous parts
+        head = times[self.start:]
+        i = searchsorted(head, time, side)
+        tail = len(head) + searchsorted(times[:end - self.capacity], time,
+                                        side)
+        return where(i < len(head), i, tail)
+
+    def between(self, start = None, end = None):
+        """
+        Return all results within the time range.
+
+        :param start (optional): earliest time; default: None
+        :param end (optional): latest time; default: None
+        :returns result: ResultSpec instance of arrays with the fields of the
+        results in chronological order, times in seconds
+        """
+        i0 = 0 if start is None else self.search(to_timestamp(start))
+        i1 = self.size if end is None else \
+             self.search(to_timestamp(end), 'right')
+        j = self.index(arange(i0, max(i0, i1)))
+        return ResultSpec(*[self.values(name, j)
+                            for name in ResultSpec._fields])
+
+    def interpolate(self, times):
+        """
+        Return states at the given times by linear interpolation between the
+        neighbouring results. Stationarity is taken from the preceding
+        result. Times outside of the stored range give nan values.
+
+        :param times: array of timestamps in seconds
+        :returns result: ResultSpec instance of arrays with the
+        interpolated fields, None for fields that are not available
+        """
+        t = asarray(times, dtype = float)
+        n = self.size
+        c = self.columns
+        if n == 0:
+            i = zeros(t.shape, dtype = int)
+        else:
+            i = self.search(t, 'right')
+        lo = self.index(clip(i - 1, 0, max(n - 1, 0)))
+        hi = self.index(clip(i, 0, max(n - 1, 0)))
+        t0 = c['time'][lo]
+        t1 = c['time'][hi]
+        valid = (i > 0) & ((i < n) | (t == t0))
+        w = where(t1 > t0, (t - t0) / where(t1 > t0, t1 - t0, 1.0), 0.0)
+        w = where(valid, w, nan)
+        fields = []
+        for name in ResultSpec._fields:
+            if name == 'time':
+                fields.append(t)
+                continue
+            a = self.values(name, lo)
+            if a is None:
+                fields.append(None)
+            elif name == 'stationary':
+                fields.append(a & valid)
+            else:
+                b = self.values(name, hi)
+                weight = w.reshape(w.shape + (1,) * (a.ndim - w.ndim))
+                fields.append(a + weight * (b - a))
+        return ResultSpec(*fields)
+
+    def at(self, time):
+        """
+        Return the state at the given time by linear interpolation.
+
+        :param time: datetime instance or timestamp in seconds
+        :returns result: ResultSpec instance
+        """
+        t = to_timestamp(time)
+        i = self.search(t, 'right')
+        if i == 0 or (i == self.size and
+                      t != self.columns['time'][self.index(i - 1)]):
+            raise IndexError('time out of range')
+        res = self.interpolate([t])
+        values = [None if value is None else value[0] for value in res]
+        for k in [4, 5, 6]:
+            if values[k] is not None:
+                values[k] = values[k].item()
+        values[7] = time
+        return ResultSpec(*values)
+
+def resample(stores, times, IDs = None):
+    """
+    Resample the results of several sensors onto a common time grid.
+
+    :param stores: dictionary of ResultStore instances, e.g.
+    Analyser.sensors
+    :param times: array of timestamps in seconds or list of datetime
+    instances
+    :param IDs (optional): list of sensor IDs in the order of the output;
+    default: None (sorted IDs of stores)
+    :returns IDs, result: list of sensor IDs and ResultSpec instance of
+    arrays with shape (S, T, ...), nan outside of the range of a sensor
+    """
+    if IDs is None:
+        IDs = sorted(stores)
+    times = fromiter((to_timestamp(t) for t in times), dtype = float)
+    results = [stores[ID].interpolate(times) for ID in IDs]
+    fields = []
+    for name in ResultSpec._fields:
+        values = [getattr(res, name) for res in results]
+        if not results:
+            fields.append(zeros((0, len(times))))
+        elif any(value is None for value in values):
+            fields.append(None)
+        else:
+            fields.append(stack(values))
+    return IDs, ResultSpec(*fields)
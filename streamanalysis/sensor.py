@@ -4,16 +4,22 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 
 from threading import Thread, Event
-from datetime import datetime
+from heapq import heapify, heapreplace
+from numpy import array
 from numpy.random.mtrand import RandomState
 from collections import namedtuple as nt
 
+from streamanalysis.clock import WallClock
+
 MeasurementSpec = nt('measurement', ['ID', 'coords', 'time'])
+DriftSpec = nt('drift', ['count', 'rate', 'mean_lag', 'max_lag'])
+FrameSpec = nt('frame', ['IDs', 'coords', 'time'])
 
 class Sensor(Thread):
     
     def __init__(self, athlete, queue, ID, rate = 20,
-                 noise = 0.3, verbose = False, seed = None):
+                 noise = 0.3, verbose = False, seed = None, clock = None,
+                 stats = None):
         """
         Sensor class which gets position measurements from athlete, adds noise
         and collects them in a queue.
@@ -26,6 +32,12 @@ class Sensor(Thread):
         meter, default: 0.3
         :param verbose (optional): verbosity of sensor, default: False
         :param seed (optional): seed of noise generation, default: None 
+        :param clock (optional): clock providing the time of measurements
+        and waiting between them, e.g. SimulatedClock for running faster
+        than real time; default: WallClock instance
+        :param stats (optional): PipelineStats instance collecting the
+        latency of measurements and their number; default: None (no
+        instrumentation)
         """
         super(Sensor, self).__init__()
         self.queue = queue
@@ -37,6 +49,12 @@ class Sensor(Thread):
         self.verbose = verbose
         self.rs = RandomState(seed)
         self.running = Event()
+        if clock is None:
+            clock = WallClock()
+        self.clock = clock
+        self.stats = stats
+        if stats is not None:
+            self.instrument(stats)
         
     def run(self):
         """
@@ -45,33 +63,255 @@ class Sensor(Thread):
         if self.verbose:
             print('Sensor %s started'%self.ID)
         # start time
-        time = datetime.now()
+        time = self.clock.now()
         # number of measurements
         i = 0
         while not self.running.isSet():
             # get time of measurement
-            t = datetime.now()
-            # get data from athlete
-            data = self.athlete(t)
-            # add noise to position
-            pos = data.pos + self.rs.randn(2) * self.noise
-            # create MeasurementSpec instance containing ID, position,
-            # and time of measurement
-            measurement = MeasurementSpec(ID = self.ID, coords = pos,
-                                          time = t)
+            t = self.clock.now()
             # add measurement to queue
-            self.queue.put(measurement)
+            self.queue.put(self.measure(t))
             # increment number of measurements
             i += 1
             # calculate time to wait to satisfy sampling rate
-            timeout = i * self.deltat - (datetime.now()-time).total_seconds()
-            self.running.wait(timeout)
+            timeout = i * self.deltat - (self.clock.now()-time).total_seconds()
+            self.clock.wait(self.running, timeout)
         if self.verbose:
             print('Sensor %s stopped'%self.ID)
 
+    def measure(self, t):
+        """
+        Get a single measurement from the athlete.
+
+        :param t: time of measurement
+        :returns measurement: MeasurementSpec instance
+        """
+        # get data from athlete
+        data = self.athlete(t)
+        # add noise to position
+        pos = data.pos + self.rs.randn(2) * self.noise
+        # create MeasurementSpec instance containing ID, position,
+        # and time of measurement
+        return MeasurementSpec(ID = self.ID, coords = pos, time = t)
+
+    def instrument(self, stats):
+        """
+        Replace self.measure by a version that records its latency and
+        counts the measurements in stats.
+
+        :param stats: PipelineStats instance
+        """
+        measure = stats.timed('measure', self.measure)
+        produced = stats.produced
+        def counted(t):
+            produced[self.ID] = produced.get(self.ID, 0) + 1
+            return measure(t)
+        self.measure = counted
         
     def stop(self):
         """
         Stop sensor.
         """
-        self.running.set()
\ No newline at end of file
+        self.running.set()
+
+
+class SensorHub(Thread):
+
+    def __init__(self, sensors = None, clock = None, verbose = False):
+        """
+        Single thread that samples many sensors, each at its own rate, in
+        place of one thread per sensor. The sensors are scheduled in a heap
+        ordered by the time of their next measurement, which is added to the
+        queue of the sensor. The hub keeps track of how far the actual
+        sampling lags behind the requested times.
+
+        :param sensors (optional): list of Sensor instances (their threads
+        are not started); default: None
+        :param clock (optional): clock providing the time of measurements
+        and waiting between them; default: WallClock instance
+        :param verbose (optional): verbosity of hub, default: False
+        """
+        super(SensorHub, self).__init__()
+        self.sensors = []
+        self.count = []
+        self.lag_sum = []
+        self.lag_max = []
+        self.first = []
+        self.last = []
+        if clock is None:
+            clock = WallClock()
+        self.clock = clock
+        self.verbose = verbose
+        self.running = Event()
+        for sensor in sensors or []:
+            self.add(sensor)
+
+    def add(self, sensor):
+        """
+        Add sensor to hub. Sensors have to be added before the hub is
+        started.
+
+        :param sensor: Sensor instance
+        """
+        self.sensors.append(sensor)
+        self.count.append(0)
+        self.lag_sum.append(0.0)
+        self.lag_max.append(0.0)
+        self.first.append(None)
+        self.last.append(None)
+
+    def run(self):
+        """
+        Run hub.
+        """
+        if self.verbose:
+            print('Hub with %i sensors started'%len(self.sensors))
+        # start time
+        time = self.clock.now()
+        # heap of (requested time in seconds after start, number of
+        # measurements, index of sensor)
+        heap = [(0.0, 0, k) for k in range(len(self.sensors))]
+        heapify(heap)
+        while heap and not self.running.isSet():
+            due, i, k = heap[0]
+            # wait until the next measurement is due
+            timeout = due - (self.clock.now()-time).total_seconds()
+            if timeout > 0:
+                self.clock.wait(self.running, timeout)
+                continue
+            t = self.clock.now()
+            sensor = self.sensors[k]
+            sensor.queue.put(sensor.measure(t))
+            # keep track of the lag with respect to the requested time
+            lag = (t-time).total_seconds() - due
+            self.count[k] += 1
+            self.lag_sum[k] += lag
+            self.lag_max[k] = max(self.lag_max[k], lag)
+            if self.first[k] is None:
+                self.first[k] = t
+            self.last[k] = t
+            heapreplace(heap, ((i + 1) * sensor.deltat, i + 1, k))
+        if self.verbose:
+            print('Hub with %i sensors stopped'%len(self.sensors))
+
+    def drift(self):
+        """
+        Compare the actual sampling to the requested rates.
+
+        :returns drift: dictionary of DriftSpec instances for all sensor IDs
+        containing the number of measurements, the actual sampling rate in
+        Hz, and the mean and maximal lag behind the requested times in
+        seconds
+        """
+        drift = {}
+        for k, sensor in enumerate(self.sensors):
+            n = self.count[k]
+            rate = 0.0
+            if n > 1:
+                rate = (n - 1) / (self.last[k] -
+                                  self.first[k]).total_seconds()
+            drift[sensor.ID] = DriftSpec(count = n, rate = rate,
+                                         mean_lag = self.lag_sum[k] / max(n, 1),
+                                         max_lag = self.lag_max[k])
+        return drift
+
+    def stop(self):
+        """
+        Stop hub.
+        """
+        self.running.set()
+
+
+class SensorArray(Thread):
+
+    def __init__(self, athletes, queue, IDs = None, rate = 20, noise = 0.3,
+                 verbose = False, seed = None, clock = None, block = 256):
+        """
+        Group of sensors that sample their athletes on a shared tick and add
+        a single FrameSpec instance per tick to the queue, which contains
+        the IDs, the coordinates with shape (n, 2), and the time of the
+        measurements. The noise of the group is drawn in blocks of several
+        ticks at once.
+
+        :param athletes: AthleteSwarm instance, which is advanced with
+        AthleteSwarm.simulate, or list of objects yielding position data when
+        called
+        :param queue: queue to which the frames are added
+        :param IDs (optional): list of sensor IDs; default: None (indices of
+        the athletes)
+        :param rate (optional): sampling rate of sensors in Hz, default: 20
+        :param noise (optional): standard deviation of noise on measurement in
+        meter, default: 0.3
+        :param verbose (optional): verbosity of sensors, default: False
+        :param seed (optional): seed of noise generation, default: None
+        :param clock (optional): clock providing the time of measurements
+        and waiting between them; default: WallClock instance
+        :param block (optional): number of ticks for which the noise is drawn
+        at once; default: 256
+        """
+        super(SensorArray, self).__init__()
+        self.athletes = athletes
+        self.swarm = hasattr(athletes, 'simulate')
+        n = athletes.n if self.swarm else len(athletes)
+        if IDs is None:
+            IDs = range(n)
+        self.IDs = tuple(IDs)
+        self.queue = queue
+        self.rate = rate
+        self.deltat = 1./self.rate
+        self.noise = noise
+        self.verbose = verbose
+        self.rs = RandomState(seed)
+        self.block = block
+        self.noise_block = None
+        self.k = block
+        self.running = Event()
+        if clock is None:
+            clock = WallClock()
+        self.clock = clock
+
+    def run(self):
+        """
+        Run sensors.
+        """
+        if self.verbose:
+            print('Sensor array with %i sensors started'%len(self.IDs))
+        # start time
+        time = self.clock.now()
+        # number of frames
+        i = 0
+        while not self.running.isSet():
+            # add frame of current time to queue
+            self.queue.put(self.measure(self.clock.now()))
+            i += 1
+            # calculate time to wait to satisfy sampling rate
+            timeout = i * self.deltat - (self.clock.now()-time).total_seconds()
+            self.clock.wait(self.running, timeout)
+        if self.verbose:
+            print('Sensor array with %i sensors stopped'%len(self.IDs))
+
+    def measure(self, t):
+        """
+        Get the measurements of all athletes at a single time.
+
+        :param t: time of measurement
+        :returns frame: FrameSpec instance
+        """
+        if self.swarm:
+            pos = self.athletes.simulate([t]).pos[:, 0]
+        else:
+            pos = array([athlete(t).pos for athlete in self.athletes])
+        if self.k == self.block:
+            # draw noise for the next block of ticks
+            self.noise_block = self.rs.randn(self.block, len(self.IDs), 2)
+            self.noise_block *= self.noise
+            self.k = 0
+        coords = pos + self.noise_block[self.k]
+        self.k += 1
+        return FrameSpec(IDs = self.IDs, coords = coords, time = t)
+
+    def stop(self):
+        """
+        Stop sensors.
+        """
+        self.running.set()
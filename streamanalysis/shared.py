@@ -0,0 +1,307 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import json
+import mmap
+from time import time
+from timeit import default_timer
+from numpy import dtype, frombuffer, array
+
+from streamanalysis.results import ResultSpec
+from streamanalysis.utils import to_timestamp
+
+# Layout of the header of the shared block: identifier of the format, number
+# of slots per buffer, and version of the seqlock, which is odd while a
+# buffer is written and even once it is published
+HEADER_DTYPE = dtype([('magic', 'S8'),
+                      ('capacity', '<u8'),
+                      ('seq', '<u8')])
+MAGIC = b'SAPUB001'
+
+# Layout of the latest state of a single sensor; the fields are the same as
+# in ResultSpec with the sensor ID encoded as JSON
+SLOT_DTYPE = dtype([('id', 'S64'),
+                    ('pos', '<f8', (2,)),
+                    ('pos_err', '<f8', (2,)),
+                    ('vel', '<f8', (2,)),
+                    ('vel_err', '<f8', (2,)),
+                    ('tot_vel', '<f8'),
+                    ('dist', '<f8'),
+                    ('stationary', '?'),
+                    ('time', '<f8')])
+
+# Number of used slots and time of publication in front of every buffer
+BUFFER_DTYPE = dtype([('count', '<u8'),
+                      ('published', '<f8')])
+
+def get_layout(capacity):
+    """
+    Return the offsets of the two buffers and the total size of a shared
+    block with the given number of slots.
+    """
+    size = BUFFER_DTYPE.itemsize + capacity * SLOT_DTYPE.itemsize
+    offsets = [HEADER_DTYPE.itemsize, HEADER_DTYPE.itemsize + size]
+    return offsets, HEADER_DTYPE.itemsize + 2 * size
+
+def map_buffers(buf, capacity):
+    """
+    Create numpy views of the header and the two buffers of a shared block
+    without copying.
+
+    :param buf: mmap instance
+    :param capacity: number of slots per buffer
+    :returns header, meta, slots: structured arrays of the header, and
+    lists with the metadata and the slots of both buffers
+    """
+    offsets, size = get_layout(capacity)
+    header = frombuffer(buf, dtype = HEADER_DTYPE, count = 1)
+    meta = [frombuffer(buf, dtype = BUFFER_DTYPE, count = 1,
+                       offset = offset) for offset in offsets]
+    slots = [frombuffer(buf, dtype = SLOT_DTYPE, count = capacity,
+                        offset = offset + BUFFER_DTYPE.itemsize)
+             for offset in offsets]
+    return header, meta, slots
+
+
+class Publisher(object):
+
+    def __init__(self, path, capacity = 256, interval = 0.05):
+        """
+        Publishes the latest result of every sensor into a memory-mapped
+        file, from which any number of Subscriber instances in other
+        processes read without locking the publisher. Pass an instance to
+        Analyser, which updates it whenever a result is stored and publishes
+        every interval seconds. Results are only referenced when they are
+        updated and written at the next publication. The block holds two
+        buffers, a publication copies the latest buffer into the other one,
+        writes the updated sensors and switches the buffers with a seqlock,
+        such that readers can use the latest buffer without copying it
+        until the next but one publication. Use a file on a tmpfs, e.g. in
+        /dev/shm, to keep the block in memory.
+
+        :param path: file name of the shared block, which is created or
+        reused; an existing file is only grown and never truncated, since
+        subscribers may still map it
+        :param capacity (optional): maximal number of sensors, results of
+        further sensors are counted in self.overflow but not published;
+        default: 256
+        :param interval (optional): time between publications in seconds;
+        default: 0.05
+        """
+        self.path = path
+        self.capacity = capacity
+        self.interval = interval
+        size = get_layout(capacity)[1]
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        self.file = os.fdopen(fd, 'r+b')
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self.buffer = mmap.mmap(fd, size)
+        self.header, self.meta, self.slots = map_buffers(self.buffer,
+                                                         capacity)
+        seq = 0
+        if self.header['magic'][0] == MAGIC:
+            # continue the versions of the previous publisher, such that its
+            # subscribers notice the new publications
+            seq = int(self.header['seq'][0])
+            seq += seq % 2
+        self.header['magic'] = MAGIC
+        self.header['capacity'] = capacity
+        self.header['seq'] = seq
+        # slots of the sensors and latest results that are not published
+        self.ids = {}
+        self.updated = {}
+        self.overflow = 0
+        self.last = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, ID, result):
+        """
+        Set latest result of sensor.
+
+        :param ID: sensor ID
+        :param result: ResultSpec or LazyResult instance
+        """
+        try:
+            i = self.ids[ID]
+        except KeyError:
+            if len(self.ids) == self.capacity:
+                self.overflow += 1
+                return
+            key = json.dumps(ID).encode('utf-8')
+            if len(key) > SLOT_DTYPE['id'].itemsize:
+                raise ValueError('Sensor ID %s is too long'%ID)
+            i = self.ids[ID] = len(self.ids)
+            for slots in self.slots:
+                slots['id'][i] = key
+        self.updated[i] = result
+
+    def due(self):
+        """
+        Return True if the next publication is due. The first call starts
+        the interval.
+        """
+        if self.last is None:
+            self.last = default_timer()
+        return default_timer() - self.last >= self.interval
+
+    def publish(self):
+        """
+        Write the updated results into the back buffer and make it the
+        latest buffer.
+        """
+        self.last = default_timer()
+        seq = int(self.header['seq'][0])
+        front = (seq // 2) % 2
+        back = 1 - front
+        n = len(self.ids)
+        # odd version while the back buffer is written
+        self.header['seq'] = seq + 1
+        slots = self.slots[back]
+        slots[:n] = self.slots[front][:n]
+        if self.updated:
+            rows = array(list(self.updated), dtype = int)
+            results = list(self.updated.values())
+            for name in ['pos', 'pos_err', 'vel', 'vel_err']:
+                slots[name][rows] = array([getattr(res, name)
+                                           for res in results])
+            slots['tot_vel'][rows] = [res.tot_vel for res in results]
+            slots['dist'][rows] = [res.dist for res in results]
+            slots['stationary'][rows] = [res.stationary for res in results]
+            slots['time'][rows] = [to_timestamp(res.time) for res in results]
+            self.updated = {}
+        self.meta[back]['count'] = n
+        self.meta[back]['published'] = time()
+        self.header['seq'] = seq + 2
+
+    def close(self):
+        """
+        Publish pending results and unmap the block. The file is kept for
+        the subscribers.
+        """
+        self.publish()
+        del self.header, self.meta, self.slots
+        self.buffer.close()
+        self.file.close()
+
+
+class Subscriber(object):
+
+    def __init__(self, path):
+        """
+        Read-only view of the block of a Publisher, which can be used from
+        any process. The views of the latest buffer returned by latest are
+        not copied and stay valid until the publisher starts the next but
+        one publication, which is tested with valid. read and get return
+        consistent copies. The views have to be dropped before the
+        subscriber is closed.
+
+        :param path: file name of the shared block
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0,
+                                access = mmap.ACCESS_READ)
+        header = frombuffer(self.buffer, dtype = HEADER_DTYPE, count = 1)
+        if header['magic'][0] != MAGIC:
+            raise ValueError('%s is not a shared result block'%path)
+        self.capacity = int(header['capacity'][0])
+        self.header, self.meta, self.slots = map_buffers(self.buffer,
+                                                         self.capacity)
+        # slots of the sensor IDs
+        self.ids = {}
+
+    @property
+    def seq(self):
+        """
+        Current version of the seqlock.
+        """
+        return int(self.header['seq'][0])
+
+    def latest(self):
+        """
+        Return the latest published buffer without copying.
+
+        :returns seq, slots: version of the buffer and structured array with
+        dtype SLOT_DTYPE of the used slots
+        """
+        # the latest published version is even
+        seq = self.seq & ~1
+        k = (seq // 2) % 2
+        return seq, self.slots[k][:int(self.meta[k]['count'][0])]
+
+    def valid(self, seq):
+        """
+        Test if the buffer of a version returned by latest hasn't been
+        written since, which is the case until the publication of the next
+        but one version starts.
+        """
+        return self.seq <= seq + 2
+
+    def read(self):
+        """
+        Return a consistent copy of the latest buffer.
+
+        :returns slots: structured array with dtype SLOT_DTYPE
+        """
+        while True:
+            seq, slots = self.latest()
+            slots = slots.copy()
+            if self.valid(seq):
+                return slots
+
+    def index(self, ID, slots):
+        """
+        Return slot of sensor. The cached assignment of the slots is rebuilt
+        from slots if the sensor is unknown or its slot holds another
+        sensor, e.g. after a restart of the publisher.
+        """
+        i = self.ids.get(ID)
+        if i is None or i >= len(slots) or \
+           slots['id'][i] != json.dumps(ID).encode('utf-8'):
+            self.ids = dict((json.loads(key.decode('utf-8')), j)
+                            for j, key in enumerate(slots['id'].tolist()))
+            i = self.ids[ID]
+        return i
+
+    def keys(self):
+        """
+        Return the IDs of the published sensors in order of their slots.
+        """
+        return [json.loads(key.decode('utf-8'))
+                for key in self.read()['id'].tolist()]
+
+    def get(self, ID):
+        """
+        Return the latest result of a sensor with the time in seconds since
+        EPOCH.
+
+        :param ID: sensor ID
+        :returns result: ResultSpec instance
+        """
+        while True:
+            seq, slots = self.latest()
+            i = self.index(ID, slots)
+            row = slots[i].copy()
+            if self.valid(seq):
+                break
+        return ResultSpec(pos = row['pos'], pos_err = row['pos_err'],
+                          vel = row['vel'], vel_err = row['vel_err'],
+                          tot_vel = float(row['tot_vel']),
+                          dist = float(row['dist']),
+                          stationary = bool(row['stationary']),
+                          time = float(row['time']))
+
+    def close(self):
+        """
+        Unmap the block. Views returned by latest must not be referenced
+        anymore, since they would point to unmapped memory.
+        """
+        del self.header, self.meta, self.slots
+        self.buffer.close()
+        self.file.close()
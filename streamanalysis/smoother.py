@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from numpy import (asarray, empty, zeros, sqrt, log, isnan, where, diff,
+                   broadcast_to, full, nan)
+
+from streamanalysis.results import ResultSpec
+
+def forward(times, coords, noise = 0.3, acc_noise = 4.0,
+            pos0 = [50.0, 50.0], vel0 = [0.0, 0.0], pos_prior = 100.0,
+            vel_prior = 10.0):
+    """
+    Forward pass of the Kalman Filter over whole measurement arrays of
+    several sensors. The recursion runs over time and is vectorized over the
+    sensors and the two independent axes, which are updated in closed form
+    as in FilterBank.update_decoupled. Missing measurements are given as nan
+    coordinates and only predicted.
+
+    :param times: array of timestamps in seconds with shape (T,) or (S, T)
+    :param coords: array of observed coordinates with shape (S, T, 2)
+    :param noise (optional): standard deviation of noise on observations;
+    default: 0.3
+    :param acc_noise (optional): estimate for standard deviation in
+    acceleration; default: 4.0
+    :param pos0 (optional): prior of the positions; default: [50, 50]
+    :param vel0 (optional): prior of the velocities; default: [0, 0]
+    :param pos_prior (optional): standard deviation of the position prior;
+    default: 100
+    :param vel_prior (optional): standard deviation of the velocity prior;
+    default: 10
+    :returns dt, predicted, filtered: time increments with shape (T, S, 1),
+    predicted covariances as tuple (pp, pv, vv) and filtered states as tuple
+    (x, v, pp, pv, vv) of arrays with shape (T, S, 2) containing positions,
+    velocities, and the covariances of the axes. The predicted positions and
+    velocities are not stored, since they follow from the filtered states of
+    the previous step.
+    """
+    coords = asarray(coords, dtype = float)
+    S, T = coords.shape[:2]
+    times = broadcast_to(asarray(times, dtype = float), (S, T))
+    dt = zeros((S, T))
+    dt[:, 1:] = diff(times, axis = 1)
+    dt = dt.T[:, :, None]
+    z = coords.transpose(1, 0, 2)
+    missing = isnan(z)
+    r = noise * noise
+    q = acc_noise * acc_noise
+    predicted = tuple(empty((T, S, 2)) for k in range(3))
+    filtered = tuple(empty((T, S, 2)) for k in range(5))
+    x = zeros((S, 2)) + pos0
+    v = zeros((S, 2)) + vel0
+    pp = zeros((S, 2)) + pos_prior * pos_prior
+    pv = zeros((S, 2))
+    vv = zeros((S, 2)) + vel_prior * vel_prior
+    for t in range(T):
+        h = dt[t]
+        h2 = h * h
+        # Prediction of state and error covariance
+        x = x + h * v
+        a = pp + 2 * h * pv + h2 * vv + q * h2 * h2 * .25
+        b = pv + h * vv + q * h2 * h * .5
+        c = vv + q * h2
+        for states, value in zip(predicted, (a, b, c)):
+            states[t] = value
+        # Gain from the scalar innovation covariances, vanishing for missing
+        # measurements
+        k0 = where(missing[t], 0.0, a / (a + r))
+        k1 = where(missing[t], 0.0, b / (a + r))
+        y = where(missing[t], 0.0, z[t] - x)
+        x = x + k0 * y
+        v = v + k1 * y
+        pp = (1 - k0) * a
+        pv = (1 - k0) * b
+        vv = c - k1 * b
+        for states, value in zip(filtered, (x, v, pp, pv, vv)):
+            states[t] = value
+    return dt, predicted, filtered
+
+def smooth(times, coords, noise = 0.3, acc_noise = 4.0, stat_p = 0.95,
+           **kwargs):
+    """
+    Fixed-interval smoother for recorded measurements of several sensors,
+    which runs the forward pass of the Kalman Filter followed by the
+    Rauch-Tung-Striebel backward pass. Both passes are vectorized over the
+    sensors and the axes. Distances are accumulated from the smoothed
+    positions where the sensors are not stationary, using the same test as
+    Analyser.is_stationary.
+
+    :param times: array of timestamps in seconds with shape (T,) or (S, T)
+    :param coords: array of observed coordinates with shape (S, T, 2), nan
+    for missing measurements
+    :param noise (optional): standard deviation of noise on observations;
+    default: 0.3
+    :param acc_noise (optional): estimate for standard deviation in
+    acceleration; default: 4.0
+    :param stat_p (optional): confidence of the stationarity test; default:
+    0.95
+    :param kwargs (optional): priors passed to forward
+    :returns result: ResultSpec instance of arrays with shape (S, T, 2) for
+    pos, pos_err, vel, vel_err and (S, T) for tot_vel, dist, stationary,
+    and time
+    """
+    dt, predicted, filtered = forward(times, coords, noise, acc_noise,
+                                      **kwargs)
+    # the filtered states are smoothed in place
+    x, v, pp, pv, vv = filtered
+    ap, bp, cp = predicted
+    T = len(x)
+    for t in range(T - 2, -1, -1):
+        h = dt[t + 1]
+        # Gain C = P F^T Pk^-1 of the backward pass
+        fp = pp[t] + h * pv[t]
+        det = ap[t + 1] * cp[t + 1] - bp[t + 1] * bp[t + 1]
+        c00 = (fp * cp[t + 1] - pv[t] * bp[t + 1]) / det
+        c01 = (pv[t] * ap[t + 1] - fp * bp[t + 1]) / det
+        g = pv[t] + h * vv[t]
+        c10 = (g * cp[t + 1] - vv[t] * bp[t + 1]) / det
+        c11 = (vv[t] * ap[t + 1] - g * bp[t + 1]) / det
+        # Correction of state and covariance by the smoothed successor, the
+        # prediction is recomputed from the filtered state
+        dx = x[t + 1] - x[t] - h * v[t]
+        dv = v[t + 1] - v[t]
+        x[t] += c00 * dx + c01 * dv
+        v[t] += c10 * dx + c11 * dv
+        da = pp[t + 1] - ap[t + 1]
+        db = pv[t + 1] - bp[t + 1]
+        dc = vv[t + 1] - cp[t + 1]
+        pp[t] += c00 * (c00 * da + c01 * db) + c01 * (c00 * db + c01 * dc)
+        pv[t] += c00 * (c10 * da + c11 * db) + c01 * (c10 * db + c11 * dc)
+        vv[t] += c10 * (c10 * da + c11 * db) + c11 * (c10 * db + c11 * dc)
+    del filtered, predicted, ap, bp, cp, pv
+    pos = x.transpose(1, 0, 2)
+    vel = v.transpose(1, 0, 2)
+    pos_err = sqrt(pp, out = pp).transpose(1, 0, 2)
+    vel_err = sqrt(vv, out = vv).transpose(1, 0, 2)
+    # Test which objects are stationary and accumulate the distance of the
+    # others
+    ratio = vel / vel_err
+    ratio *= ratio
+    stat = ratio.sum(axis = 2) < -2 * log(1 - stat_p)
+    del ratio
+    step = zeros(stat.shape)
+    step[:, 1:] = sqrt((diff(pos, axis = 1)**2).sum(axis = 2))
+    dist = where(stat, 0.0, step).cumsum(axis = 1)
+    tot_vel = where(stat, 0.0, sqrt((vel * vel).sum(axis = 2)))
+    S = pos.shape[0]
+    return ResultSpec(pos = pos, pos_err = pos_err, vel = vel,
+                      vel_err = vel_err, tot_vel = tot_vel, dist = dist,
+                      stationary = stat,
+                      time = broadcast_to(asarray(times, dtype = float),
+                                          (S, T)))
+
+def smooth_session(log, IDs = None, start = None, end = None, **kwargs):
+    """
+    Smooth the measurements of a SessionLog. The measurements of the sensors
+    are padded to a common length with nan coordinates, such that all
+    sensors are smoothed at once.
+
+    :param log: SessionLog instance
+    :param IDs (optional): list of sensor IDs; default: None (all)
+    :param start (optional): earliest time; default: None
+    :param end (optional): latest time; default: None
+    :param kwargs (optional): parameters passed to smooth
+    :returns results: dictionary with a ResultSpec instance of arrays per
+    sensor ID
+    """
+    records = log.read_measurements(IDs, start, end)
+    if IDs is None:
+        IDs = log.index.keys
+    IDs = [ID for ID in IDs if ID in log.index.ids]
+    rows = [records[records['idx'] == log.index.ids[ID]] for ID in IDs]
+    IDs = [ID for ID, row in zip(IDs, rows) if len(row)]
+    rows = [row for row in rows if len(row)]
+    if not rows:
+        return {}
+    T = max(len(row) for row in rows)
+    times = empty((len(rows), T))
+    coords = full((len(rows), T, 2), nan)
+    for i, row in enumerate(rows):
+        n = len(row)
+        times[i, :n] = row['time']
+        # padding repeats the last time, i.e. it is neither predicted nor
+        # counted in the distance
+        times[i, n:] = row['time'][-1]
+        coords[i, :n, 0] = row['x']
+        coords[i, :n, 1] = row['y']
+    result = smooth(times, coords, **kwargs)
+    results = {}
+    for i, (ID, row) in enumerate(zip(IDs, rows)):
+        n = len(row)
+        results[ID] = ResultSpec(*[field[i, :n] for field in result])
+    return results
@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from numpy import (array, asarray, zeros, concatenate, sqrt, argsort, ceil,
+                   fromiter, flatnonzero, maximum, inf)
+
+class SpatialHash(object):
+
+    def __init__(self, limits = array([100, 100]), cell = 5.0, capacity = 64):
+        """
+        Uniform grid over the field for proximity queries on the latest
+        positions of the sensors. Positions are stored in self.pos with rows
+        assigned to the sensor IDs in order of appearance and every grid cell
+        holds the set of rows inside it. Updating a position only moves the
+        row if it changes its cell. Positions outside of the field are
+        assigned to the closest border cell.
+
+        :param limits (optional): size of the field in meters as in Athlete;
+        default: [100, 100]
+        :param cell (optional): edge length of the grid cells in meters;
+        default: 5
+        :param capacity (optional): number of sensors for which memory is
+        allocated initially; default: 64
+        """
+        self.limits = asarray(limits, dtype = float)
+        self.cell = cell
+        self.shape = tuple(int(n) for n in
+                           maximum(ceil(self.limits / cell), 1))
+        self.ids = {}
+        self.keys = []
+        self.pos = zeros((capacity, 2))
+        self.cells = zeros(capacity, dtype = int)
+        self.grid = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, ID):
+        return ID in self.ids
+
+    def get_cell(self, pos):
+        """
+        Return grid coordinates of position.
+        """
+        cx = min(max(int(pos[0] // self.cell), 0), self.shape[0] - 1)
+        cy = min(max(int(pos[1] // self.cell), 0), self.shape[1] - 1)
+        return cx, cy
+
+    def position(self, ID):
+        """
+        Return latest position of sensor.
+        """
+        return self.pos[self.ids[ID]]
+
+    def update(self, ID, pos):
+        """
+        Set position of sensor and move it to its new cell if necessary.
+
+        :param ID: sensor ID
+        :param pos: position
+        """
+        cx, cy = self.get_cell(pos)
+        key = cx * self.shape[1] + cy
+        try:
+            i = self.ids[ID]
+        except KeyError:
+            i = len(self.keys)
+            if i == len(self.pos):
+                # double capacity of the arrays
+                self.pos = concatenate([self.pos, zeros(self.pos.shape)])
+                self.cells = concatenate([self.cells,
+                                          zeros(len(self.cells), dtype = int)])
+            self.ids[ID] = i
+            self.keys.append(ID)
+        else:
+            old = self.cells[i]
+            if old == key:
+                self.pos[i] = pos
+                return
+            self.grid[old].discard(i)
+        self.pos[i] = pos
+        self.cells[i] = key
+        try:
+            self.grid[key].add(i)
+        except KeyError:
+            self.grid[key] = set([i])
+
+    def update_many(self, IDs, positions):
+        """
+        Set positions of several sensors.
+
+        :param IDs: list of sensor IDs
+        :param positions: array of positions with shape (n, 2)
+        """
+        for ID, pos in zip(IDs, positions):
+            self.update(ID, pos)
+
+    def candidates(self, cx, cy, ring):
+        """
+        Return rows in the square of cells within ring cells around cell
+        (cx, cy).
+        """
+        ny = self.shape[1]
+        rows = []
+        for x in range(max(cx - ring, 0), min(cx + ring + 1, self.shape[0])):
+            for y in range(max(cy - ring, 0), min(cy + ring + 1, ny)):
+                rows.extend(self.grid.get(x * ny + y, ()))
+        return fromiter(rows, dtype = int, count = len(rows))
+
+    def radius(self, points, r):
+        """
+        Find sensors within distance r of every point.
+
+        :param points: array of positions with shape (n, 2)
+        :param r: radius in meters
+        :returns neighbours: list with a list of sensor IDs sorted by
+        distance for every point
+        """
+        ring = int(ceil(r / self.cell))
+        result = []
+        for point in asarray(points, dtype = float):
+            rows = self.candidates(*self.get_cell(point), ring = ring)
+            d2 = ((self.pos[rows] - point)**2).sum(axis = 1)
+            inside = flatnonzero(d2 <= r * r)
+            order = inside[argsort(d2[inside], kind = 'mergesort')]
+            result.append([self.keys[i] for i in rows[order].tolist()])
+        return result
+
+    def covered(self, point, cx, cy, ring):
+        """
+        Return the distance from point up to which all sensors are within
+        ring cells around cell (cx, cy). Sides of the square at the border
+        of the grid are not limiting, since sensors outside of the field are
+        assigned to the border cells.
+        """
+        covered = inf
+        for p, c, n in ((point[0], cx, self.shape[0]),
+                        (point[1], cy, self.shape[1])):
+            if c - ring > 0:
+                covered = min(covered, max(p - (c - ring) * self.cell, 0))
+            if c + ring + 1 < n:
+                covered = min(covered, max((c + ring + 1) * self.cell - p, 0))
+        return covered
+
+    def knn(self, points, k):
+        """
+        Find the k nearest sensors of every point. The search extends ring
+        by ring around the cell of the point until the k-th nearest sensor
+        is closer than the covered distance.
+
+        :param points: array of positions with shape (n, 2)
+        :param k: number of neighbours
+        :returns neighbours: list with a list of at most k sensor IDs sorted
+        by distance for every point
+        """
+        k = min(k, len(self.keys))
+        result = []
+        for point in asarray(points, dtype = float):
+            cx, cy = self.get_cell(point)
+            ring = 0
+            while True:
+                rows = self.candidates(cx, cy, ring)
+                d2 = ((self.pos[rows] - point)**2).sum(axis = 1)
+                order = argsort(d2, kind = 'mergesort')[:k]
+                covered = self.covered(point, cx, cy, ring)
+                complete = ring >= max(self.shape)
+                if complete or (len(order) == k and
+                                d2[order[-1]] <= covered * covered):
+                    break
+                ring += 1
+            result.append([self.keys[i] for i in rows[order].tolist()])
+        return result
+
+    def neighbours(self, ID, r):
+        """
+        Return the IDs of the sensors within distance r of sensor ID sorted
+        by distance, excluding the sensor itself.
+        """
+        return [other for other in self.radius([self.position(ID)], r)[0]
+                if other != ID]
+
+    def pairs(self, r):
+        """
+        Find all pairs of sensors within distance r. Every cell is compared
+        to itself and its neighbouring cells with a larger index, such that
+        every pair is tested once.
+
+        :param r: radius in meters
+        :returns pairs: list of (ID, ID, distance) tuples
+        """
+        ring = int(ceil(r / self.cell))
+        ny = self.shape[1]
+        result = []
+        for key, cell_rows in list(self.grid.items()):
+            if not cell_rows:
+                continue
+            rows = fromiter(cell_rows, dtype = int, count = len(cell_rows))
+            cx, cy = divmod(key, ny)
+            others = self.candidates(cx, cy, ring)
+            # only consider other cells with larger index and rows within
+            # the same cell once
+            others = others[self.cells[others] >= key]
+            if not len(others):
+                continue
+            d2 = ((self.pos[rows][:, None] - self.pos[others][None])**2
+                  ).sum(axis = 2)
+            i, j = (d2 <= r * r).nonzero()
+            a = rows[i]
+            b = others[j]
+            keep = (self.cells[b] > key) | (a < b)
+            for m, n, d in zip(a[keep].tolist(), b[keep].tolist(),
+                               sqrt(d2[i[keep], j[keep]]).tolist()):
+                result.append((self.keys[m], self.keys[n], d))
+        return result
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from math import frexp
+from timeit import default_timer
+
+class Histogram(object):
+
+    def __init__(self, smallest = 1e-6, buckets = 40):
+        """
+        Histogram with logarithmic buckets whose upper edges are
+        smallest * 2**k and belong to the bucket. Values below smallest are
+        counted in the first and values above the last edge in the last
+        bucket.
+
+        :param smallest (optional): upper edge of first bucket; default: 1e-6
+        :param buckets (optional): number of buckets; default: 40
+        """
+        self.smallest = smallest
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """
+        Add value to histogram.
+        """
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value <= self.smallest:
+            k = 0
+        else:
+            mantissa, k = frexp(value / self.smallest)
+            if mantissa == .5:
+                # value is on the upper edge smallest * 2**(k - 1)
+                k -= 1
+            k = min(k, len(self.counts) - 1)
+        self.counts[k] += 1
+
+    def quantile(self, q):
+        """
+        Return upper edge of the bucket containing the q-quantile, or the
+        maximum if it is in the last bucket, which has no upper edge.
+        """
+        target = q * self.count
+        cumulative = 0
+        last = len(self.counts) - 1
+        for k, n in enumerate(self.counts):
+            cumulative += n
+            if n and cumulative >= target:
+                if k == last:
+                    return self.max
+                return min(self.smallest * 2**k, self.max)
+        return self.max
+
+    def snapshot(self):
+        """
+        :returns snapshot: dictionary with count, mean, maximum, approximate
+        quantiles, and the non-empty buckets as (upper edge, count)
+        """
+        counts = list(self.counts)
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max,
+                'p50': self.quantile(.5),
+                'p90': self.quantile(.9),
+                'p99': self.quantile(.99),
+                'buckets': [(self.smallest * 2**k, n)
+                            for k, n in enumerate(counts) if n]}
+
+
+class PipelineStats(object):
+
+    def __init__(self):
+        """
+        Collects latencies of the processing stages, the number of items per
+        sensor, samples of the queue depth, and the lag between the time of
+        measurements and their processing. Pass an instance to Analyser or
+        Sensor to enable the instrumentation, which is absent otherwise.
+        """
+        self.stages = {}
+        self.processed = {}
+        self.produced = {}
+        self.queue_depth = Histogram(smallest = 1.0)
+        self.lag = Histogram()
+
+    def stage(self, name):
+        """
+        Return histogram of stage and create it if necessary.
+
+        :param name: name of stage
+        :returns histogram: Histogram instance
+        """
+        try:
+            return self.stages[name]
+        except KeyError:
+            hist = self.stages[name] = Histogram()
+            return hist
+
+    def timed(self, name, func):
+        """
+        Wrap function such that its latency is added to the histogram of the
+        stage.
+
+        :param name: name of stage
+        :param func: function to time
+        :returns wrapper: timed function
+        """
+        hist = self.stage(name)
+        def wrapper(*args, **kwargs):
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.add(default_timer() - start)
+        return wrapper
+
+    def snapshot(self):
+        """
+        :returns snapshot: dictionary with the snapshots of the stage, queue
+        depth and lag histograms and the counts per sensor
+        """
+        return {'stages': dict((name, hist.snapshot())
+                               for name, hist in list(self.stages.items())),
+                'processed': dict(self.processed),
+                'produced': dict(self.produced),
+                'queue_depth': self.queue_depth.snapshot(),
+                'lag': self.lag.snapshot()}
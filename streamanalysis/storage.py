@@ -0,0 +1,323 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import json
+from numpy import dtype, memmap, array, concatenate, ones, isin
+
+from streamanalysis.wire import MEASUREMENT_DTYPE, SensorIndex
+from streamanalysis.utils import to_timestamp
+
+# Binary layout of a single result in the log; the fields are the same as
+# in ResultSpec with the sensor given by its index in a SensorIndex
+RESULT_DTYPE = dtype([('idx', '<u4'),
+                      ('pos', '<f8', (2,)),
+                      ('pos_err', '<f8', (2,)),
+                      ('vel', '<f8', (2,)),
+                      ('vel_err', '<f8', (2,)),
+                      ('tot_vel', '<f8'),
+                      ('dist', '<f8'),
+                      ('stationary', '?'),
+                      ('time', '<f8')])
+
+class SegmentLog(object):
+
+    def __init__(self, path, name, record_dtype, segment_size = 2**16,
+                 buffer_size = 1024):
+        """
+        Append-only log of records stored in memory-mapped segment files of
+        fixed size. Appended records are buffered and written in batches.
+        For every segment the number of records, the time range, and the
+        indices of the contained sensors are kept in an index file, which is
+        used to select the segments when reading. The index file is only
+        rewritten when a segment is started or full; in between, the
+        metadata of the current segment is appended to a journal file at
+        every write. An existing log is continued.
+
+        :param path: directory of the log
+        :param name: name of the log, used as prefix of the files
+        :param record_dtype: structured dtype of the records, which needs the
+        fields 'idx' and 'time'
+        :param segment_size (optional): number of records per segment;
+        default: 65536
+        :param buffer_size (optional): number of records that are buffered
+        before they are written; default: 1024
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.name = name
+        self.dtype = record_dtype
+        self.segment_size = segment_size
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.segments = []
+        self.current = None
+        index = self.get_filename('json')
+        if os.path.exists(index):
+            with open(index) as f:
+                meta = json.load(f)
+            self.segment_size = meta['segment_size']
+            self.segments = meta['segments']
+        journal = self.get_filename('journal')
+        if os.path.exists(journal):
+            with open(journal) as f:
+                for line in f:
+                    try:
+                        meta = json.loads(line)
+                    except ValueError:
+                        # incomplete last line of an interrupted write
+                        break
+                    k = meta.pop('segment')
+                    if k == len(self.segments):
+                        self.segments.append(meta)
+                    elif meta['count'] >= self.segments[k]['count']:
+                        # entries written before the index are outdated
+                        self.segments[k] = meta
+
+    def __len__(self):
+        return sum(s['count'] for s in self.segments) + len(self.buffer)
+
+    def get_filename(self, ext, k = None):
+        """
+        Return file name of the index (k is None) or of segment k.
+        """
+        if k is None:
+            return os.path.join(self.path, '%s.%s'%(self.name, ext))
+        return os.path.join(self.path, '%s_%06i.%s'%(self.name, k, ext))
+
+    def append(self, record):
+        """
+        Append a single record given as tuple to the buffer.
+
+        :param record: tuple with the fields of the records
+        """
+        self.buffer.append(record)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def extend(self, records):
+        """
+        Write several records.
+
+        :param records: structured array with the dtype of the log
+        """
+        self.flush()
+        self.write(records)
+
+    def flush(self):
+        """
+        Write buffered records to the segments.
+        """
+        if self.buffer:
+            records = array(self.buffer, dtype = self.dtype)
+            self.buffer = []
+            self.write(records)
+
+    def write(self, records):
+        """
+        Write records to the segments, starting new segments if necessary,
+        and update the index file or the journal.
+
+        :param records: structured array with the dtype of the log
+        """
+        if not len(records):
+            return
+        # the index is rewritten if a segment is started or completed
+        rollover = False
+        while len(records):
+            if not self.segments or \
+               self.segments[-1]['count'] == self.segment_size:
+                self.segments.append({'count': 0, 'start': None,
+                                      'end': None, 'sensors': []})
+                self.current = None
+                rollover = True
+            k = len(self.segments) - 1
+            meta = self.segments[k]
+            if self.current is None:
+                filename = self.get_filename('bin', k)
+                mode = 'r+' if os.path.exists(filename) else 'w+'
+                self.current = memmap(filename, dtype = self.dtype,
+                                      mode = mode,
+                                      shape = (self.segment_size,))
+            n = min(len(records), self.segment_size - meta['count'])
+            chunk = records[:n]
+            records = records[n:]
+            self.current[meta['count']:meta['count'] + n] = chunk
+            meta['count'] += n
+            times = chunk['time']
+            start, end = float(times.min()), float(times.max())
+            if meta['start'] is None:
+                meta['start'], meta['end'] = start, end
+            else:
+                meta['start'] = min(meta['start'], start)
+                meta['end'] = max(meta['end'], end)
+            sensors = set(meta['sensors'])
+            sensors.update(chunk['idx'].tolist())
+            meta['sensors'] = sorted(sensors)
+            rollover |= meta['count'] == self.segment_size
+        if self.current is not None:
+            self.current.flush()
+        if rollover:
+            self.write_index()
+        else:
+            entry = dict(self.segments[-1], segment = len(self.segments) - 1)
+            with open(self.get_filename('journal'), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def write_index(self):
+        """
+        Write the metadata of all segments to the index file and clear the
+        journal.
+        """
+        with open(self.get_filename('json'), 'w') as f:
+            json.dump({'segment_size': self.segment_size,
+                       'segments': self.segments}, f)
+        open(self.get_filename('journal'), 'w').close()
+
+    def get_segment(self, k):
+        """
+        Return read-only memory map of the written records of segment k.
+
+        :param k: index of segment
+        :returns records: structured array
+        """
+        return memmap(self.get_filename('bin', k), dtype = self.dtype,
+                      mode = 'r', shape = (self.segment_size,)
+                      )[:self.segments[k]['count']]
+
+    def read(self, sensors = None, start = None, end = None):
+        """
+        Read records of the given sensors within the time range. Only the
+        segments that may contain such records are mapped. Without selection
+        the segments are returned without copying.
+
+        :param sensors (optional): list of sensor indices; default: None
+        (all sensors)
+        :param start (optional): earliest time in seconds; default: None
+        :param end (optional): latest time in seconds; default: None
+        :returns records: list of structured arrays (one per segment)
+        """
+        self.flush()
+        selected = []
+        for k, meta in enumerate(self.segments):
+            if meta['count'] == 0:
+                continue
+            if start is not None and meta['end'] < start:
+                continue
+            if end is not None and meta['start'] > end:
+                continue
+            if sensors is not None and \
+               not set(sensors).intersection(meta['sensors']):
+                continue
+            records = self.get_segment(k)
+            if sensors is None and start is None and end is None:
+                selected.append(records)
+                continue
+            mask = ones(len(records), dtype = bool)
+            if sensors is not None:
+                mask &= isin(records['idx'], sensors)
+            if start is not None:
+                mask &= records['time'] >= start
+            if end is not None:
+                mask &= records['time'] <= end
+            selected.append(records[mask])
+        return selected
+
+
+class SessionLog(object):
+
+    def __init__(self, path, segment_size = 2**16, buffer_size = 1024):
+        """
+        Persistent log of the raw measurements and the filter results of a
+        session, stored in two SegmentLog instances at self.measurements and
+        self.results. The sensor IDs are translated into indices with a
+        SensorIndex which is stored alongside. Pass the log to an Analyser to
+        record everything it processes.
+
+        :param path: directory of the log
+        :param segment_size (optional): number of records per segment;
+        default: 65536
+        :param buffer_size (optional): number of records that are buffered
+        before they are written; default: 1024
+        """
+        self.path = path
+        self.measurements = SegmentLog(path, 'measurements',
+                                       MEASUREMENT_DTYPE, segment_size,
+                                       buffer_size)
+        self.results = SegmentLog(path, 'results', RESULT_DTYPE,
+                                  segment_size, buffer_size)
+        IDs = None
+        filename = os.path.join(path, 'sensors.json')
+        if os.path.exists(filename):
+            with open(filename) as f:
+                IDs = json.load(f)
+        self.index = SensorIndex(IDs)
+
+    def add(self, ID, data, result):
+        """
+        Add measurement and corresponding result to the log.
+
+        :param ID: sensor ID
+        :param data: MeasurementSpec instance
+        :param result: ResultSpec instance
+        """
+        i = self.index.index(ID)
+        time = to_timestamp(data.time)
+        self.measurements.append((i, data.coords[0], data.coords[1], time))
+        self.results.append((i, result.pos, result.pos_err, result.vel,
+                             result.vel_err, result.tot_vel, result.dist,
+                             result.stationary, time))
+
+    def flush(self):
+        """
+        Write buffered measurements, results and the sensor index.
+        """
+        self.measurements.flush()
+        self.results.flush()
+        with open(os.path.join(self.path, 'sensors.json'), 'w') as f:
+            json.dump(self.index.keys, f)
+
+    def read_measurements(self, IDs = None, start = None, end = None):
+        """
+        Read measurements of the given sensors within the time range.
+
+        :param IDs (optional): list of sensor IDs; default: None (all)
+        :param start (optional): earliest time; default: None
+        :param end (optional): latest time; default: None
+        :returns records: structured array with dtype MEASUREMENT_DTYPE
+        """
+        return self.read(self.measurements, IDs, start, end)
+
+    def read_results(self, IDs = None, start = None, end = None):
+        """
+        Read results of the given sensors within the time range.
+
+        :param IDs (optional): list of sensor IDs; default: None (all)
+        :param start (optional): earliest time; default: None
+        :param end (optional): latest time; default: None
+        :returns records: structured array with dtype RESULT_DTYPE
+        """
+        return self.read(self.results, IDs, start, end)
+
+    def read(self, log, IDs, start, end):
+        """
+        Read records of the given sensors within the time range from log
+        and join the segments.
+        """
+        self.flush()
+        sensors = None
+        if IDs is not None:
+            sensors = [self.index.ids[ID] for ID in IDs if ID in self.index.ids]
+        if start is not None:
+            start = to_timestamp(start)
+        if end is not None:
+            end = to_timestamp(end)
+        segments = log.read(sensors, start, end)
+        if len(segments) == 1:
+            return segments[0]
+        if not segments:
+            return array([], dtype = log.dtype)
+        return concatenate(segments)
@@ -3,6 +3,7 @@
 # System imports
 from __future__ import print_function, division, absolute_import, unicode_literals
 
+from datetime import datetime, timedelta
 from numpy import array, cos, sin, arctan2, sqrt
 
 def polar2euclid(a, angle):
@@ -12,4 +13,30 @@ def euclid2polar(vec):
     return get_norm(vec), arctan2(vec[1], vec[0])
 
 def get_norm(vec):
-    return sqrt((vec * vec).sum())
\ No newline at end of file
+    return sqrt((vec * vec).sum())
+
+EPOCH = datetime(1970, 1, 1)
+
+def to_timestamp(time):
+    """
+    Convert a datetime instance into seconds since EPOCH. Floats are
+    interpreted as timestamps already and returned unchanged.
+    """
+    if isinstance(time, datetime):
+        return (time - EPOCH).total_seconds()
+    return time
+
+def from_timestamp(timestamp):
+    """
+    Convert seconds since EPOCH into a datetime instance.
+    """
+    return EPOCH + timedelta(seconds = timestamp)
+
+def time_difference(time, previous):
+    """
+    Return time increment in seconds between two datetime instances or two
+    timestamps in seconds.
+    """
+    if isinstance(time, datetime):
+        return (time - previous).total_seconds()
+    return time - previous
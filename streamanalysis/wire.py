@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+
+# System imports
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from numpy import dtype, empty, frombuffer, column_stack
+
+from streamanalysis.sensor import MeasurementSpec
+from streamanalysis.utils import to_timestamp
+
+# Binary layout of a single measurement (28 bytes): index of the sensor in a
+# SensorIndex, x and y coordinates, and time in seconds since EPOCH
+MEASUREMENT_DTYPE = dtype([('idx', '<u4'),
+                           ('x', '<f8'),
+                           ('y', '<f8'),
+                           ('time', '<f8')])
+
+class SensorIndex(object):
+
+    def __init__(self, IDs = None):
+        """
+        Translation between sensor IDs and the integer indices used in the
+        binary measurement format. Sender and receiver have to use the same
+        index, e.g. by creating it from the same list of IDs.
+
+        :param IDs (optional): list of sensor IDs that are indexed in this
+        order; default: None
+        """
+        self.ids = {}
+        self.keys = []
+        for ID in IDs or []:
+            self.index(ID)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, i):
+        return self.keys[i]
+
+    def index(self, ID):
+        """
+        Return index of sensor ID and add it if it is new.
+
+        :param ID: sensor ID
+        :returns i: integer index
+        """
+        try:
+            return self.ids[ID]
+        except KeyError:
+            i = len(self.keys)
+            self.ids[ID] = i
+            self.keys.append(ID)
+            return i
+
+def to_records(measurements, index):
+    """
+    Convert measurements into the binary record format.
+
+    :param measurements: list of MeasurementSpec instances
+    :param index: SensorIndex instance
+    :returns records: structured array with dtype MEASUREMENT_DTYPE
+    """
+    records = empty(len(measurements), dtype = MEASUREMENT_DTYPE)
+    for i, data in enumerate(measurements):
+        records[i] = (index.index(data.ID), data.coords[0], data.coords[1],
+                      to_timestamp(data.time))
+    return records
+
+def from_records(records, index):
+    """
+    Convert records into measurements with timestamps in seconds.
+
+    :param records: structured array with dtype MEASUREMENT_DTYPE
+    :param index: SensorIndex instance
+    :returns measurements: list of MeasurementSpec instances
+    """
+    coords = column_stack([records['x'], records['y']])
+    return [MeasurementSpec(ID = index[i], coords = c, time = t)
+            for i, c, t in zip(records['idx'].tolist(), coords,
+                               records['time'].tolist())]
+
+def encode(records):
+    """
+    Encode records into bytes.
+
+    :param records: structured array with dtype MEASUREMENT_DTYPE
+    :returns buf: bytes
+    """
+    return records.astype(MEASUREMENT_DTYPE, copy = False).tobytes()
+
+def decode(buf, count = -1):
+    """
+    Decode bytes into records without copying.
+
+    :param buf: bytes or buffer containing measurements in binary format
+    :param count (optional): number of records at the start of buf to
+    decode, -1 for all; default: -1
+    :returns records: read-only structured array with dtype
+    MEASUREMENT_DTYPE
+    """
+    return frombuffer(buf, dtype = MEASUREMENT_DTYPE, count = count)
@@ -0,0 +1,73 @@
+"""
+Tests for `aggregates` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import aggregates
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.replay import simulate_stream, replay
+from streamanalysis.results import ResultSpec
+from numpy import isclose, diff, where
+from datetime import datetime
+from Queue import Queue
+
+class TestAggregates(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.aggregates = aggregates.Aggregates(windows = [5.0, 30.0],
+                                                sprint_speed = 3.0)
+
+    def test_analyser(self):
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, i, seed = i)
+                   for i in range(2)]
+        stream = list(simulate_stream(sensors, 60, datetime(2016, 7, 12)))
+        analyser = Analyser(q, backend = 'fast',
+                            aggregates = self.aggregates)
+        replay(analyser, stream)
+        assert len(self.aggregates) == 2
+        for ID in range(2):
+            store = analyser.sensors[ID]
+            time = store.column('time')
+            vel = store.column('tot_vel')
+            dist = store.column('dist')
+            stat = store.column('stationary')
+            snapshot = self.aggregates[ID].snapshot()
+            assert isclose(snapshot['duration'], time[-1] - time[0])
+            assert snapshot['dist'] == dist[-1]
+            assert snapshot['max_vel'] == vel.max()
+            assert isclose(snapshot['stationary_time'],
+                           where(stat[1:], diff(time), 0.0).sum())
+            fast = vel > 3.0
+            assert snapshot['sprints'] == fast[0] + (fast[1:] &
+                                                     ~fast[:-1]).sum()
+            for w in [5.0, 30.0]:
+                inside = time > time[-1] - w
+                before = dist[~inside][-1]
+                assert isclose(snapshot['window_dist'][w], dist[-1] - before)
+                assert snapshot['window_max_vel'][w] == vel[inside].max()
+        assert set(self.aggregates.snapshot()) == set([0, 1])
+
+    def test_window(self):
+        sensor = aggregates.SensorAggregates(windows = [1.0])
+        for t, v in [(0.0, 5.0), (.5, 1.0), (1.0, 2.0), (1.6, 0.5)]:
+            sensor.add(ResultSpec(pos = None, pos_err = None, vel = None,
+                                  vel_err = None, tot_vel = v, dist = t,
+                                  stationary = False, time = t))
+        assert sensor.window_max_vel(1.0) == 2.0
+        assert sensor.window_dist(1.0) == 1.6 - .5
+        assert len(sensor.speeds[1.0]) == 2
+        assert sensor.max_vel == 5.0
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -5,12 +5,14 @@ Tests for `analyser` module.
 from __future__ import print_function, division, absolute_import, unicode_literals
 
 import pytest
-from streamanalysis import analyser
+from streamanalysis import analyser, results
 from Queue import Queue
-from streamanalysis.sensor import MeasurementSpec
-from numpy import ones, zeros, allclose, isclose
-from datetime import datetime
-from time import sleep
+from streamanalysis.sensor import MeasurementSpec, FrameSpec
+from numpy import ones, zeros, allclose, isclose, log
+from numpy.random.mtrand import RandomState
+from datetime import datetime, timedelta
+from streamanalysis.clock import SimulatedClock
+from streamanalysis.replay import replay
 
 class TestAthlete(object):
 
@@ -22,7 +24,7 @@ class TestAthlete(object):
         self.date = datetime.now()
         self.m = MeasurementSpec('test', self.analyser.pos0, self.date)
         self.r = analyser.ResultSpec(self.m.coords, None, zeros(2), None, 0.0,
-                                     True, self.date)
+                                     0.0, True, self.date)
         self.q.put(self.m)
         
     def test_is_stationary(self):
@@ -31,11 +33,19 @@ class TestAthlete(object):
         assert self.analyser.is_stationary(vel, vel_err)
         
     def test_run(self):
-        self.analyser.start()
-        sleep(2)
-        assert not self.analyser.isAlive()
-        assert self.analyser.data['test'] == self.m
-        res = self.analyser.sensors['test']
+        # the queue is drained without waiting on the wall clock
+        run = analyser.Analyser(self.q, wait = 0,
+                                clock = SimulatedClock(self.date))
+        run.start()
+        run.join(5)
+        assert not run.isAlive()
+        assert run.data['test'] == self.m
+        replayed = analyser.Analyser(Queue(),
+                                     clock = SimulatedClock(self.date))
+        replay(replayed, [self.m])
+        assert allclose(run.sensors['test'].column('pos'),
+                        replayed.sensors['test'].column('pos'))
+        res = run.sensors['test']
         assert len(res) == 1
         assert allclose(self.r.pos, res[0].pos)
         assert allclose(self.r.vel, res[0].vel)
@@ -43,6 +53,208 @@ class TestAthlete(object):
         assert self.r.stationary == res[0].stationary
         assert self.r.time == self.date
 
+    def test_analyse_batch(self):
+        # Compare vectorized batch analysis to sequential analysis
+        rs = RandomState(1)
+        batch = []
+        for i in range(10):
+            for ID in ['a', 'b', 'c']:
+                coords = self.analyser.pos0 + rs.randn(2)
+                t = self.date + timedelta(seconds = .05 * (i+1))
+                batch.append(MeasurementSpec(ID, coords, t))
+        sequential = analyser.Analyser(self.q)
+        sequential.initialize_matrices()
+        for data in batch:
+            sequential.analyse_data(data)
+        # Group batch by sensor (keeps the order of each sensor)
+        self.analyser.analyse_batch(sorted(batch, key = lambda d: d.ID))
+        for ID in ['a', 'b', 'c']:
+            res = self.analyser.sensors[ID]
+            ref = sequential.sensors[ID]
+            assert len(res) == len(ref) == 10
+            for r, s in zip(res, ref):
+                assert allclose(r.pos, s.pos)
+                assert allclose(r.vel_err, s.vel_err)
+                assert isclose(r.dist, s.dist)
+                assert r.stationary == s.stationary
+                assert r.time == s.time
+            assert allclose(self.analyser.filter[ID].P, sequential.filter[ID].P)
+
+    def test_run_batches(self):
+        q = Queue()
+        batched = analyser.Analyser(q, wait = .1, batch_size = 4)
+        sequential = analyser.Analyser(q)
+        sequential.initialize_matrices()
+        rs = RandomState(1)
+        for i in range(10):
+            for ID in ['a', 'b']:
+                t = self.date + timedelta(seconds = .05 * (i+1))
+                data = MeasurementSpec(ID, 50 + rs.randn(2), t)
+                q.put(data)
+                sequential.analyse_data(data)
+        batched.start()
+        batched.join(5)
+        assert not batched.isAlive()
+        for ID in ['a', 'b']:
+            assert len(batched.sensors[ID]) == 10
+            assert allclose(batched.sensors[ID].column('pos'),
+                            sequential.sensors[ID].column('pos'))
+
+    def test_analyse_frame(self):
+        q = Queue()
+        framed = analyser.Analyser(q, wait = .1, backend = 'fast')
+        sequential = analyser.Analyser(q, backend = 'fast')
+        sequential.initialize_matrices()
+        rs = RandomState(1)
+        IDs = ('a', 'b', 'c')
+        for i in range(10):
+            t = self.date + timedelta(seconds = .05 * (i+1))
+            coords = 50 + rs.randn(3, 2)
+            q.put(FrameSpec(IDs, coords, t))
+            for ID, c in zip(IDs, coords):
+                sequential.analyse_data(MeasurementSpec(ID, c, t))
+        framed.start()
+        framed.join(5)
+        assert not framed.isAlive()
+        for ID in IDs:
+            assert len(framed.sensors[ID]) == 10
+            assert allclose(framed.sensors[ID].column('pos'),
+                            sequential.sensors[ID].column('pos'))
+            assert allclose(framed.sensors[ID].column('dist'),
+                            sequential.sensors[ID].column('dist'))
+            assert framed.data[ID].time == sequential.data[ID].time
+
+    def test_batch_frames(self):
+        # frames between measurements are analysed in order when batching
+        q = Queue()
+        batched = analyser.Analyser(q, wait = .1, backend = 'fast',
+                                    batch_size = 4)
+        sequential = analyser.Analyser(q, backend = 'fast')
+        sequential.initialize_matrices()
+        rs = RandomState(1)
+        for i in range(10):
+            t = self.date + timedelta(seconds = .05 * (i+1))
+            data = MeasurementSpec('a', 50 + rs.randn(2), t)
+            frame = FrameSpec(('a', 'b'), 50 + rs.randn(2, 2),
+                              t + timedelta(seconds = .01))
+            q.put(data)
+            q.put(frame)
+            sequential.analyse_data(data)
+            sequential.analyse_frame(frame)
+        batched.start()
+        batched.join(5)
+        assert not batched.isAlive()
+        assert len(batched.sensors['a']) == 20
+        assert len(batched.sensors['b']) == 10
+        for ID in ['a', 'b']:
+            assert allclose(batched.sensors[ID].column('pos'),
+                            sequential.sensors[ID].column('pos'))
+
+    def test_get_batch(self):
+        q = Queue()
+        batched = analyser.Analyser(q, batch_size = 3, batch_latency = .01)
+        for i in range(4):
+            q.put(i)
+        assert batched.get_batch(q.get()) == [0, 1, 2]
+        assert batched.get_batch(q.get()) == [3]
+
+    def test_maxlen(self):
+        bounded = analyser.Analyser(self.q, maxlen = 5)
+        bounded.initialize_matrices()
+        self.analyser.initialize_matrices()
+        for i in range(20):
+            t = self.date + timedelta(seconds = .05 * (i+1))
+            data = MeasurementSpec('test', zeros(2) + i, t)
+            self.analyser.analyse_data(data)
+            bounded.analyse_data(data)
+        assert len(self.analyser.sensors['test']) == 20
+        assert len(bounded.sensors['test']) == 5
+        for r, s in zip(self.analyser.sensors['test'][-5:],
+                        bounded.sensors['test']):
+            assert allclose(r.pos, s.pos)
+            assert r.time == s.time
+
+    def test_backend(self):
+        with pytest.raises(ValueError):
+            analyser.Analyser(self.q, backend = 'unknown')
+        fast = analyser.Analyser(self.q, backend = 'fast')
+        fast.initialize_matrices()
+        self.analyser.initialize_matrices()
+        rs = RandomState(1)
+        for i in range(20):
+            t = self.date + timedelta(seconds = .05 * (i+1))
+            data = MeasurementSpec('test', 50 + rs.randn(2), t)
+            self.analyser.analyse_data(data)
+            fast.analyse_data(data)
+        for r, s in zip(self.analyser.sensors['test'], fast.sensors['test']):
+            assert allclose(r.pos, s.pos)
+            assert allclose(r.vel, s.vel)
+            assert allclose(r.pos_err, s.pos_err)
+            assert isclose(r.dist, s.dist)
+        assert allclose(self.analyser.filter['test'].P, fast.filter['test'].P)
+
+    def test_cached_backend(self):
+        fast = analyser.Analyser(self.q, backend = 'fast')
+        cached = analyser.Analyser(self.q, backend = 'cached')
+        batched = analyser.Analyser(self.q, backend = 'cached')
+        rs = RandomState(1)
+        for i in range(200):
+            t = self.date + timedelta(seconds = .05 * (i+1))
+            batch = [MeasurementSpec(ID, 50 + rs.randn(2), t)
+                     for ID in ['a', 'b']]
+            for data in batch:
+                fast.analyse_data(data)
+                cached.analyse_data(data)
+            batched.analyse_batch(batch)
+        for ID in ['a', 'b']:
+            assert cached.filter.steady[cached.filter.ids[ID]] == 50
+            for store in [cached.sensors[ID], batched.sensors[ID]]:
+                assert allclose(store.column('pos'),
+                                fast.sensors[ID].column('pos'), atol = 2e-3)
+                assert isclose(store.last.dist, fast.sensors[ID].last.dist,
+                               rtol = 1e-3)
+
+    def test_outputs(self):
+        with pytest.raises(ValueError):
+            analyser.Analyser(self.q, outputs = ['unknown'])
+        full = analyser.Analyser(self.q, backend = 'fast')
+        lazy = analyser.Analyser(self.q, backend = 'fast',
+                                 outputs = ['pos', 'dist'])
+        batched = analyser.Analyser(self.q, backend = 'fast',
+                                    outputs = ['pos', 'dist'])
+        rs = RandomState(1)
+        for i in range(50):
+            t = self.date + timedelta(seconds = .05 * (i+1))
+            data = MeasurementSpec('test', 50 + .3 * rs.randn(2) + .1 * i, t)
+            full.analyse_data(data)
+            lazy.analyse_data(data)
+            batched.analyse_batch([data])
+            for other in [lazy, batched]:
+                r = full.sensors['test'].last
+                s = other.sensors['test'].last
+                assert isinstance(s, results.LazyResult)
+                for name in ['pos', 'pos_err', 'vel', 'vel_err']:
+                    assert allclose(getattr(r, name), getattr(s, name))
+                assert isclose(r.tot_vel, s.tot_vel)
+                assert isclose(r.dist, s.dist)
+                assert r.stationary == s.stationary
+                assert tuple(s)[-1] == t
+        # the stores keep the filter state and derive the other fields
+        store = lazy.sensors['test']
+        reference = full.sensors['test']
+        assert sorted(store.columns) == ['dist', 'state', 'stationary',
+                                         'time', 'var']
+        for name in ['pos', 'pos_err', 'vel', 'vel_err', 'tot_vel', 'dist']:
+            assert allclose(store.column(name), reference.column(name))
+        for r, s in zip(reference, store):
+            assert allclose(r.vel, s.vel)
+            assert isclose(r.tot_vel, s.tot_vel)
+            assert r.stationary == s.stationary
+        t = self.date + timedelta(seconds = 1.01)
+        assert allclose(store.at(t).pos_err, reference.at(t).pos_err)
+        full.stat_p = .5
+        assert isclose(full.stat_chi2, -2 * log(.5))
+
     def teardown(self):
         #tidy up
         print("tearing down " + __name__)
@@ -6,8 +6,9 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 
 import pytest
 from streamanalysis import athlete
-from numpy import sqrt, ones, allclose, isclose, zeros
-from datetime import datetime
+from numpy import (sqrt, ones, allclose, isclose, zeros, array, arange, all,
+                   errstate, isfinite)
+from datetime import datetime, timedelta
 
 class TestAthlete(object):
 
@@ -27,6 +28,43 @@ class TestAthlete(object):
         assert allclose(data.pos, self.athlete.pos0)
         assert allclose(data.vel, self.athlete.vel0)
 
+    def test_swarm(self):
+        swarm = athlete.AthleteSwarm(5, seed = 1)
+        times = arange(200) * .05
+        data = swarm.simulate(times)
+        assert data.pos.shape == data.vel.shape == (5, 200, 2)
+        assert allclose(data.pos[:, 0], 50)
+        assert all(data.pos >= 0) and all(data.pos <= 100)
+        assert all(sqrt((data.vel * data.vel).sum(axis = 2)) <= 9 + 1e-9)
+        # Reproducible from seed and continuable in chunks
+        swarm.reset()
+        first = swarm.simulate(times[:50])
+        second = swarm.simulate(times[50:])
+        assert allclose(first.pos, data.pos[:, :50])
+        assert allclose(second.pos, data.pos[:, 50:])
+        # without random acceleration nothing is divided by zero
+        with errstate(divide = 'raise', invalid = 'raise'):
+            still = athlete.AthleteSwarm(5, acc_freq = 0, seed = 1)
+            data = still.simulate(times)
+        assert isfinite(data.pos).all() and isfinite(data.vel).all()
+
+    def test_swarm_rules(self):
+        # Without random acceleration both implementations are deterministic
+        # and have to agree, including the reflection at the boundaries
+        pos0 = array([95., 50.])
+        vel0 = array([8., 1.])
+        single = athlete.Athlete(pos0 = pos0.copy(), vel0 = vel0.copy(),
+                                 acc_freq = 0, dec_a = 1.0)
+        swarm = athlete.AthleteSwarm(1, pos0 = pos0, vel0 = vel0,
+                                     acc_freq = 0, dec_a = 1.0)
+        time = datetime.now()
+        times = [time + timedelta(seconds = .05 * i) for i in range(100)]
+        data = swarm.simulate(times)
+        for i, t in enumerate(times):
+            a = single(t)
+            assert allclose(a.pos, data.pos[0, i])
+            assert allclose(a.vel, data.vel[0, i])
+
     def teardown(self):
         #tidy up
         print("tearing down " + __name__)
@@ -0,0 +1,62 @@
+"""
+Tests for `benchmark` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import benchmark
+
+class TestBenchmark(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+
+    def test_time_kalman_update(self):
+        for backend in ['matrix', 'fast']:
+            latency = benchmark.time_kalman_update(backend, n = 10, seed = 1)
+            assert latency > 0
+
+    def test_run_suite(self):
+        report = benchmark.run_suite(quick = True)
+        names = [r['name'] for r in report['results']]
+        assert len(names) == len(set(names))
+        assert 'kalman_update[backend=fast]' in names
+        assert 'athlete_step' in names
+        for r in report['results']:
+            assert r['value'] > 0
+            assert r['better'] in ['lower', 'higher']
+        # the memory grows with the length of the run unless it is bounded
+        memory = {}
+        for r in report['results']:
+            if r['name'].startswith('memory'):
+                memory.setdefault(r['params']['maxlen'], []).append(r['value'])
+        assert memory[None] == sorted(memory[None])
+        assert memory[None][-1] > 2 * memory[None][0]
+        assert memory[1000][-1] == memory[1000][0]
+        assert memory[1000][-1] < memory[None][-1]
+        assert benchmark.compare(report, report) == []
+
+    def test_pipeline_throughput(self):
+        rate = benchmark.measure_pipeline_throughput(sensors = 5,
+                                                     duration = 2.,
+                                                     backend = 'fast',
+                                                     seed = 1)
+        assert rate > 0
+
+    def test_compare(self):
+        baseline = {'results': [{'name': 'a', 'value': 1., 'better': 'lower'},
+                                {'name': 'b', 'value': 1., 'better': 'higher'}]}
+        current = {'results': [{'name': 'a', 'value': 2., 'better': 'lower'},
+                               {'name': 'b', 'value': 2., 'better': 'higher'},
+                               {'name': 'c', 'value': 2., 'better': 'higher'}]}
+        assert benchmark.compare(baseline, current) == [('a', 1., 2.)]
+        assert benchmark.compare(current, baseline) == [('b', 2., 1.)]
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,114 @@
+"""
+Tests for `checkpoint` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+import pytest
+from streamanalysis import checkpoint
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.aggregates import Aggregates
+from streamanalysis.spatial import SpatialHash
+from streamanalysis.replay import simulate_stream, replay
+from numpy import allclose, isclose
+from datetime import datetime
+from Queue import Queue
+
+class TestCheckpoint(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'checkpoint.npz')
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, 'sensor%i'%i, seed = i)
+                   for i in range(5)]
+        self.stream = list(simulate_stream(sensors, 20,
+                                           datetime(2016, 7, 12)))
+
+    def get_analyser(self, queue = None, **kwargs):
+        return Analyser(queue or Queue(), backend = 'cached',
+                        aggregates = Aggregates(windows = [5.0, 10.0]),
+                        **kwargs)
+
+    def test_restore(self):
+        full = self.get_analyser()
+        replay(full, self.stream)
+        # interrupt the analysis halfway and resume from the checkpoint
+        n = len(self.stream) // 2
+        first = self.get_analyser()
+        replay(first, self.stream[:n])
+        checkpoint.save(first, self.filename)
+        resumed = self.get_analyser(spatial = SpatialHash())
+        IDs = checkpoint.restore(resumed, self.filename)
+        assert sorted(IDs) == sorted(full.sensors)
+        for ID in IDs:
+            assert resumed.spatial.position(ID) == \
+                pytest.approx(first.sensors[ID].last.pos)
+        replay(resumed, self.stream[n:])
+        for ID in IDs:
+            res = resumed.sensors[ID]
+            ref = full.sensors[ID]
+            assert len(res) == len(ref) - len(first.sensors[ID])
+            assert allclose(res.column('pos'), ref.column('pos')[-len(res):])
+            assert isclose(res.last.dist, ref.last.dist)
+            assert res.last.time == ref.last.time
+            assert (resumed.filter.steady[resumed.filter.ids[ID]] ==
+                    full.filter.steady[full.filter.ids[ID]])
+            snapshot = resumed.aggregates[ID].snapshot()
+            expected = full.aggregates[ID].snapshot()
+            for key in ['duration', 'dist', 'max_vel', 'stationary_time']:
+                assert isclose(snapshot[key], expected[key])
+            assert snapshot['sprints'] == expected['sprints']
+            for w in [5.0, 10.0]:
+                assert isclose(snapshot['window_dist'][w],
+                               expected['window_dist'][w])
+                assert isclose(snapshot['window_max_vel'][w],
+                               expected['window_max_vel'][w])
+
+    def test_parameters(self):
+        analyser = self.get_analyser()
+        replay(analyser, self.stream[:100])
+        checkpoint.save(analyser, self.filename)
+        with pytest.raises(ValueError):
+            checkpoint.restore(Analyser(Queue(), noise = 1.0), self.filename)
+        with pytest.raises(ValueError):
+            checkpoint.restore(Analyser(Queue(), aggregates = Aggregates()),
+                               self.filename)
+        # aggregates are optional
+        assert len(checkpoint.restore(Analyser(Queue()), self.filename)) == 5
+
+    def test_checkpointer(self):
+        writer = checkpoint.Checkpointer(self.filename, interval = 0.0)
+        writer.start()
+        q = Queue()
+        analyser = self.get_analyser(q, wait = .1, checkpoint = writer)
+        for data in self.stream[:500]:
+            q.put(data)
+        analyser.start()
+        analyser.join(5)
+        writer.stop()
+        writer.join(5)
+        assert not writer.isAlive()
+        assert writer.count + writer.skipped == 501
+        assert writer.count > 1
+        # the final snapshot is always written
+        resumed = self.get_analyser()
+        checkpoint.restore(resumed, self.filename)
+        for ID in analyser.sensors:
+            assert allclose(resumed.sensors[ID].last.pos,
+                            analyser.sensors[ID].last.pos)
+        assert not os.path.exists(self.filename + '.tmp')
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        shutil.rmtree(self.path)
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,45 @@
+"""
+Tests for `clock` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import clock
+from datetime import datetime, timedelta
+from threading import Event
+
+class TestClock(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.start = datetime(2016, 7, 12)
+
+    def test_simulated_clock(self):
+        event = Event()
+        sim = clock.SimulatedClock(self.start,
+                                   self.start + timedelta(seconds = 1))
+        assert sim.now() == self.start
+        sim.wait(event, .5)
+        assert sim.now() == self.start + timedelta(seconds = .5)
+        assert not event.isSet()
+        sim.wait(event, -.1)
+        assert sim.now() == self.start + timedelta(seconds = .5)
+        sim.wait(event, .5)
+        assert event.isSet()
+
+    def test_wall_clock(self):
+        event = Event()
+        event.set()
+        wall = clock.WallClock()
+        start = wall.now()
+        wall.wait(event, 10)
+        assert (wall.now() - start).total_seconds() < 1
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,82 @@
+"""
+Tests for `compression` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import compression
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.replay import simulate_stream, replay
+from numpy import sqrt, abs
+from datetime import datetime
+from Queue import Queue
+
+class TestDeadband(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, i, seed = i)
+                   for i in range(3)]
+        self.stream = list(simulate_stream(sensors, 60,
+                                           datetime(2016, 7, 12)))
+
+    def test_analyser(self):
+        full = Analyser(Queue(), backend = 'fast')
+        replay(full, self.stream)
+        deadband = compression.Deadband()
+        compressed = Analyser(Queue(), backend = 'fast',
+                              deadband = deadband)
+        replay(compressed, self.stream)
+        assert deadband.seen == len(self.stream)
+        assert deadband.ratio > 3
+        assert deadband.kept == sum(len(compressed.sensors[ID])
+                                    for ID in range(3))
+        for ID in range(3):
+            reference = full.sensors[ID]
+            store = compressed.sensors[ID]
+            times = reference.column('time')
+            kept = store.column('time')
+            # latest result is kept and at most max_interval between results
+            assert kept[-1] == times[-1]
+            assert (kept[1:] - kept[:-1] <= 1.0 + 1e-9).all()
+            # processing continues from the dropped results
+            assert store.last.dist == reference.last.dist
+            # reconstruction by interpolation
+            res = store.interpolate(times)
+            error = sqrt(((res.pos - reference.column('pos'))**2).sum(axis = 1))
+            assert error.max() < .5
+            assert error.mean() < .1
+            assert abs(res.dist - reference.column('dist')).max() < .5
+
+    def test_accept(self):
+        deadband = compression.Deadband(pos_tol = .1, vel_tol = .2,
+                                        max_interval = 1.0)
+        class Result(object):
+            def __init__(self, pos, vel, stationary, time):
+                self.pos = pos
+                self.vel = vel
+                self.stationary = stationary
+                self.time = time
+        # moving with constant velocity is extrapolated
+        assert deadband.accept('a', Result([0., 0.], [1., 0.], False, 0.))
+        assert not deadband.accept('a', Result([.5, .05], [1., 0.], False, .5))
+        assert deadband.accept('a', Result([.7, 0.], [1., 0.], False, .9))
+        assert deadband.accept('a', Result([.8, 0.], [1., 0.], True, 1.))
+        assert not deadband.accept('a', Result([.8, 0.], [.9, .1], True, 1.5))
+        assert deadband.accept('a', Result([.8, 0.], [.9, .1], True, 2.))
+        assert deadband.flush() == []
+        assert not deadband.accept('a', Result([.8, 0.], [.9, .1], True, 2.1))
+        assert deadband.flush() == ['a']
+        assert deadband.ratio == 7 / 5
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,112 @@
+"""
+Tests for `filterbank` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import filterbank
+from streamanalysis.analyser import Analyser
+from numpy import allclose, array, zeros
+from numpy.random.mtrand import RandomState
+from Queue import Queue
+
+class TestFilterBank(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.bank = filterbank.FilterBank(capacity = 2)
+        self.analyser = Analyser(Queue())
+        self.analyser.initialize_matrices()
+
+    def test_add(self):
+        IDs = ['a', 'b', 'c', 'd', 'e']
+        rows = [self.bank.index(ID) for ID in IDs]
+        assert rows == list(range(5))
+        assert len(self.bank) == 5
+        assert list(self.bank) == IDs
+        assert self.bank.index('c') == 2
+        assert allclose(self.bank['e'].X.A[:,0], [50, 0, 50, 0])
+        assert allclose(self.bank['e'].P, zeros((4,4)))
+        assert 'f' not in self.bank
+
+    def test_view(self):
+        self.bank.index('a')
+        Filter = self.bank['a']
+        Filter.X[0, 0] = 10.0
+        assert self.bank.X[0, 0] == 10.0
+        self.bank['b'] = filterbank.FilterSpec(X = array([1., 2., 3., 4.]),
+                                               P = zeros((4,4)) + 1)
+        assert allclose(self.bank.X[1], [1, 2, 3, 4])
+        assert allclose(self.bank['b'].P, 1)
+
+    def test_update(self):
+        rs = RandomState(1)
+        IDs = ['a', 'b', 'c']
+        rows = [self.bank.index(ID) for ID in IDs]
+        for i in range(5):
+            coords = 50 + rs.randn(3, 2)
+            dt = .05 + .01 * rs.rand(3)
+            ref = []
+            for ID, c, t in zip(IDs, coords, dt):
+                ref.append(self.analyser.kalman_filter(c, t, self.bank[ID]))
+            self.bank.update(rows, coords, dt)
+            for ID, r in zip(IDs, ref):
+                assert allclose(self.bank[ID].X, r.X)
+                assert allclose(self.bank[ID].P, r.P)
+
+    def test_update_decoupled(self):
+        rs = RandomState(1)
+        IDs = ['a', 'b', 'c']
+        rows = [self.bank.index(ID) for ID in IDs]
+        ref = filterbank.FilterBank()
+        [ref.index(ID) for ID in IDs]
+        for i in range(5):
+            coords = 50 + rs.randn(3, 2)
+            dt = .05 + .1 * rs.rand(3)
+            ref.update(rows, coords, dt)
+            if i % 2:
+                self.bank.update_decoupled(rows, coords, dt)
+            else:
+                for row, c, t in zip(rows, coords, dt):
+                    self.bank.update_one(row, c, t)
+            assert allclose(self.bank.X[:3], ref.X[:3])
+            assert allclose(self.bank.P[:3], ref.P[:3])
+
+    def test_update_cached(self):
+        rs = RandomState(1)
+        ref = filterbank.FilterBank()
+        i = self.bank.index('a')
+        ref.index('a')
+        rows = [self.bank.index(ID) for ID in ['b', 'c']]
+        for k in range(300):
+            # irregular gap in the middle of the session
+            dt = .5 if k == 150 else .05 + 1e-5 * rs.rand()
+            coords = 50 + rs.randn(2)
+            ref.update_one(i, coords, dt)
+            self.bank.update_cached(i, coords, dt)
+            self.bank.update_cached_batch(rows, [coords, coords], [dt, dt])
+            if k == 150:
+                assert self.bank.steady[i] == -1
+            assert allclose(self.bank.X[i], ref.X[i], atol = 2e-3)
+            assert allclose(self.bank.X[rows], self.bank.X[i])
+        assert self.bank.steady[i] == 50
+        assert list(self.bank.steady[rows]) == [50, 50]
+        gain = self.bank.gains.get(.05)[1]
+        assert allclose(ref.P[i, 0, :2], [gain.pp, gain.pv], rtol = 1e-3)
+
+    def test_gain_cache(self):
+        cache = filterbank.GainCache(.09, 16., size = 2)
+        for dt in [.05, .1, .05, .2]:
+            cache.get(dt)
+        assert list(cache.entries) == [50, 200]
+        assert cache.quantize(.0504) == 50
+        assert list(cache.quantize([.0496, .1])) == [50, 100]
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for `heatmap` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import heatmap
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.results import ResultSpec
+from streamanalysis.replay import simulate_stream, replay
+from numpy import allclose, isclose, histogram2d, diff, clip, zeros, array
+from datetime import datetime
+from threading import Thread
+from Queue import Queue
+
+class TestHeatmaps(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, i, seed = i)
+                   for i in range(6)]
+        self.stream = list(simulate_stream(sensors, 20,
+                                           datetime(2016, 7, 12)))
+        self.groups = {'home': [0, 1, 2], 'away': [3, 4, 5, 6],
+                       'goalkeepers': [0, 3]}
+
+    def get_expected(self, store, maps):
+        # time until the next result at the position of every result
+        pos = clip(store.column('pos'), 0, 99.99)
+        weights = diff(store.column('time'))
+        return histogram2d(pos[:-1, 0], pos[:-1, 1], bins = maps.edges,
+                           weights = weights)[0]
+
+    def test_analyser(self):
+        maps = heatmap.Heatmaps(cell = 2.0, groups = self.groups,
+                                capacity = 2, batch_size = 100)
+        analyser = Analyser(Queue(), backend = 'fast', heatmaps = maps)
+        replay(analyser, self.stream)
+        assert len(maps) == 6
+        assert maps.shape == (50, 50)
+        expected = {}
+        for ID in range(6):
+            store = analyser.sensors[ID]
+            expected[ID] = self.get_expected(store, maps)
+            result = maps.heatmap(ID)
+            assert allclose(result, expected[ID])
+            assert isclose(result.sum(),
+                           store.column('time')[-1] - store.column('time')[0])
+            assert isclose(maps.heatmap(ID, normed = True).sum(), 1)
+        for name, IDs in self.groups.items():
+            assert allclose(maps.group(name),
+                            sum(expected[ID] for ID in IDs if ID < 6))
+        assert allclose(maps.total(), sum(expected.values()))
+        # the heatmaps are copies
+        maps.heatmap(0)[:] = 0
+        assert allclose(maps.heatmap(0), expected[0])
+
+    def test_batches(self):
+        batched = heatmap.Heatmaps(groups = self.groups, batch_size = 1000)
+        single = heatmap.Heatmaps(groups = self.groups, batch_size = 1)
+        analyser = Analyser(Queue(), backend = 'fast')
+        replay(analyser, self.stream)
+        for ID in range(6):
+            for res in analyser.sensors[ID]:
+                batched.add(ID, res)
+                single.add(ID, res)
+        assert len(single.pending) == 0
+        assert len(batched.pending) > 0
+        for name in self.groups:
+            assert allclose(batched.group(name), single.group(name))
+        assert len(batched.pending) == 0
+
+    def test_threads(self):
+        # read the heatmaps while another thread updates them
+        maps = heatmap.Heatmaps(groups = {'all': range(10)}, batch_size = 64)
+        def write():
+            for t in range(10000):
+                for ID in range(10):
+                    maps.add(ID, ResultSpec(array([t % 100, ID * 10.]), None,
+                                            None, None, 0.0, 0.0, False,
+                                            float(t)))
+        writer = Thread(target = write)
+        writer.start()
+        totals = []
+        while writer.isAlive():
+            totals.append(maps.total().sum())
+            assert totals[-1] <= maps.group('all').sum()
+        writer.join()
+        assert totals == sorted(totals)
+        assert maps.total().sum() == 9999 * 10
+        assert maps.group('all').sum() == 9999 * 10
+
+    def test_limits(self):
+        maps = heatmap.Heatmaps(limits = [10, 5], cell = 2.0)
+        assert maps.shape == (5, 3)
+        positions = [(-5, 20), (9.9, 0.1), (3, 3), (3, 3)]
+        for t, pos in zip([0.0, 1.5, 2.0, 4.0], positions):
+            maps.add('x', ResultSpec(array(pos), None, None, None, 0.0, 0.0,
+                                     False, t))
+        # positions outside of the field are assigned to the border cells
+        expected = zeros((5, 3))
+        expected[0, 2] = 1.5
+        expected[4, 0] = 0.5
+        expected[1, 1] = 2.0
+        assert allclose(maps.heatmap('x'), expected)
+        assert allclose(maps.total(normed = True), expected / 4)
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,172 @@
+"""
+Tests for `network` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import time
+import socket
+import struct
+import pytest
+from streamanalysis import network
+from streamanalysis.analyser import Analyser
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.replay import simulate_stream, replay
+from streamanalysis.wire import SensorIndex, MEASUREMENT_DTYPE, encode
+from numpy import allclose, zeros
+from numpy.random.mtrand import RandomState
+from datetime import datetime
+from Queue import Queue
+
+class TestNetwork(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.index = SensorIndex(range(4))
+        self.start = datetime(2016, 7, 12)
+
+    def serve(self, protocol, n, **kwargs):
+        analyser = Analyser(Queue(), backend = 'fast')
+        server = network.IngestServer(analyser, self.index,
+                                      protocol = protocol)
+        server.start()
+        try:
+            sent = network.generate_load(server.address, sensors = 4,
+                                         duration = 5., protocol = protocol,
+                                         seed = 1, start = self.start,
+                                         **kwargs)
+            assert sent.count == n
+            deadline = time.time() + 10
+            while server.count < n and time.time() < deadline:
+                time.sleep(.01)
+        finally:
+            server.stop()
+            server.join()
+        return server, analyser
+
+    def reference(self):
+        analyser = Analyser(Queue(), backend = 'fast')
+        rs = RandomState(1)
+        sensors = []
+        for ID in range(4):
+            athlete = Athlete(seed = rs.randint(2**31))
+            sensors.append(Sensor(athlete, Queue(), ID,
+                                  seed = rs.randint(2**31)))
+        replay(analyser, simulate_stream(sensors, 5., self.start))
+        return analyser
+
+    def test_tcp(self):
+        server, analyser = self.serve('tcp', 400, batch_size = 64)
+        assert server.count == 400
+        assert server.messages == 7
+        assert server.bytes == 400 * 28
+        reference = self.reference()
+        for ID in range(4):
+            assert allclose(analyser.sensors[ID].column('pos'),
+                            reference.sensors[ID].column('pos'))
+
+    def test_udp(self):
+        server, analyser = self.serve('udp', 400, batch_size = 50,
+                                      max_rate = 1e5)
+        assert server.count == 400
+        assert server.messages == 8
+        assert sum(len(analyser.sensors[ID]) for ID in range(4)) == 400
+
+    def wait(self, server, rejected, count):
+        deadline = time.time() + 5
+        while (server.rejected < rejected or server.count < count) and \
+              time.time() < deadline:
+            time.sleep(.01)
+
+    def test_invalid(self):
+        records = zeros(3, dtype = MEASUREMENT_DTYPE)
+        records['idx'] = [0, 1, 2]
+        invalid = records.copy()
+        invalid['idx'][1] = 4
+        # UDP: truncated datagram and unknown sensor index are rejected
+        server = network.IngestServer(Analyser(Queue(), backend = 'fast'),
+                                      self.index)
+        server.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(encode(records)[:-1], server.address)
+            sock.sendto(encode(invalid), server.address)
+            sock.sendto(encode(records), server.address)
+            self.wait(server, 2, 3)
+            # too long datagram which would be truncated to a valid batch
+            sock.sendto(encode(zeros(network.MAX_BATCH + 1,
+                                     dtype = MEASUREMENT_DTYPE)),
+                        server.address)
+            self.wait(server, 3, 3)
+        finally:
+            sock.close()
+            server.stop()
+            server.join()
+        assert server.rejected == 3
+        assert server.count == 3
+        # TCP: a frame with unknown sensor index is skipped, a bogus length
+        # closes only the offending connection
+        server = network.IngestServer(Analyser(Queue(), backend = 'fast'),
+                                      self.index, protocol = 'tcp')
+        server.start()
+        good = socket.create_connection(server.address)
+        bad = [socket.create_connection(server.address) for i in range(2)]
+        try:
+            buf = encode(invalid)
+            good.sendall(network.HEADER.pack(len(buf)) + buf)
+            bad[0].sendall(network.HEADER.pack(2**31) + b'x' * 100)
+            bad[1].sendall(network.HEADER.pack(27) + b'x' * 27)
+            self.wait(server, 3, 0)
+            for sock in bad:
+                assert sock.recv(10) == b''
+            buf = encode(records)
+            good.sendall(network.HEADER.pack(len(buf)) + buf)
+            self.wait(server, 3, 3)
+        finally:
+            for sock in [good] + bad:
+                sock.close()
+            server.stop()
+            server.join()
+        assert server.rejected == 3
+        assert server.count == 3
+
+    def test_reset(self):
+        records = zeros(3, dtype = MEASUREMENT_DTYPE)
+        records['idx'] = [0, 1, 2]
+        buf = network.HEADER.pack(3 * 28) + encode(records)
+        server = network.IngestServer(Analyser(Queue(), backend = 'fast'),
+                                      self.index, protocol = 'tcp')
+        server.start()
+        good = socket.create_connection(server.address)
+        reset = socket.create_connection(server.address)
+        try:
+            good.sendall(buf)
+            self.wait(server, 0, 3)
+            # close with RST instead of FIN
+            reset.sendall(buf[:10])
+            reset.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                             struct.pack('ii', 1, 0))
+            reset.close()
+            time.sleep(.2)
+            good.sendall(buf)
+            self.wait(server, 0, 6)
+            assert server.is_alive()
+        finally:
+            good.close()
+            server.stop()
+            server.join()
+        assert server.count == 6
+        assert server.rejected == 0
+
+    def test_protocol(self):
+        with pytest.raises(ValueError):
+            network.IngestServer(None, self.index, protocol = 'unknown')
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,93 @@
+"""
+Tests for `pool` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+import pickle
+from streamanalysis import pool
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.replay import simulate_stream, replay
+from streamanalysis.compression import Deadband
+from numpy import allclose
+from datetime import datetime
+from Queue import Queue
+
+class TestAnalyserPool(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, str(i), seed = i)
+                   for i in range(8)]
+        self.stream = list(simulate_stream(sensors, 5, datetime(2016, 7, 12)))
+
+    def test_partition(self):
+        assert pool.partition('a', 4) == pool.partition('a', 4)
+        assert set(pool.partition(str(i), 4) for i in range(100)) == \
+            set(range(4))
+
+    def test_pool(self):
+        analyser = Analyser(Queue())
+        replay(analyser, self.stream)
+        analyser_pool = pool.AnalyserPool(processes = 3, batch_size = 50,
+                                          backend = 'fast')
+        analyser_pool.start()
+        analyser_pool.put_batch(self.stream[:300])
+        sensors = analyser_pool.collect()
+        assert sum(len(s) for s in sensors.values()) == 300
+        # only new results are appended
+        assert analyser_pool.collect() is sensors
+        assert sum(len(s) for s in sensors.values()) == 300
+        analyser_pool.put_batch(self.stream[300:])
+        sensors = analyser_pool.stop()
+        assert sorted(sensors) == sorted(analyser.sensors)
+        for ID in sensors:
+            assert len(sensors[ID]) == 100
+            assert sensors[ID].count == 100
+            assert sensors[ID][-1].time == analyser.sensors[ID][-1].time
+            assert sensors[ID].last.time == analyser.sensors[ID].last.time
+            assert allclose(sensors[ID].column('pos'),
+                            analyser.sensors[ID].column('pos'))
+
+    def test_deadband(self):
+        # the results dropped at the end of the stream are stored on stop
+        analyser = Analyser(Queue(), backend = 'fast', deadband = Deadband())
+        replay(analyser, self.stream)
+        analyser_pool = pool.AnalyserPool(processes = 2, backend = 'fast',
+                                          deadband = Deadband())
+        analyser_pool.start()
+        analyser_pool.put_batch(self.stream)
+        sensors = analyser_pool.stop()
+        for ID in sensors:
+            assert sensors[ID][-1].time == self.stream[-1].time
+            assert len(sensors[ID]) == len(analyser.sensors[ID])
+
+    def test_dead_worker(self):
+        analyser_pool = pool.AnalyserPool(processes = 2, backend = 'fast')
+        analyser_pool.start()
+        analyser_pool.put_batch(self.stream)
+        analyser_pool.workers[1].terminate()
+        analyser_pool.workers[1].join()
+        with pytest.raises(RuntimeError):
+            analyser_pool.collect()
+        analyser_pool.workers[0].terminate()
+
+    def test_pickle_results(self):
+        analyser = Analyser(Queue())
+        replay(analyser, self.stream[:20])
+        store = pickle.loads(pickle.dumps(analyser.sensors['0']))
+        assert store.last.time == analyser.sensors['0'].last.time
+        assert allclose(store.column('pos'),
+                        analyser.sensors['0'].column('pos'))
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
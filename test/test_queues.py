@@ -0,0 +1,168 @@
+"""
+Tests for `queues` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import queues
+from streamanalysis.sensor import MeasurementSpec, FrameSpec
+from streamanalysis.analyser import Analyser
+from numpy import allclose, isfinite, zeros
+from datetime import datetime, timedelta
+from Queue import Queue, Full
+from threading import Thread
+
+class TestSheddingQueue(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.start = datetime(2016, 7, 12)
+        self.stream = []
+        for i in range(100):
+            for ID in ['a', 'b', 'c']:
+                t = self.start + timedelta(seconds = .05 * i)
+                self.stream.append(MeasurementSpec(ID, zeros(2) + i, t))
+
+    def drain(self, q):
+        items = []
+        while not q.empty():
+            items.append(q.get_nowait())
+        return items
+
+    def test_block(self):
+        q = queues.SheddingQueue(2)
+        q.put(self.stream[0])
+        q.put(self.stream[1])
+        with pytest.raises(Full):
+            q.put(self.stream[2], timeout = .01)
+        assert q.qsize() == 2
+
+    def test_drop_newest(self):
+        q = queues.SheddingQueue(10, 'drop_newest')
+        for data in self.stream:
+            q.put(data)
+        assert q.dropped == 290
+        assert self.drain(q) == self.stream[:10]
+
+    def test_drop_oldest(self):
+        q = queues.SheddingQueue(10, 'drop_oldest')
+        for data in self.stream[:12]:
+            q.put(data)
+        q.put(MeasurementSpec('d', zeros(2), self.start))
+        assert q.qsize() == 10
+        assert q.dropped == 3
+        assert q.shed == {'a': 1, 'b': 1, 'c': 1}
+        items = self.drain(q)
+        assert items[:-1] == self.stream[3:12]
+        assert items[-1].ID == 'd'
+        for data in self.stream:
+            q.put(data)
+        items = self.drain(q)
+        assert len(items) == 10
+        # every sensor keeps its latest measurements
+        for ID in ['a', 'b', 'c']:
+            kept = [data for data in items if data.ID == ID]
+            stream = [data for data in self.stream if data.ID == ID]
+            assert len(kept) >= 3
+            assert kept == stream[-len(kept):]
+        assert q.size == 0 and q.pending == {}
+        # the only measurement of a sensor is replaced by its newer ones
+        q = queues.SheddingQueue(2, 'drop_oldest')
+        a, b = self.stream[0], self.stream[1]
+        newer = [data for data in self.stream if data.ID == 'a'][1:3]
+        for data in [a, b] + newer:
+            q.put(data)
+        assert self.drain(q) == [b, newer[1]]
+
+    def test_coalesce(self):
+        q = queues.SheddingQueue(2, 'coalesce')
+        for data in self.stream:
+            if data.ID != 'c':
+                q.put(data)
+        assert q.qsize() == 2
+        assert q.coalesced == 198
+        assert q.dropped == 0
+        # Queue is full with other sensors
+        q.put(self.stream[-1])
+        assert q.dropped == 1
+        items = self.drain(q)
+        assert [data.ID for data in items] == ['b', 'c']
+        assert allclose(items[0].coords, 99)
+        assert items[1] is self.stream[-1]
+
+    def test_join(self):
+        # shed measurements are never passed to task_done
+        for policy in queues.POLICIES[1:]:
+            q = queues.SheddingQueue(10, policy)
+            for data in self.stream[:12]:
+                q.put(data)
+            q.put(MeasurementSpec('d', zeros(2), self.start))
+            assert q.unfinished_tasks == q.qsize()
+            for data in self.drain(q):
+                q.task_done()
+            waiter = Thread(target = q.join)
+            waiter.daemon = True
+            waiter.start()
+            waiter.join(1)
+            assert not waiter.isAlive()
+
+    def test_overload(self):
+        # with a slow consumer, which takes a measurement every fifth tick,
+        # the age of the consumed measurements grows with an unbounded queue
+        # and stays bounded when shedding; the time is counted in ticks
+        ages = {}
+        for name, q in [('unbounded', Queue()),
+                        ('drop_oldest', queues.SheddingQueue(5, 'drop_oldest')),
+                        ('coalesce', queues.SheddingQueue(5, 'coalesce'))]:
+            ages[name] = []
+            for tick in range(400):
+                q.put(MeasurementSpec(tick % 3, zeros(2), tick))
+                if tick % 5 == 4:
+                    data = q.get_nowait()
+                    ages[name].append(tick - data.time)
+        assert max(ages['unbounded']) > 300
+        for name in ['drop_oldest', 'coalesce']:
+            assert max(ages[name]) < 10
+
+    def test_frames(self):
+        # frames are only shed for frames of the same group
+        home = [FrameSpec(('a', 'b'), zeros((2, 2)) + i, i) for i in range(3)]
+        away = [FrameSpec(('c', 'd'), zeros((2, 2)) + i, i) for i in range(3)]
+        q = queues.SheddingQueue(10, 'coalesce')
+        for frames in zip(home, away):
+            for frame in frames:
+                q.put(frame)
+        assert q.coalesced == 4
+        assert q.shed == {('frame', ('a', 'b')): 2, ('frame', ('c', 'd')): 2}
+        assert self.drain(q) == [home[2], away[2]]
+        q = queues.SheddingQueue(3, 'drop_oldest')
+        for frame in home[:1] + away:
+            q.put(frame)
+        assert q.shed == {('frame', ('c', 'd')): 1}
+        assert self.drain(q) == home[:1] + away[1:]
+
+    def test_analyse_gaps(self):
+        # Coalesced measurements have larger time increments, which the
+        # Kalman Filter has to take into account
+        q = queues.SheddingQueue(3, 'coalesce')
+        analyser = Analyser(q, wait = .01)
+        analyser.initialize_matrices()
+        for i, data in enumerate(self.stream):
+            q.put(data)
+            if i % 30 == 29:
+                analyser.analyse_batch(self.drain(q))
+        for ID in ['a', 'b', 'c']:
+            res = analyser.sensors[ID]
+            assert len(res) == 10
+            assert isfinite(res.column('pos_err')).all()
+            # athlete moves with 20 m/s
+            assert allclose(res[-1].vel, 20, rtol = .1)
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,81 @@
+"""
+Tests for `replay` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import replay
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor, MeasurementSpec, FrameSpec
+from streamanalysis.analyser import Analyser
+from numpy import allclose, array
+from datetime import datetime, timedelta
+from Queue import Queue
+
+class TestReplay(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.start = datetime(2016, 7, 12)
+
+    def get_stream(self):
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, str(i), rate = 10 * (i+1),
+                          seed = i) for i in range(3)]
+        return list(replay.simulate_stream(sensors, 10, self.start))
+
+    def test_simulate_stream(self):
+        stream = self.get_stream()
+        assert len(stream) == 100 + 200 + 300
+        times = [data.time for data in stream]
+        assert times == sorted(times)
+        assert times[0] == self.start
+        assert times[-1] < self.start + timedelta(seconds = 10)
+        assert len([data for data in stream if data.ID == '2']) == 300
+
+    def test_replay(self):
+        stream = self.get_stream()
+        analyser = Analyser(Queue())
+        res = replay.replay(analyser, stream)
+        assert res.count == len(stream)
+        assert res.rate > 0
+        batched = Analyser(Queue())
+        res = replay.replay(batched, stream, batch_size = 64)
+        assert res.count == len(stream)
+        for ID in ['0', '1', '2']:
+            assert len(batched.sensors[ID]) == len(analyser.sensors[ID])
+            assert allclose(batched.sensors[ID].column('pos'),
+                            analyser.sensors[ID].column('pos'))
+            assert allclose(batched.sensors[ID].column('dist'),
+                            analyser.sensors[ID].column('dist'))
+
+    def test_replay_frames(self):
+        IDs = ('a', 'b')
+        stream = []
+        for i in range(10):
+            t = self.start + timedelta(seconds = .05 * (i+1))
+            stream.append(MeasurementSpec('a', array([50.0 + i, 50.0]), t))
+            stream.append(FrameSpec(IDs, array([[50.0 + i, 51.0],
+                                                [40.0, 40.0 + i]]),
+                                    t + timedelta(seconds = .01)))
+        single = Analyser(Queue(), backend = 'fast')
+        res = replay.replay(single, stream)
+        assert res.count == 30
+        batched = Analyser(Queue(), backend = 'fast')
+        res = replay.replay(batched, stream, batch_size = 4)
+        assert res.count == 30
+        assert len(single.sensors['a']) == 20
+        assert len(single.sensors['b']) == 10
+        for ID in IDs:
+            assert allclose(batched.sensors[ID].column('pos'),
+                            single.sensors[ID].column('pos'))
+        assert single.data['b'].time == stream[-1].time
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,164 @@
+"""
+Tests for `results` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import results
+from numpy import allclose, array, arange, ones, isnan, where, hypot
+from datetime import datetime, timedelta
+from streamanalysis.utils import to_timestamp
+
+class TestResultStore(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.date = datetime(2016, 7, 12, 12)
+        self.results = []
+        for i in range(10):
+            self.results.append(results.ResultSpec(
+                pos = ones(2) * i, pos_err = ones(2), vel = ones(2) * -i,
+                vel_err = ones(2), tot_vel = float(i), dist = 2. * i,
+                stationary = i % 2 == 0,
+                time = self.date + timedelta(microseconds = 50001 * i)))
+
+    def test_append(self):
+        store = results.ResultStore(capacity = 3)
+        for r in self.results:
+            store.append(r)
+        assert len(store) == 10
+        assert store.capacity == 12
+        assert store.last is self.results[-1]
+        for r, s in zip(self.results, store):
+            assert allclose(r.pos, s.pos)
+            assert allclose(r.vel, s.vel)
+            assert r.dist == s.dist
+            assert r.stationary == s.stationary
+            assert r.time == s.time
+        assert store[-1].time == self.results[-1].time
+        assert [s.dist for s in store[2:4]] == [4., 6.]
+        assert allclose(store.column('dist'), 2 * arange(10))
+        with pytest.raises(IndexError):
+            store[10]
+
+    def test_fields(self):
+        # restricted stores derive the fields from the filter state
+        store = results.ResultStore(capacity = 3, maxlen = 8,
+                                    fields = ['dist'])
+        full = results.ResultStore(capacity = 3, maxlen = 8)
+        for r in self.results:
+            store.append(r)
+            full.append(r)
+        lazy = results.LazyResult([1., 2., 3., 4.], [4., 1., 9., 16.], 5.,
+                                  False, self.date + timedelta(seconds = 1))
+        store.append(lazy)
+        full.append(results.ResultSpec(*lazy))
+        assert sorted(store.columns) == ['dist', 'state', 'stationary',
+                                         'time', 'var']
+        fields = [name for name in results.ResultSpec._fields
+                  if name != 'tot_vel']
+        for name in fields:
+            assert allclose(store.column(name), full.column(name))
+        # the total velocity follows from the velocities
+        vel = full.column('vel')
+        assert allclose(store.column('tot_vel'),
+                        where(full.column('stationary'), 0.,
+                              hypot(vel[:, 0], vel[:, 1])))
+        for r, s in zip(full, store):
+            for name in ['pos', 'pos_err', 'vel', 'vel_err']:
+                assert allclose(getattr(r, name), getattr(s, name))
+            assert (r.dist, r.stationary, r.time) == \
+                   (s.dist, s.stationary, s.time)
+        assert store[-1].tot_vel == full[-1].tot_vel
+        t = to_timestamp(self.date) + arange(.3, .5, .03)
+        a = full.interpolate(t)
+        b = store.interpolate(t)
+        for name in fields:
+            assert allclose(getattr(a, name), getattr(b, name),
+                            equal_nan = True)
+        assert allclose(store.tail(3).column('vel'), full.column('vel')[-3:])
+        assert results.ResultStore(fields = ['pos']).between().dist is None
+
+    def test_maxlen(self):
+        store = results.ResultStore(capacity = 2, maxlen = 4)
+        for r in self.results:
+            store.append(r)
+        assert len(store) == 4
+        assert store.capacity == 4
+        assert store.count == 10
+        assert [s.tot_vel for s in store] == [6., 7., 8., 9.]
+        assert store[0].time == self.results[6].time
+        assert allclose(store.column('pos')[:,0], [6, 7, 8, 9])
+
+    def test_extend(self):
+        # transfer the results in parts as AnalyserPool.collect
+        for maxlen in [None, 4]:
+            store = results.ResultStore(capacity = 2, maxlen = maxlen)
+            merged = results.ResultStore(capacity = 1, maxlen = maxlen)
+            sent = 0
+            for i, r in enumerate(self.results):
+                store.append(r)
+                if i in [0, 2, 7, 9]:
+                    part = store.tail(store.count - sent)
+                    sent = store.count
+                    merged.extend(part)
+            assert len(merged) == len(store)
+            assert merged.count == 10
+            assert merged.last is self.results[-1]
+            assert merged[0].time == store[0].time
+            for name in ['pos', 'dist', 'stationary', 'time']:
+                assert allclose(merged.column(name), store.column(name))
+        part = store.tail(2)
+        assert len(part) == 2 and part[0].dist == 16.
+
+    def test_time_index(self):
+        store = results.ResultStore(capacity = 3)
+        bounded = results.ResultStore(capacity = 3, maxlen = 7)
+        for r in self.results:
+            store.append(r)
+            bounded.append(r)
+        assert bounded.start + bounded.size > bounded.capacity
+        times = [to_timestamp(r.time) for r in self.results]
+        for s, offset in [(store, 0), (bounded, 3)]:
+            assert s.search(times[5]) == 5 - offset
+            assert s.search(times[5], 'right') == 6 - offset
+            assert list(s.search(times[4:6])) == [4 - offset, 5 - offset]
+            res = s.between(self.results[4].time, times[7])
+            assert allclose(res.dist, [8, 10, 12, 14])
+            assert allclose(res.time, times[4:8])
+            # interpolation half-way between results 5 and 6
+            state = s.at((times[5] + times[6]) / 2)
+            assert allclose(state.pos, [5.5, 5.5])
+            assert allclose(state.dist, 11.)
+            assert state.stationary == False
+            assert s.at(self.results[9].time).dist == 18.
+            with pytest.raises(IndexError):
+                s.at(times[9] + 1)
+        assert len(store.between(times[9] + 1).dist) == 0
+        res = bounded.interpolate([times[0], times[3], times[9], times[9] + 1])
+        assert isnan(res.dist[[0, 3]]).all()
+        assert allclose(res.dist[1:3], [6, 18])
+
+    def test_resample(self):
+        store = results.ResultStore()
+        other = results.ResultStore()
+        for r in self.results:
+            store.append(r)
+        for r in self.results[5:]:
+            other.append(r)
+        grid = [r.time for r in self.results]
+        IDs, res = results.resample({'a': store, 'b': other}, grid)
+        assert IDs == ['a', 'b']
+        assert res.pos.shape == (2, 10, 2)
+        assert allclose(res.dist[0], 2 * arange(10))
+        assert isnan(res.dist[1, :5]).all()
+        assert allclose(res.dist[1, 5:], 2 * arange(5, 10))
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
@@ -6,9 +6,10 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 
 import pytest
 from streamanalysis import sensor
-from streamanalysis.athlete import AthleteSpec
-from numpy import zeros, allclose, array, any
-from datetime import datetime
+from streamanalysis.athlete import AthleteSpec, AthleteSwarm
+from streamanalysis.clock import SimulatedClock
+from numpy import zeros, allclose, array, any, isclose, std
+from datetime import datetime, timedelta
 from Queue import Queue
 from time import sleep
 
@@ -48,6 +49,93 @@ class TestSensor(object):
         assert ~any(array(data) == 0)
             
 
+    def test_simulated_clock(self):
+        q = Queue()
+        start = datetime(2016, 7, 12)
+        clock = SimulatedClock(start, start + timedelta(seconds = 60))
+        test_sensor = sensor.Sensor(self.athlete, q, 'test', clock = clock)
+        test_sensor.start()
+        test_sensor.join(5)
+        assert not test_sensor.isAlive()
+        data = []
+        while not q.empty():
+            data.append(q.get_nowait())
+        assert len(data) == 60 * 20
+        assert data[0].time == start
+        assert data[-1].time == start + timedelta(seconds = 59.95)
+
+    def test_hub(self):
+        q = Queue()
+        start = datetime(2016, 7, 12)
+        clock = SimulatedClock(start, start + timedelta(seconds = 10))
+        sensors = [sensor.Sensor(self.athlete, q, str(i), rate = 5 + i)
+                   for i in range(50)]
+        hub = sensor.SensorHub(sensors, clock = clock)
+        hub.start()
+        hub.join(5)
+        assert not hub.isAlive()
+        data = []
+        while not q.empty():
+            data.append(q.get_nowait())
+        times = [d.time for d in data]
+        assert times == sorted(times)
+        drift = hub.drift()
+        for i in range(50):
+            n = len([d for d in data if d.ID == str(i)])
+            assert drift[str(i)].count == n == 10 * (5 + i)
+            assert isclose(drift[str(i)].rate, 5 + i)
+            assert drift[str(i)].max_lag < 1e-5
+
+    def test_hub_wall_clock(self):
+        q = Queue()
+        sensors = [sensor.Sensor(self.athlete, q, str(i)) for i in range(3)]
+        hub = sensor.SensorHub(sensors)
+        hub.start()
+        sleep(.11)
+        hub.stop()
+        hub.join(1)
+        drift = hub.drift()
+        for i in range(3):
+            assert drift[str(i)].count == 3
+            assert drift[str(i)].max_lag < .05
+
+    def test_array(self):
+        q = Queue()
+        start = datetime(2016, 7, 12)
+        clock = SimulatedClock(start, start + timedelta(seconds = 10))
+        athletes = [self.athlete] * 3
+        test_array = sensor.SensorArray(athletes, q, IDs = ['a', 'b', 'c'],
+                                        noise = 1, seed = 1, clock = clock,
+                                        block = 64)
+        test_array.start()
+        test_array.join(5)
+        assert not test_array.isAlive()
+        frames = []
+        while not q.empty():
+            frames.append(q.get_nowait())
+        assert len(frames) == 10 * 20
+        assert frames[0].time == start
+        assert frames[-1].time == start + timedelta(seconds = 9.95)
+        assert all(frame.IDs == ('a', 'b', 'c') for frame in frames)
+        coords = array([frame.coords for frame in frames])
+        assert coords.shape == (200, 3, 2)
+        assert isclose(std(coords), 1, atol = .1)
+        # noise is drawn again after every block of 64 ticks
+        assert not allclose(coords[:64], coords[64:128])
+
+    def test_array_swarm(self):
+        q = Queue()
+        swarm = AthleteSwarm(4, seed = 1)
+        reference = AthleteSwarm(4, seed = 1)
+        test_array = sensor.SensorArray(swarm, q, noise = 0)
+        start = datetime(2016, 7, 12)
+        times = [start + timedelta(seconds = .05 * i) for i in range(5)]
+        frames = [test_array.measure(t) for t in times]
+        assert frames[0].IDs == (0, 1, 2, 3)
+        pos = reference.simulate(times).pos
+        for i, frame in enumerate(frames):
+            assert allclose(frame.coords, pos[:, i])
+
     def teardown(self):
         #tidy up
         print("tearing down " + __name__)
@@ -0,0 +1,147 @@
+"""
+Tests for `shared` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+import pytest
+from streamanalysis import shared
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.results import ResultSpec
+from streamanalysis.replay import simulate_stream
+from streamanalysis.utils import to_timestamp
+from numpy import allclose, array
+from datetime import datetime
+from multiprocessing import Process, Queue as ProcessQueue
+from Queue import Queue
+
+def read_remote(path, IDs, outbox):
+    """
+    Read the latest results of the sensors in another process.
+    """
+    subscriber = shared.Subscriber(path)
+    outbox.put([tuple(subscriber.get(ID)) for ID in IDs])
+    subscriber.close()
+
+class TestShared(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'results.shm')
+
+    def get_result(self, x, time):
+        return ResultSpec(pos = array([x, 2 * x]), pos_err = array([.1, .2]),
+                          vel = array([1., -1.]), vel_err = array([.3, .4]),
+                          tot_vel = 1.5, dist = x, stationary = False,
+                          time = time)
+
+    def test_publish(self):
+        publisher = shared.Publisher(self.filename, capacity = 2)
+        subscriber = shared.Subscriber(self.filename)
+        assert subscriber.capacity == 2
+        assert len(subscriber.read()) == 0
+        publisher.update('a', self.get_result(1., 10.))
+        publisher.update(3, self.get_result(2., 11.))
+        publisher.update('c', self.get_result(3., 12.))
+        assert publisher.overflow == 1
+        # results are only visible after the publication
+        assert len(subscriber.read()) == 0
+        publisher.publish()
+        assert subscriber.keys() == ['a', 3]
+        res = subscriber.get(3)
+        assert allclose(res.pos, [2., 4.])
+        assert res.dist == 2. and res.time == 11. and not res.stationary
+        # the latest buffer is not copied and stays valid until the next but
+        # one publication starts
+        seq, slots = subscriber.latest()
+        assert not slots.flags.owndata
+        publisher.update('a', self.get_result(5., 13.))
+        publisher.publish()
+        assert subscriber.valid(seq)
+        assert allclose(slots['dist'], [1., 2.])
+        assert allclose(subscriber.read()['dist'], [5., 2.])
+        publisher.publish()
+        assert not subscriber.valid(seq)
+        assert allclose(subscriber.read()['dist'], [5., 2.])
+        with pytest.raises(KeyError):
+            subscriber.get('c')
+        # views of the block are dropped before it is unmapped
+        del slots
+        subscriber.close()
+        publisher.close()
+        publisher = shared.Publisher(self.filename)
+        with pytest.raises(ValueError):
+            publisher.update('x' * 64, None)
+        publisher.close()
+
+    def test_restart(self):
+        publisher = shared.Publisher(self.filename, capacity = 2)
+        publisher.update('a', self.get_result(1., 10.))
+        publisher.close()
+        size = os.path.getsize(self.filename)
+        subscriber = shared.Subscriber(self.filename)
+        seq, slots = subscriber.latest()
+        assert subscriber.get('a').dist == 1.
+        # a new publisher reuses the mapped block without truncating it
+        publisher = shared.Publisher(self.filename, capacity = 2)
+        assert os.path.getsize(self.filename) == size
+        assert allclose(slots['dist'], [1.])
+        publisher.update('b', self.get_result(2., 11.))
+        publisher.publish()
+        assert subscriber.seq == seq + 2
+        assert subscriber.keys() == ['b']
+        assert allclose(subscriber.get('b').pos, [2., 4.])
+        # the cached slot of 'a' now belongs to 'b'
+        with pytest.raises(KeyError):
+            subscriber.get('a')
+        publisher.update('a', self.get_result(3., 12.))
+        publisher.publish()
+        assert subscriber.get('a').dist == 3.
+        assert subscriber.get('b').dist == 2.
+        del slots
+        subscriber.close()
+        publisher.close()
+
+    def test_analyser(self):
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, i, seed = i)
+                   for i in range(5)]
+        for data in simulate_stream(sensors, 5, datetime(2016, 7, 12)):
+            q.put(data)
+        publisher = shared.Publisher(self.filename, interval = 0.0)
+        analyser = Analyser(q, wait = .1, backend = 'fast',
+                            publisher = publisher)
+        analyser.start()
+        analyser.join(5)
+        assert not analyser.isAlive()
+        assert publisher.header['seq'][0] > 2
+        # read the results from another process
+        outbox = ProcessQueue()
+        reader = Process(target = read_remote,
+                         args = (self.filename, range(5), outbox))
+        reader.start()
+        remote = outbox.get(timeout = 5)
+        reader.join(5)
+        publisher.close()
+        for ID, values in enumerate(remote):
+            res = ResultSpec(*values)
+            last = analyser.sensors[ID].last
+            assert allclose(res.pos, last.pos)
+            assert allclose(res.vel_err, last.vel_err)
+            assert res.dist == last.dist
+            assert res.stationary == last.stationary
+            assert res.time == to_timestamp(last.time)
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        shutil.rmtree(self.path)
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,101 @@
+"""
+Tests for `smoother` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+import shutil
+import tempfile
+from streamanalysis import smoother
+from streamanalysis.athlete import AthleteSwarm
+from streamanalysis.analyser import Analyser
+from streamanalysis.filterbank import FilterBank
+from streamanalysis.sensor import MeasurementSpec
+from streamanalysis.storage import SessionLog
+from numpy import allclose, arange, sqrt, diff, abs, nan, isnan
+from numpy.random.mtrand import RandomState
+from Queue import Queue
+
+class TestSmoother(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.path = tempfile.mkdtemp()
+        self.times = arange(2000) * .05
+        self.truth = AthleteSwarm(3, seed = 1).simulate(self.times)
+        rs = RandomState(2)
+        self.coords = self.truth.pos + .3 * rs.randn(3, 2000, 2)
+
+    def test_forward(self):
+        dt, predicted, filtered = smoother.forward(self.times[:50],
+                                                   self.coords[:, :50])
+        bank = FilterBank()
+        rows = [bank.index(ID) for ID in range(3)]
+        bank.P[rows] = 0.0
+        bank.P[rows, 0, 0] = bank.P[rows, 2, 2] = 100.0**2
+        bank.P[rows, 1, 1] = bank.P[rows, 3, 3] = 10.0**2
+        for t in range(50):
+            bank.update_decoupled(rows, self.coords[:, t], dt[t, :, 0])
+        assert allclose(bank.X[rows][:, [0, 2]], filtered[0][-1])
+        assert allclose(bank.X[rows][:, [1, 3]], filtered[1][-1])
+        assert allclose(bank.P[rows, 0, 0], filtered[2][-1][:, 0])
+
+    def test_smooth(self):
+        res = smoother.smooth(self.times, self.coords)
+        assert res.pos.shape == (3, 2000, 2)
+        assert res.dist.shape == res.stationary.shape == (3, 2000)
+        filtered = smoother.forward(self.times, self.coords)[2][0]
+        error = ((res.pos - self.truth.pos)**2).mean()
+        assert error < .5 * ((filtered.transpose(1, 0, 2) -
+                              self.truth.pos)**2).mean()
+        assert (res.pos_err[:, 1:-1] < .3).all()
+        # distances are closer to the truth than the online estimate
+        analyser = Analyser(Queue(), backend = 'fast')
+        for t in range(2000):
+            for ID in range(3):
+                analyser.analyse_data(MeasurementSpec(ID, self.coords[ID, t],
+                                                      self.times[t] + 1))
+        truth = sqrt((diff(self.truth.pos, axis = 1)**2).sum(axis = 2))
+        truth = truth.sum(axis = 1)
+        online = [analyser.sensors[ID].last.dist for ID in range(3)]
+        assert abs(res.dist[:, -1] - truth).sum() < \
+               abs(online - truth).sum()
+
+    def test_missing(self):
+        coords = self.coords[:1].copy()
+        coords[0, 100:110] = nan
+        res = smoother.smooth(self.times, coords)
+        assert not isnan(res.pos).any()
+        assert (res.pos_err[0, 105] > res.pos_err[0, 95]).all()
+        assert allclose(res.pos[0, 100:110], self.truth.pos[0, 100:110],
+                        atol = 1.0)
+
+    def test_smooth_session(self):
+        log = SessionLog(self.path)
+        for t in range(2000):
+            for ID in range(3):
+                # second sensor stops after half of the session
+                if ID == 1 and t >= 1000:
+                    continue
+                log.measurements.append((ID, self.coords[ID, t, 0],
+                                         self.coords[ID, t, 1],
+                                         self.times[t]))
+        log.index.index('0')
+        log.index.index('1')
+        log.index.index('2')
+        results = smoother.smooth_session(log)
+        assert len(results['0'].dist) == 2000
+        assert len(results['1'].dist) == 1000
+        single = smoother.smooth(self.times[:1000], self.coords[1:2, :1000])
+        assert allclose(results['1'].pos, single.pos[0])
+        assert allclose(results['1'].dist, single.dist[0])
+        assert smoother.smooth_session(log, ['unknown']) == {}
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        shutil.rmtree(self.path)
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,111 @@
+"""
+Tests for `spatial` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import spatial
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.replay import simulate_stream, replay
+from numpy import allclose, sqrt, argsort, concatenate
+from numpy.random.mtrand import RandomState
+from datetime import datetime
+from Queue import Queue
+
+class TestSpatialHash(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.grid = spatial.SpatialHash(cell = 7.0, capacity = 4)
+        rs = RandomState(1)
+        # some positions outside of the field
+        self.pos = rs.rand(300, 2) * 110 - 5
+        self.grid.update_many(range(300), self.pos)
+        # move every second sensor
+        self.pos[::2] = rs.rand(150, 2) * 100
+        self.grid.update_many(range(0, 300, 2), self.pos[::2])
+        self.points = rs.rand(20, 2) * 100
+
+    def distances(self, point):
+        return sqrt(((self.pos - point)**2).sum(axis = 1))
+
+    def test_update(self):
+        assert len(self.grid) == 300
+        assert 299 in self.grid
+        assert allclose(self.grid.pos[:300], self.pos)
+        assert sum(len(rows) for rows in self.grid.grid.values()) == 300
+
+    def test_radius(self):
+        result = self.grid.radius(self.points, 12.0)
+        for point, IDs in zip(self.points, result):
+            d = self.distances(point)
+            expected = [i for i in argsort(d, kind = 'mergesort')
+                        if d[i] <= 12.0]
+            assert sorted(IDs) == sorted(expected)
+            assert list(d[IDs]) == sorted(d[IDs])
+        assert 10 not in self.grid.neighbours(10, 12.0)
+
+    def test_knn(self):
+        points = concatenate([self.points, [[300, -50]]])
+        result = self.grid.knn(points, 5)
+        assert len(result) == 21
+        for point, IDs in zip(points, result):
+            d = self.distances(point)
+            assert allclose(d[IDs], sorted(d)[:5])
+        assert len(self.grid.knn([[50, 50]], 1000)[0]) == 300
+
+    def test_knn_outside(self):
+        grid = spatial.SpatialHash(cell = 7.0)
+        grid.update_many('ABC', [[106, 50], [105, 50], [107, 48.95]])
+        # count the cells visited by the ring search
+        visited = []
+        candidates = grid.candidates
+        def counted(cx, cy, ring):
+            visited.append((min(cx + ring + 1, grid.shape[0]) -
+                            max(cx - ring, 0)) *
+                           (min(cy + ring + 1, grid.shape[1]) -
+                            max(cy - ring, 0)))
+            return candidates(cx, cy, ring)
+        grid.candidates = counted
+        assert grid.knn([[110, 50]], 2) == [['C', 'A']]
+        # one cell in the first ring and 2 x 3 cells in the second
+        assert sum(visited) == 7
+        points = [[110, 50], [-8, 30], [40, 104], [-3, -6], [120, 120]]
+        for k in (1, 2, 3):
+            result = self.grid.knn(points, k)
+            for point, IDs in zip(points, result):
+                d = self.distances(point)
+                assert allclose(d[IDs], sorted(d)[:k])
+
+    def test_pairs(self):
+        pairs = self.grid.pairs(6.0)
+        found = set((min(a, b), max(a, b)) for a, b, d in pairs)
+        assert len(found) == len(pairs)
+        d = sqrt(((self.pos[:, None] - self.pos[None])**2).sum(axis = 2))
+        expected = set((a, b) for a in range(300) for b in range(a + 1, 300)
+                       if d[a, b] <= 6.0)
+        assert found == expected
+        for a, b, dist in pairs:
+            assert allclose(dist, d[a, b])
+
+    def test_analyser(self):
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, i, seed = i)
+                   for i in range(5)]
+        stream = list(simulate_stream(sensors, 5, datetime(2016, 7, 12)))
+        grid = spatial.SpatialHash()
+        analyser = Analyser(q, backend = 'fast', spatial = grid)
+        replay(analyser, stream)
+        for ID in range(5):
+            assert allclose(grid.position(ID), analyser.sensors[ID].last.pos)
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
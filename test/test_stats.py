@@ -0,0 +1,81 @@
+"""
+Tests for `stats` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import stats
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.clock import SimulatedClock
+from streamanalysis.replay import simulate_stream
+from numpy import isclose
+from datetime import datetime, timedelta
+from Queue import Queue
+
+class TestStats(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.start = datetime(2016, 7, 12)
+
+    def test_histogram(self):
+        hist = stats.Histogram(smallest = 1.0, buckets = 8)
+        for value in [0, 1, 3, 3, 4.0, 5, 1000]:
+            hist.add(value)
+        snapshot = hist.snapshot()
+        assert snapshot['count'] == 7
+        assert isclose(snapshot['mean'], 1016 / 7.)
+        assert snapshot['max'] == 1000
+        assert snapshot['p50'] == 4.0
+        # 1000 is beyond the range and reported as maximum
+        assert snapshot['p99'] == 1000
+        assert snapshot['buckets'] == [(1.0, 2), (4.0, 3), (8.0, 1),
+                                       (128.0, 1)]
+
+    def test_histogram_overflow(self):
+        hist = stats.Histogram(smallest = 1.0, buckets = 4)
+        for value in [1, 2, 3, 50, 60]:
+            hist.add(value)
+        assert hist.quantile(.2) == 1.0
+        assert hist.quantile(.6) == 4.0
+        assert hist.quantile(.7) == 60
+        assert hist.quantile(1.0) == 60
+
+    def test_instrumentation(self):
+        pipeline = stats.PipelineStats()
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, str(i), seed = i,
+                          stats = pipeline) for i in range(3)]
+        for data in simulate_stream(sensors, 2, self.start):
+            q.put(data)
+        # Analyser processes the measurements 10 seconds after they were
+        # taken
+        clock = SimulatedClock(self.start + timedelta(seconds = 10))
+        analyser = Analyser(q, wait = .1, batch_size = 2, stats = pipeline,
+                            clock = clock)
+        analyser.run()
+        snapshot = pipeline.snapshot()
+        assert snapshot['produced'] == {'0': 40, '1': 40, '2': 40}
+        assert snapshot['processed'] == snapshot['produced']
+        assert snapshot['stages']['measure']['count'] == 120
+        assert snapshot['stages']['store_result']['count'] == 120
+        assert snapshot['stages']['kalman_filter_batch']['count'] == 60
+        assert snapshot['stages']['queue_wait']['count'] == 60
+        assert snapshot['queue_depth']['max'] == 119
+        assert 8 < snapshot['lag']['mean'] <= 10
+
+    def test_disabled(self):
+        analyser = Analyser(Queue())
+        assert 'analyse_data' not in analyser.__dict__
+        assert 'update_one' not in analyser.filter.__dict__
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()
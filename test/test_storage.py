@@ -0,0 +1,95 @@
+"""
+Tests for `storage` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import json
+import pytest
+import shutil
+import tempfile
+from streamanalysis import storage
+from streamanalysis.athlete import Athlete
+from streamanalysis.sensor import Sensor
+from streamanalysis.analyser import Analyser
+from streamanalysis.replay import simulate_stream, replay
+from streamanalysis.wire import from_records, MEASUREMENT_DTYPE
+from streamanalysis.utils import to_timestamp
+from numpy import allclose, memmap
+from datetime import datetime, timedelta
+from Queue import Queue
+
+class TestStorage(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        self.path = tempfile.mkdtemp()
+        self.start = datetime(2016, 7, 12)
+        q = Queue()
+        sensors = [Sensor(Athlete(seed = i), q, str(i), seed = i)
+                   for i in range(3)]
+        self.stream = list(simulate_stream(sensors, 10, self.start))
+
+    def test_session_log(self):
+        log = storage.SessionLog(self.path, segment_size = 100,
+                                 buffer_size = 64)
+        analyser = Analyser(Queue(), log = log)
+        replay(analyser, self.stream)
+        log.flush()
+        assert len(log.measurements) == len(log.results) == 600
+        assert len(log.results.segments) == 6
+        # Whole session without copies
+        segments = log.results.read()
+        assert all(isinstance(s, memmap) for s in segments)
+        # Selection by sensor and time
+        t0 = self.start + timedelta(seconds = 2)
+        t1 = self.start + timedelta(seconds = 4)
+        res = log.read_results(['1'], t0, t1)
+        assert len(res) == 41
+        assert (res['idx'] == log.index.index('1')).all()
+        store = analyser.sensors['1']
+        sel = (store.column('time') >= to_timestamp(t0)) & \
+              (store.column('time') <= to_timestamp(t1))
+        assert allclose(res['pos'], store.column('pos')[sel])
+        assert allclose(res['dist'], store.column('dist')[sel])
+        # Reopen log and replay recorded measurements
+        reopened = storage.SessionLog(self.path)
+        assert len(reopened.measurements) == 600
+        records = reopened.read_measurements()
+        offline = Analyser(Queue(), backend = 'fast')
+        replay(offline, from_records(records, reopened.index))
+        for ID in ['0', '1', '2']:
+            assert allclose(offline.sensors[ID].column('pos'),
+                            analyser.sensors[ID].column('pos'))
+        assert len(reopened.read_results(['unknown'])) == 0
+
+    def test_journal(self):
+        log = storage.SegmentLog(self.path, 'test', MEASUREMENT_DTYPE,
+                                 segment_size = 100, buffer_size = 10)
+        for i in range(150):
+            log.append((i % 3, i, -i, i * .05))
+        log.flush()
+        # the index holds both segments as of the rollover, the later writes
+        # to the second segment are only appended to the journal
+        with open(log.get_filename('json')) as f:
+            index = json.load(f)
+        assert [meta['count'] for meta in index['segments']] == [100, 10]
+        reopened = storage.SegmentLog(self.path, 'test', MEASUREMENT_DTYPE)
+        assert len(reopened) == 150
+        assert reopened.segments == log.segments
+        records = reopened.read(sensors = [1], start = 6.0)
+        assert len(records) == 1
+        assert list(records[0]['x']) == list(range(121, 150, 3))
+        # an incomplete entry of an interrupted write is ignored
+        with open(log.get_filename('journal'), 'a') as f:
+            f.write('{"count": 1')
+        assert len(storage.SegmentLog(self.path, 'test',
+                                      MEASUREMENT_DTYPE)) == 150
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        shutil.rmtree(self.path)
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for `wire` module.
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import pytest
+from streamanalysis import wire
+from streamanalysis.sensor import MeasurementSpec
+from streamanalysis.analyser import Analyser
+from streamanalysis.utils import to_timestamp
+from numpy import allclose, array
+from numpy.random.mtrand import RandomState
+from datetime import datetime, timedelta
+from Queue import Queue
+
+class TestWire(object):
+
+    def setup(self):
+        #prepare unit test. Load data etc
+        print("setting up " + __name__)
+        rs = RandomState(1)
+        self.date = datetime(2016, 7, 12)
+        self.index = wire.SensorIndex(['a', 'b', 'c'])
+        self.measurements = []
+        for i in range(10):
+            for ID in ['c', 'a', 'b']:
+                t = self.date + timedelta(seconds = .05 * (i+1))
+                self.measurements.append(MeasurementSpec(ID, 50 + rs.randn(2),
+                                                         t))
+
+    def test_index(self):
+        assert len(self.index) == 3
+        assert self.index.index('b') == 1
+        assert self.index[2] == 'c'
+        assert self.index.index('d') == 3
+
+    def test_encode(self):
+        records = wire.to_records(self.measurements, self.index)
+        assert records.dtype.itemsize == 28
+        buf = wire.encode(records)
+        assert len(buf) == 28 * 30
+        decoded = wire.decode(buf)
+        assert (decoded == records).all()
+        measurements = wire.from_records(decoded, self.index)
+        for m, d in zip(self.measurements, measurements):
+            assert m.ID == d.ID
+            assert allclose(m.coords, d.coords)
+            assert d.time == to_timestamp(m.time)
+
+    def test_analyse_records(self):
+        analyser = Analyser(Queue())
+        analyser.initialize_matrices()
+        for data in self.measurements:
+            analyser.analyse_data(data)
+        records = wire.decode(wire.encode(wire.to_records(self.measurements,
+                                                          self.index)))
+        native = Analyser(Queue(), backend = 'fast')
+        native.analyse_records(records, self.index)
+        for ID in ['a', 'b', 'c']:
+            res = native.sensors[ID]
+            ref = analyser.sensors[ID]
+            assert len(res) == len(ref) == 10
+            assert allclose(res.column('pos'), ref.column('pos'))
+            assert allclose(res.column('dist'), ref.column('dist'))
+            assert allclose(res.column('time'), ref.column('time'))
+            assert isinstance(res[-1].time, float)
+            assert native.data[ID].time == res[-1].time
+            assert allclose(native.data[ID].coords,
+                            analyser.data[ID].coords)
+
+    def teardown(self):
+        #tidy up
+        print("tearing down " + __name__)
+        pass
+
+if __name__ == '__main__':
+    pytest.main()